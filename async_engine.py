@@ -0,0 +1,145 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Coroutine
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - only needed for the async engine
+    aiohttp = None
+
+from constants import (
+    ASYNC_MAX_CONNECTIONS,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_FIRST_TOKEN_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+)
+from stream import NDJSONDecoder
+
+
+class AsyncEngine:
+    """Stream many generations concurrently on one asyncio event loop.
+
+    The loop runs on its own thread, so it doesn't compete with the Qt event
+    loop; coroutines are submitted from any thread and results reach the GUI
+    through the thread-safe `UpdateScheduler`, like those of the thread
+    engine. All generations share one aiohttp session whose connector keeps
+    at most `max_connections` connections; further streams wait for a free
+    one.
+
+    Formatting is CPU-bound and would hold up every other stream on the
+    loop, so coroutines hand it to `run_blocking`. Only the fan-out view
+    streams several generations at once: `LLMHandler` stops the previous
+    chat turn before starting the next, so the chat stays serial with either
+    engine.
+    """
+
+    def __init__(self, max_connections: int = ASYNC_MAX_CONNECTIONS):
+        if aiohttp is None:
+            raise RuntimeError("The async engine needs aiohttp (pip install aiohttp)")
+        self.max_connections = max_connections
+        self.requests = 0
+        self.connections = 0
+        self._session = None
+        # One worker, so work is done in the order it was handed over, and
+        # what a stopped generation left running finishes before the next
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cpu")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="llm-async", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Run a coroutine on the engine's loop, from any thread.
+
+        Cancelling the returned future cancels the coroutine, and closes the
+        connection of a stream it is reading.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def run_blocking(self, function: Callable, *args):
+        """Run `function` off the loop, on the engine's worker thread"""
+        return await self._loop.run_in_executor(self._worker, function, *args)
+
+    async def stream_events(self, url: str, payload: dict) -> AsyncIterator[list]:
+        """Post a generation and yield the events of each read.
+
+        A read returns whatever has arrived, so events that arrived while
+        the previous batch was handled come in one batch.
+        """
+        response = await self._post(url, payload)
+        async with response:
+            response.raise_for_status()
+            decoder = NDJSONDecoder()
+            try:
+                while True:
+                    # The request's read timeout covers the first token, later
+                    # tokens have to arrive within the shorter read timeout
+                    data = await asyncio.wait_for(
+                        response.content.readany(), HTTP_READ_TIMEOUT
+                    )
+                    if not data:
+                        break
+                    events = decoder.feed(data)
+                    if events:
+                        yield events
+            except (asyncio.CancelledError, GeneratorExit):
+                # Drop the connection instead of returning it to the pool,
+                # so Ollama stops generating
+                response.close()
+                raise
+            events = decoder.flush()
+            if events:
+                yield events
+
+    async def _post(self, url: str, payload: dict):
+        """Send the request, retrying connection attempts that failed"""
+        session = self._get_session()
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_FIRST_TOKEN_TIMEOUT,
+        )
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                return await session.post(url, json=payload, timeout=timeout)
+            except aiohttp.ClientConnectorError:
+                if attempt == HTTP_RETRIES:
+                    raise
+                await asyncio.sleep(0.2 * 2**attempt)
+
+    def _get_session(self):
+        if self._session is None:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_connection_create(self, session, context, params):
+        self.connections += 1
+
+    def pool_stats(self) -> str:
+        """Describe the connection pool, for the console"""
+        return (
+            f"[pool] async: {self.requests} requests over {self.connections} "
+            f"connections, at most {self.max_connections} open"
+        )
+
+    def close(self):
+        """Close the session and stop the loop"""
+        if self._session is not None:
+            self.submit(self._session.close()).result()
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._worker.shutdown()
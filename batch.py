@@ -0,0 +1,311 @@
+"""Run the prompts of a JSONL file without the GUI.
+
+Each line of the input is a prompt, either a string or an object:
+
+    {"id": "q1", "prompt": "...", "model": "llama2", "seed": 1,
+     "history": [{"role": "user", "content": "..."},
+                 {"role": "assistant", "content": "..."}]}
+
+Only "prompt" is required. Prompts without a model run on every --model.
+Each result is a line of the output: the raw text, thinking, output, HTML
+and timing of a generation, or its error. Finished results are kept when
+the output is given again, so an interrupted run resumes where it stopped.
+
+    python main.py batch prompts.jsonl results.jsonl --model llama2
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from constants import BATCH_PARALLEL, HTTP_POOL_SIZE, OLLAMA_API
+from context import ContextBuilder
+from fan_out import StreamMetrics
+from http_pool import RequestHandle, SessionPool
+from llm import (
+    OLLAMA_HOST,
+    IncrementalMarkdownResponseFormatter,
+    LLMClient,
+    ResponseStream,
+)
+from stream import iter_event_batches
+
+
+class BatchInterrupted(Exception):
+    """The run was stopped before the generation finished"""
+
+
+@dataclass
+class BatchJob:
+    """One prompt to run on one model"""
+
+    id: Union[str, int]
+    model: str
+    prompt: str
+    history: list = field(default_factory=list)
+    seed: Optional[int] = None
+
+    @property
+    def key(self) -> tuple:
+        return (str(self.id), self.model, self.seed)
+
+
+class LastUpdates(dict):
+    """Where a ResponseStream posts without a GUI: the last value of each update"""
+
+    def post(self, name: str, value: str, coalesce: bool = True, join=False):
+        # Joined updates are deltas of text the stream keeps anyway
+        if not join:
+            self[name] = value
+
+
+def history_entries(messages: list[dict]) -> list[dict]:
+    """Chat history entries, as the GUI keeps them, of a list of messages"""
+    entries = []
+    for message in messages:
+        if message["role"] == "assistant" and entries:
+            entries[-1]["llm_history"] = message["content"]
+        else:
+            entries.append({"role": message["role"], "content": message["content"]})
+    return entries
+
+
+def read_jobs(path: Path, models: Iterable[str] = ()) -> list[BatchJob]:
+    """The jobs of a prompts file, ids default to line numbers"""
+    models = list(models)
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"prompt": record}
+            job_models = [record["model"]] if "model" in record else models
+            if not job_models:
+                raise ValueError(f"Line {number} names no model, pass --model")
+            for model in job_models:
+                jobs.append(
+                    BatchJob(
+                        record.get("id", number),
+                        model,
+                        record["prompt"],
+                        history_entries(record.get("history", [])),
+                        record.get("seed"),
+                    )
+                )
+    return jobs
+
+
+def finished_results(path: Path) -> list[dict]:
+    """The results of an earlier run that don't need to run again.
+
+    Failed results are left out, and so is a last line cut off mid-write.
+    """
+    results = {}
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return []
+    with f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in result:
+                key = (str(result["id"]), result["model"], result.get("seed"))
+                results[key] = result
+    return list(results.values())
+
+
+class BatchRunner:
+    """Stream prompts to Ollama, `parallel` at a time per model.
+
+    Generations run on worker threads, a pool of them per model, and share
+    the client's connections. Every prompt gets a context of its own, so
+    prompts don't see each other's history. Results are written as they
+    finish; `stop` makes the running generations drop their connection,
+    also those still waiting for the model to load.
+    """
+
+    def __init__(self, client: LLMClient = None, parallel: int = BATCH_PARALLEL):
+        self.client = client or LLMClient()
+        self.parallel = parallel
+        self._stopping = threading.Event()
+        self._requests = set()
+        self._lock = threading.Lock()
+        # Formatters keep markdown state, one per worker thread
+        self._local = threading.local()
+
+    def run(self, jobs: list[BatchJob], output: Path, progress=None) -> int:
+        """Run the jobs that have no result in `output` yet, return the failures"""
+        output = Path(output)
+        self._stopping.clear()
+        finished = finished_results(output)
+        done = {(str(r["id"]), r["model"], r.get("seed")) for r in finished}
+        jobs = [job for job in jobs if job.key not in done]
+        # Rewrite the output without failed or cut off results, then append
+        output.parent.mkdir(parents=True, exist_ok=True)
+        temporary = output.with_suffix(".tmp")
+        temporary.write_text(
+            "".join(json.dumps(result) + "\n" for result in finished),
+            encoding="utf-8",
+        )
+        temporary.replace(output)
+
+        failures = 0
+        executors = {
+            model: ThreadPoolExecutor(self.parallel, thread_name_prefix="batch")
+            for model in {job.model for job in jobs}
+        }
+        futures: dict[Future, BatchJob] = {
+            executors[job.model].submit(self.generate, job): job for job in jobs
+        }
+        try:
+            with open(output, "a", encoding="utf-8") as f:
+                for count, future in enumerate(as_completed(futures), 1):
+                    job = futures[future]
+                    try:
+                        result = future.result()
+                    except BatchInterrupted:
+                        continue
+                    except Exception as e:
+                        result = {
+                            "id": job.id,
+                            "model": job.model,
+                            "seed": job.seed,
+                            "prompt": job.prompt,
+                            "error": str(e),
+                        }
+                    failures += "error" in result
+                    f.write(json.dumps(result) + "\n")
+                    f.flush()
+                    if progress is not None:
+                        progress(count, len(jobs), result)
+        finally:
+            self.stop()
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+        return failures
+
+    def stop(self):
+        """Stop the running generations, their jobs get no result"""
+        with self._lock:
+            self._stopping.set()
+            requests = list(self._requests)
+        for request in requests:
+            request.abort()
+
+    def generate(self, job: BatchJob) -> dict:
+        """Stream one job and return its result"""
+        formatter = self._formatter()
+        formatter.new_conversation()
+        prompt = self.client._format_prompt(
+            job.prompt, job.history, job.model, context=ContextBuilder()
+        )
+        payload = self.client.build_payload(job.model, prompt, job.seed)
+        metrics = StreamMetrics(time.perf_counter())
+        updates = LastUpdates()
+        stream = ResponseStream(formatter, updates.post)
+        request = RequestHandle()
+        # Registered before sending, so `stop` can abort it at any point
+        with self._lock:
+            if self._stopping.is_set():
+                raise BatchInterrupted(job.key)
+            self._requests.add(request)
+        try:
+            with self.client.stream_payload(payload, request) as response:
+                for events in iter_event_batches(response):
+                    metrics.add(events, time.perf_counter())
+                    stream.feed(events)
+        except Exception:
+            # Sending or reading a request aborted by `stop` fails
+            if self._stopping.is_set():
+                raise BatchInterrupted(job.key) from None
+            raise
+        finally:
+            with self._lock:
+                self._requests.discard(request)
+        if self._stopping.is_set():
+            raise BatchInterrupted(job.key)
+        stream.finish()
+        metrics.finish(time.perf_counter())
+        done_event = stream.done_event or {}
+        return {
+            "id": job.id,
+            "model": job.model,
+            "seed": job.seed,
+            "prompt": job.prompt,
+            "text": str(stream.text),
+            "thinking": stream.sections.thinking,
+            "output": stream.sections.output,
+            "html": updates.get("output_update", ""),
+            "timing": {
+                "first_token": metrics.first_token,
+                "total": metrics.end,
+                "tokens": metrics.eval_count or metrics.tokens,
+                "tokens_per_second": metrics.tokens_per_second,
+                "prompt_eval_count": done_event.get("prompt_eval_count"),
+                "prompt_eval_duration": done_event.get("prompt_eval_duration", 0) / 1e9,
+            },
+        }
+
+    def _formatter(self) -> IncrementalMarkdownResponseFormatter:
+        formatter = getattr(self._local, "formatter", None)
+        if formatter is None:
+            formatter = self._local.formatter = IncrementalMarkdownResponseFormatter()
+        return formatter
+
+
+def report(count: int, total: int, result: dict):
+    """Print a line per finished result"""
+    if "error" in result:
+        status = f"failed: {result['error']}"
+    else:
+        timing = result["timing"]
+        status = f"{timing['total']:.1f} s, {timing['tokens_per_second']:.1f} tokens/s"
+    print(
+        f"[{count}/{total}] {result['id']} {result['model']}: {status}", file=sys.stderr
+    )
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="main.py batch", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("prompts", type=Path, help="JSONL file of prompts")
+    parser.add_argument("output", type=Path, help="JSONL file of results, resumed")
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        help="Model for prompts that name none, repeat to run them on several",
+    )
+    parser.add_argument(
+        "--parallel", type=int, default=BATCH_PARALLEL, help="Streams per model"
+    )
+    parser.add_argument("--host", default=OLLAMA_HOST)
+    parser.add_argument("--api", choices=["chat", "generate"], default=OLLAMA_API)
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = read_jobs(args.prompts, args.model)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"Can't read {args.prompts}: {e}")
+    models = {job.model for job in jobs}
+    # Keep a connection per stream
+    sessions = SessionPool(max(HTTP_POOL_SIZE, args.parallel * len(models)))
+    runner = BatchRunner(LLMClient(sessions, args.host, args.api), args.parallel)
+    try:
+        failures = runner.run(jobs, args.output, progress=report)
+    except KeyboardInterrupt:
+        print("Interrupted, run again to resume", file=sys.stderr)
+        return 130
+    return 1 if failures else 0
@@ -0,0 +1,217 @@
+"""Measure streaming end to end, from the request to the panels, without a model.
+
+Sends prompts through `LLMHandler` to a local fake Ollama server and shows
+the updates in the widgets the GUI uses: the thinking and console panels
+are text sinks, the output goes through the block patcher of the output
+view (the web view itself needs a display). Each scenario shapes the
+stream differently. Reports per scenario:
+
+- time to first paint, from sending the prompt to the first thinking or
+  output update shown
+- end-to-end tokens/s, the tokens streamed over the time until the
+  response was complete
+- dropped frames, ticks of a frame clock running at UI_MAX_FPS on the GUI
+  thread that came too late because the thread was busy, and the updates
+  the scheduler coalesced away
+
+Runs offscreen unless QT_QPA_PLATFORM says otherwise:
+
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --scenarios paced stall --tokens 3000
+"""
+
+import argparse
+import json
+import os
+import time
+
+from PySide6.QtCore import QEventLoop, Qt, QTimer
+from PySide6.QtWidgets import QApplication, QVBoxLayout, QWidget
+
+from benchmarks.fake_ollama import FakeOllama, sample_tokens
+from block_patch import BlockPatcher
+from constants import UI_MAX_FPS
+from llm import LLMHandler
+from text_sink import TextSink
+
+# FakeOllama options of each scenario
+SCENARIOS = {
+    # A model generating 200 tokens/s after loading for 0.3 s
+    "paced": {"token_delay": 1 / 200, "first_token_delay": 0.3},
+    # As fast as the client reads, many events per network read
+    "burst": {"chunk_size": 16384},
+    # Events split across network reads
+    "split": {"token_delay": 1 / 200, "chunk_size": 7},
+    # Half a second without tokens every 250 tokens
+    "stall": {"token_delay": 1 / 200, "stall_every": 250, "stall_time": 0.5},
+    # An error event after 300 tokens
+    "error": {"token_delay": 1 / 200, "error_after": 300},
+}
+# Seconds to wait for a response before giving up on it
+TIMEOUT = 120
+
+
+class FrameClock:
+    """Count the frames a GUI thread ticking at `fps` missed"""
+
+    def __init__(self, fps: float = UI_MAX_FPS):
+        self.interval = 1 / fps
+        self.missed = 0
+        self.ticks = 0
+        self._last = None
+        self._timer = QTimer()
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+        self._timer.setInterval(int(self.interval * 1000))
+
+    def start(self):
+        self.missed = self.ticks = 0
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.ticks += 1
+        self.missed += max(0, round((now - self._last) / self.interval) - 1)
+        self._last = now
+
+
+class Panels(QWidget):
+    """The panels of the GUI that show a streamed response, and their cost"""
+
+    def __init__(self):
+        super().__init__()
+        self.thinking = TextSink()
+        self.console = TextSink()
+        self.patcher = BlockPatcher()
+        self.patcher.load_finished(True)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.thinking)
+        layout.addWidget(self.console)
+        self.resize(800, 600)
+        self.reset()
+
+    def reset(self):
+        self.thinking.clear()
+        self.console.clear()
+        self.patcher.load_finished(True)
+        self.start = time.perf_counter()
+        self.first_paint = None
+        self.end = None
+        self.error = None
+        self.script = ""
+        self.callbacks = 0
+        self.callback_time = 0.0
+
+    def connect(self, handler: LLMHandler, loop: QEventLoop):
+        signals = handler.signals
+        signals.thinking_update.connect(self._timed(self.update_thinking))
+        signals.output_update.connect(self._timed(self.update_output))
+        signals.console_update.connect(self._timed(self.console.append_text))
+        signals.llm_history_update.connect(lambda _: self._finish(loop))
+        signals.error_occurred.connect(lambda error: self._finish(loop, error))
+
+    def update_thinking(self, content: str):
+        self.thinking.set_text(content)
+        self._painted()
+
+    def update_output(self, content: str):
+        patch = self.patcher.set_content(content)
+        if patch is not None:
+            # The script OutputView runs in the page
+            start, blocks = patch
+            self.script = f"patchBlocks({start}, {json.dumps(blocks)});"
+        self._painted()
+
+    def _painted(self):
+        if self.first_paint is None:
+            self.first_paint = time.perf_counter() - self.start
+
+    def _timed(self, callback):
+        def timed(value):
+            start = time.perf_counter()
+            callback(value)
+            self.callbacks += 1
+            self.callback_time += time.perf_counter() - start
+
+        return timed
+
+    def _finish(self, loop: QEventLoop, error: str = None):
+        self.end = time.perf_counter() - self.start
+        self.error = error
+        loop.quit()
+
+
+def run_scenario(name: str, tokens: list[str], requests: int, panels: Panels):
+    """Stream `requests` responses of a scenario, print a line of results"""
+    options = SCENARIOS[name]
+    streamed = min(len(tokens), options.get("error_after") or len(tokens))
+    handler = LLMHandler()
+    loop = QEventLoop()
+    panels.connect(handler, loop)
+    clock = FrameClock()
+    first_paints, rates, errors, callback_times = [], [], 0, []
+    with FakeOllama(tokens, **options) as fake:
+        handler.client.host = fake.url
+        timeout = QTimer(singleShot=True, interval=TIMEOUT * 1000)
+        timeout.timeout.connect(loop.quit)
+        clock.start()
+        for _ in range(requests):
+            panels.reset()
+            handler.get_response("Hi", "fake", [{"role": "user", "content": "Hi"}])
+            timeout.start()
+            loop.exec()
+            timeout.stop()
+            if panels.end is None:
+                raise TimeoutError(f"No response in {TIMEOUT} s")
+            errors += panels.error is not None
+            if panels.first_paint is not None:
+                first_paints.append(panels.first_paint)
+            rates.append(streamed / panels.end)
+            callback_times.append(panels.callback_time / max(1, panels.callbacks))
+        clock.stop()
+        handler.stop()
+
+    scheduler = handler.scheduler
+    first_paint = sum(first_paints) / len(first_paints) if first_paints else 0.0
+    print(
+        f"{name:<8} {streamed:>7} {first_paint * 1000:>10.0f} "
+        f"{sum(rates) / len(rates):>9.0f} {clock.missed:>7}/{clock.ticks:<6} "
+        f"{scheduler.dropped:>9} {scheduler.delivered:>9} "
+        f"{sum(callback_times) / len(callback_times) * 1000:>8.2f} {errors:>6}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--tokens", type=int, default=1000, help="Tokens per response")
+    parser.add_argument("--requests", type=int, default=3, help="Responses per run")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication.instance() or QApplication([])
+    panels = Panels()
+    panels.show()
+
+    repeat = 1
+    while len(sample_tokens(repeat)) < args.tokens:
+        repeat += 1
+    tokens = sample_tokens(repeat)[: args.tokens]
+    print(
+        f"{'scenario':<8} {'tokens':>7} {'paint ms':>10} {'tokens/s':>9} "
+        f"{'missed/frames':>14} {'coalesced':>9} {'delivered':>9} "
+        f"{'update ms':>8} {'errors':>6}"
+    )
+    for name in args.scenarios:
+        run_scenario(name, tokens, args.requests, panels)
+    app.processEvents()
+
+
+if __name__ == "__main__":
+    main()
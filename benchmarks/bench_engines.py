@@ -0,0 +1,120 @@
+"""Compare the thread and async engines with concurrent streams.
+
+Streams the sample response from a local fake Ollama server that paces
+its tokens like a model, with 1, 4 and 16 generations at once. The thread
+engine runs one generation at a time, as in the app; "threads" runs one
+worker thread per stream for comparison. Run from the repository root:
+
+    python -m benchmarks.bench_engines
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_engine import AsyncEngine
+from benchmarks.fake_ollama import FakeOllama, sample_tokens
+from http_pool import SessionPool
+from llm import IncrementalMarkdownResponseFormatter, LLMClient, ResponseStream
+from stream import iter_event_batches
+
+
+class NoFormatter:
+    """Skip formatting to measure the transport alone"""
+
+    def format_output(self, output, streaming=False):
+        return ""
+
+
+def new_stream(format_output: bool) -> ResponseStream:
+    """One stream per generation, each with its own formatter"""
+    formatter = (
+        IncrementalMarkdownResponseFormatter() if format_output else NoFormatter()
+    )
+    return ResponseStream(formatter, lambda *args, **kwargs: None)
+
+
+def run_threads(client, workers: int, streams: int, format_output: bool):
+    """Stream with blocking requests, `workers` generations at a time"""
+
+    def generate(start):
+        first_token = None
+        stream = new_stream(format_output)
+        with client.stream_response(
+            "fake", client._format_prompt("Hi", [])
+        ) as response:
+            for events in iter_event_batches(response):
+                first_token = first_token or time.perf_counter() - start
+                stream.feed(events)
+        stream.finish()
+        return first_token
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter()
+        futures = [executor.submit(generate, start) for _ in range(streams)]
+        return [future.result() for future in futures]
+
+
+def run_async(engine, url: str, streams: int, format_output: bool):
+    """Stream all generations at once on the async engine"""
+
+    async def generate(start):
+        first_token = None
+        stream = new_stream(format_output)
+        async for events in engine.stream_events(url, {"model": "fake"}):
+            first_token = first_token or time.perf_counter() - start
+            await engine.run_blocking(stream.feed, events)
+        await engine.run_blocking(stream.finish)
+        return first_token
+
+    async def generate_all():
+        start = time.perf_counter()
+        return await asyncio.gather(*(generate(start) for _ in range(streams)))
+
+    return engine.submit(generate_all()).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--tokens", type=int, default=300, help="Tokens per stream")
+    parser.add_argument("--delay", type=float, default=0.005, help="Seconds per token")
+    parser.add_argument("--format", action="store_true", help="Format the output")
+    args = parser.parse_args()
+
+    tokens = sample_tokens()[: args.tokens]
+    print(
+        f"{'streams':>7} {'engine':<8} {'wall s':>7} {'tokens/s':>9} "
+        f"{'first token s':>13} {'threads':>7}"
+    )
+    with FakeOllama(tokens, args.delay) as fake:
+        client = LLMClient(SessionPool(pool_size=max(args.streams)))
+        client.host = fake.url
+        engine = AsyncEngine()
+        for streams in args.streams:
+            runs = (
+                ("thread", lambda: run_threads(client, 1, streams, args.format)),
+                ("threads", lambda: run_threads(client, streams, streams, args.format)),
+                (
+                    "async",
+                    lambda: run_async(engine, client.api_url, streams, args.format),
+                ),
+            )
+            for name, run in runs:
+                start = time.perf_counter()
+                first_tokens = run()
+                wall = time.perf_counter() - start
+                print(
+                    f"{streams:>7} {name:<8} {wall:>7.2f} "
+                    f"{streams * len(tokens) / wall:>9.0f} "
+                    f"{sum(first_tokens) / streams:>13.3f} "
+                    f"{threading.active_count():>7}"
+                )
+        engine.close()
+        client.sessions.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Measure the cost of formatting a response as it streams in, token by token.
+
+Replays the sample response (docs/markdown_sample_output.md) and synthetic
+code-, table- and mermaid-heavy answers of growing size through the section
+parser and the incremental formatter, formatting after every token like an
+uncoalesced stream. Reports the time spent in each stage and the total.
+
+Costs are measured in CPU time and also stored relative to a fixed
+pure-Python workload, so a baseline recorded on one machine can be checked
+on another. A check replays the sizes of the baseline:
+
+    python -m benchmarks.bench_formatter
+    python -m benchmarks.bench_formatter --save-baseline --sizes 1000 10000
+    python -m benchmarks.bench_formatter --check --threshold 25
+
+With --check the exit status is 1 when any answer got slower than its
+baseline by more than the threshold, in percent; `make check` runs it after
+the tests. The stored baseline stops at 10k tokens: a 100k answer takes over
+two minutes to replay, so checking it would take half an hour with the
+replays of every answer. Compare it by hand with --sizes 100000.
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks.fake_ollama import sample_tokens, tokenize
+from llm import IncrementalMarkdownResponseFormatter
+from sections import SectionParser
+
+BASELINE_FILE = Path(__file__).resolve().parent / "bench_formatter_baseline.json"
+SIZES = (1_000, 10_000, 100_000)
+# Percent an answer may get slower than its baseline
+THRESHOLD = 25
+# Replays of each answer when saving or checking a baseline, the fastest counts
+BASELINE_RUNS = 3
+# CPU time of this process, so time the machine spends on others isn't counted
+clock = time.process_time
+STAGES = (
+    "sections",
+    "split",
+    "lists",
+    "mermaid",
+    "code",
+    "highlight",
+    "markdown",
+    "postprocess",
+    "assemble",
+)
+
+
+def code_block(i: int) -> str:
+    return f"""The loader number {i} reads the settings and cleans them up:
+
+```python
+import json
+from pathlib import Path
+
+
+def load_{i}(path: Path, retries: int = {i % 5 + 1}) -> dict:
+    for attempt in range(retries):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            break
+        except OSError:
+            continue
+    return {{key: value.strip() for key, value in data.items()}}
+```
+
+Call it from the startup code, after the logging setup:
+
+```javascript
+const settings{i} = await fetch(`/api/settings/{i}`).then((r) => r.json());
+console.log(settings{i}.name);
+```
+
+"""
+
+
+def table_block(i: int) -> str:
+    rows = "\n".join(
+        f"| model-{i}-{row} | {row * 7 % 13} GB | {row * 31 % 97}.{row} | "
+        f"{'yes' if row % 2 else 'no'} |"
+        for row in range(8)
+    )
+    return f"""### Comparison {i}
+
+The models of run {i} compare as follows:
+
+| Model | Memory | Tokens/s | Quantized |
+|-------|--------|----------|-----------|
+{rows}
+
+"""
+
+
+def mermaid_block(i: int) -> str:
+    nodes = "\n".join(f"    S{i}_{n} --> S{i}_{n + 1}" for n in range(8))
+    return f"""Step {i} of the pipeline works like this:
+
+<mermaid>
+graph TD
+{nodes}
+    S{i}_8 --> D{i}{{Done?}}
+    D{i} -->|yes| E{i}[End]
+    D{i} -->|no| S{i}_0
+</mermaid>
+
+Each stage hands its result to the next one.
+
+"""
+
+
+def synthetic_tokens(block, size: int) -> list[str]:
+    """Tokens of an answer made of numbered blocks, `size` tokens long"""
+    tokens = ["<think>", "Let", " me", " answer", ".", "</think>", "<output>", "\n"]
+    i = 0
+    while len(tokens) < size:
+        tokens.extend(tokenize(block(i)))
+        i += 1
+    return tokens[:size] + ["</output>"]
+
+
+def sample_answer(size: int) -> list[str]:
+    """The sample response, its output repeated to `size` tokens"""
+    repeat = 1
+    while len(sample_tokens(repeat)) < size:
+        repeat += 1
+    return sample_tokens(repeat)[:size] + ["</output>"]
+
+
+ANSWERS = {
+    "sample": sample_answer,
+    "code": lambda size: synthetic_tokens(code_block, size),
+    "table": lambda size: synthetic_tokens(table_block, size),
+    "mermaid": lambda size: synthetic_tokens(mermaid_block, size),
+}
+
+
+class StageTimer:
+    """Time spent in the wrapped methods, each call without its callees.
+
+    Methods are wrapped on their instance, so other instances are not
+    affected. Generators are run to the end inside the timing.
+    """
+
+    def __init__(self):
+        self.times: dict[str, float] = defaultdict(float)
+        self._children: list[float] = []
+
+    def wrap(self, obj, name: str, stage: str, generator: bool = False):
+        function = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            self._children.append(0.0)
+            start = clock()
+            try:
+                result = function(*args, **kwargs)
+                return list(result) if generator else result
+            finally:
+                elapsed = clock() - start
+                self.times[stage] += elapsed - self._children.pop()
+                if self._children:
+                    self._children[-1] += elapsed
+
+        setattr(obj, name, timed)
+
+
+def replay(tokens: list[str]) -> tuple[float, dict[str, float]]:
+    """Format the answer after every token, return the total and stage times"""
+    parser = SectionParser()
+    formatter = IncrementalMarkdownResponseFormatter()
+    timer = StageTimer()
+    for name in ("feed", "feed_thinking", "close"):
+        timer.wrap(parser, name, "sections")
+    timer.wrap(formatter, "_closed_blocks", "split", generator=True)
+    timer.wrap(formatter, "_preprocess_list_lines", "lists")
+    timer.wrap(formatter, "_process_mermaid", "mermaid")
+    timer.wrap(formatter, "_process_code_blocks", "code")
+    timer.wrap(formatter.highlighter, "highlight", "highlight")
+    timer.wrap(formatter.md, "convert", "markdown")
+    timer.wrap(formatter, "_fix_nested_lists", "postprocess")
+    timer.wrap(formatter, "_postprocess_html", "postprocess")
+    timer.wrap(formatter, "format_output", "assemble")
+
+    start = clock()
+    version = 0
+    for token in tokens:
+        parser.feed(token)
+        if parser.output_version != version:
+            version = parser.output_version
+            formatter.format_output(parser.output, parser.output_open)
+    parser.close()
+    formatter.format_output(parser.output, parser.output_open)
+    return clock() - start, dict(timer.times)
+
+
+def calibrate(runs: int = 5) -> float:
+    """CPU seconds of a fixed workload of regexes, strings and dicts.
+
+    It doesn't touch the code being measured, so the ratio of a replay to
+    it stays about the same from machine to machine.
+    """
+    text = "word, *emphasis* and `code` " * 4000
+    best = math.inf
+    for _ in range(runs):
+        start = clock()
+        for i in range(10):
+            re.sub(r"\*(\w+)\*", r"<em>\1</em>", text)
+            "\n".join(line.strip() for line in text.split(","))
+            json.dumps({f"key{n}": n * i for n in range(5000)}, sort_keys=True)
+        best = min(best, clock() - start)
+    return best
+
+
+def run(answers: list[str], sizes: list[int], runs: int) -> dict:
+    """Replay every answer at every size, print and return the results"""
+    results = {}
+    header = f"{'answer':<16} {'tokens':>7} {'total s':>8} {'us/token':>9}"
+    print(header + "".join(f" {stage[:9]:>9}" for stage in STAGES))
+    for answer in answers:
+        for size in sizes:
+            tokens = ANSWERS[answer](size)
+            # Calibrate next to each replay, the machine's load changes
+            calibration = math.inf
+            measured = []
+            for _ in range(runs):
+                calibration = min(calibration, calibrate(runs=2))
+                measured.append(replay(tokens))
+            total, stages = min(measured)
+            name = f"{answer}/{size}"
+            results[name] = {
+                "tokens": len(tokens),
+                "total": total,
+                "relative": total / calibration,
+                "stages": stages,
+            }
+            print(
+                f"{name:<16} {len(tokens):>7} {total:>8.2f} "
+                f"{total / len(tokens) * 1e6:>9.0f}"
+                + "".join(f" {stages.get(stage, 0.0):>9.3f}" for stage in STAGES)
+            )
+    return results
+
+
+def check(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """The answers more than `threshold` percent slower than the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = (result["relative"] / before["relative"] - 1) * 100
+        print(f"{name:<16} {change:>+7.1f}% against the baseline")
+        if change > threshold:
+            regressions.append(f"{name} is {change:.1f}% slower")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--answers", nargs="+", choices=ANSWERS, default=list(ANSWERS))
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, help="Tokens per answer, default: " + str(SIZES)
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store the results as baseline"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="Fail if slower than the baseline"
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "--runs",
+        type=int,
+        help=f"Replays per answer, default 1 or {BASELINE_RUNS} with a baseline",
+    )
+    args = parser.parse_args()
+
+    baseline = None
+    if args.check:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    # A check replays the sizes in the baseline, unless others are given
+    sizes = args.sizes or (baseline and baseline["sizes"]) or list(SIZES)
+
+    with_baseline = args.check or args.save_baseline
+    runs = args.runs or (BASELINE_RUNS if with_baseline else 1)
+
+    results = run(args.answers, sizes, runs)
+
+    if args.save_baseline:
+        baseline_data = {"sizes": sizes, "results": results}
+        args.baseline.write_text(
+            json.dumps(baseline_data, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"Saved the baseline to {args.baseline}")
+    if baseline is not None:
+        regressions = check(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions: " + "; ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Compare LanguageDetector with pygments.lexers.guess_lexer.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_language_detection
+"""
+
+import argparse
+import time
+
+from pygments.lexers import guess_lexer
+
+from language_detection import LanguageDetector
+
+# Labeled snippets, keyed by the Pygments lexer name they should be detected as
+SNIPPETS = {
+    "python": """import os
+
+class Loader:
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            print(f.read())
+""",
+    "javascript": """const express = require('express');
+const app = express();
+
+app.get('/', (req, res) => {
+    console.log('request');
+    res.send('Hello World');
+});
+
+function start(port) {
+    app.listen(port);
+}
+""",
+    "typescript": """export interface User {
+    id: number;
+    name: string;
+}
+
+export type Handler = (user: User) => void;
+
+function greet(user: User): string {
+    return `Hello ${user.name}`;
+}
+""",
+    "json": """{
+    "name": "llm_gui",
+    "version": "1.0.0",
+    "dependencies": {
+        "markdown": "3.5",
+        "requests": "2.31"
+    }
+}
+""",
+    "bash": """#!/bin/bash
+set -e
+export OLLAMA_HOST=http://localhost:11434
+if [ -z "$MODEL" ]; then
+    echo "No model"
+fi
+docker build -t llm_gui .
+""",
+    "html": """<!DOCTYPE html>
+<html>
+<head><title>Demo</title></head>
+<body>
+    <div class="content">
+        <p>Hello</p>
+    </div>
+</body>
+</html>
+""",
+    "css": """.panel {
+    background-color: #21252b;
+    border-radius: 4px;
+}
+
+#header > .title {
+    font-weight: bold;
+}
+""",
+    "sql": """SELECT users.name, COUNT(orders.id)
+FROM users
+JOIN orders ON orders.user_id = users.id
+WHERE orders.total > 100
+GROUP BY users.name
+ORDER BY 2 DESC;
+""",
+    "java": """import java.util.List;
+
+public class Main {
+    public static void main(String[] args) {
+        System.out.println("Hello");
+    }
+}
+""",
+    "c": """#include <stdio.h>
+
+int main(void) {
+    int x = 42;
+    printf("%d\\n", x);
+    return 0;
+}
+""",
+    "cpp": """#include <iostream>
+#include <vector>
+
+int main() {
+    std::vector<int> values{1, 2, 3};
+    std::cout << values.size() << std::endl;
+}
+""",
+    "go": """package main
+
+import "fmt"
+
+func main() {
+    message := "hello"
+    fmt.Println(message)
+}
+""",
+    "rust": """fn main() {
+    let mut total = 0;
+    for i in 0..10 {
+        total += i;
+    }
+    println!("{}", total);
+}
+""",
+    "yaml": """services:
+  app:
+    image: llm_gui
+    environment:
+      - OLLAMA_HOST=http://host.docker.internal:11434
+""",
+    "text": """Step 1: open the app
+Step 2: pick a model
+Step 3: ask a question
+""",
+}
+
+
+def matches(label: str, lexer) -> bool:
+    """Whether a Pygments lexer corresponds to the expected label"""
+    names = {lexer.name.lower(), *(alias.lower() for alias in lexer.aliases)}
+    return label in names or (label == "text" and "text" in lexer.name.lower())
+
+
+def run_guess_lexer(code: str):
+    start = time.perf_counter()
+    lexer = guess_lexer(code)
+    return lexer, time.perf_counter() - start
+
+
+def run_detector(code: str):
+    detector = LanguageDetector()
+    start = time.perf_counter()
+    language = detector.detect(code)
+    return language, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[1, 20, 200],
+        help="Repeat every snippet this many times to build larger blocks",
+    )
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'method':<12} {'accuracy':>9} {'mean ms':>9} {'max ms':>9}")
+    for scale in args.scales:
+        guess_hits, detect_hits = 0, 0
+        guess_times, detect_times = [], []
+        for label, snippet in SNIPPETS.items():
+            code = "\n".join([snippet] * scale)
+
+            lexer, elapsed = run_guess_lexer(code)
+            guess_hits += matches(label, lexer)
+            guess_times.append(elapsed)
+
+            language, elapsed = run_detector(code)
+            detect_hits += language == label
+            detect_times.append(elapsed)
+
+        total = len(SNIPPETS)
+        for method, hits, times in (
+            ("guess_lexer", guess_hits, guess_times),
+            ("detector", detect_hits, detect_times),
+        ):
+            print(
+                f"{scale:>6} {method:<12} {hits / total:>9.0%} "
+                f"{1000 * sum(times) / total:>9.2f} {1000 * max(times):>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Compare prompt evaluation per turn of the chat and generate endpoints.
+
+Runs the same conversation through both prompt layouts and prints the
+prompt tokens Ollama evaluated and how long that took, per turn. Without
+--host it runs against the fake server, which simulates Ollama's prefix
+cache. Run from the repository root:
+
+    python -m benchmarks.bench_prefill
+    python -m benchmarks.bench_prefill --host http://localhost:11434 --model mistral
+"""
+
+import argparse
+import contextlib
+
+from benchmarks.fake_ollama import FakeOllama, sample_tokens
+from llm import LLMClient, MarkdownResponseFormatter, ResponseStream
+from stream import iter_event_batches
+
+QUESTIONS = [
+    "Explain how a hash map handles collisions.",
+    "Show an example in Python.",
+    "How does resizing work?",
+    "What is the worst case lookup time?",
+    "Compare it with a balanced tree.",
+    "Summarize the trade-offs in a table.",
+]
+
+
+def converse(client: LLMClient, model: str, questions: list[str]):
+    """Yield (prompt tokens, prefill seconds) for each turn"""
+    history = []
+    for question in questions:
+        history.append({"role": "user", "content": question})
+        stream = ResponseStream(
+            MarkdownResponseFormatter(), lambda *args, **kwargs: None
+        )
+        prompt = client._format_prompt(question, history)
+        with client.stream_response(model, prompt) as response:
+            for events in iter_event_batches(response):
+                stream.feed(events)
+        history[-1]["llm_history"] = stream.finish()
+        done = stream.done_event or {}
+        seconds = done.get("prompt_eval_duration", 0) / 1e9
+        yield done.get("prompt_eval_count", 0), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", help="Ollama host, the fake server by default")
+    parser.add_argument("--model", default="fake")
+    parser.add_argument("--turns", type=int, default=len(QUESTIONS))
+    args = parser.parse_args()
+
+    questions = QUESTIONS[: args.turns]
+    with contextlib.ExitStack() as stack:
+        host = args.host
+        if host is None:
+            host = stack.enter_context(FakeOllama(sample_tokens()[:300])).url
+
+        results = {
+            api: list(converse(LLMClient(host=host, api=api), args.model, questions))
+            for api in ("generate", "chat")
+        }
+
+    print(f"{'turn':>4} {'generate tokens':>15} {'s':>6} {'chat tokens':>11} {'s':>6}")
+    for turn, (generate, chat) in enumerate(zip(*results.values()), 1):
+        print(
+            f"{turn:>4} {generate[0]:>15} {generate[1]:>6.2f} "
+            f"{chat[0]:>11} {chat[1]:>6.2f}"
+        )
+    totals = [sum(seconds for _, seconds in turns) for turns in results.values()]
+    print(f"total prefill: generate {totals[0]:.2f} s, chat {totals[1]:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Measure how many streamed tokens per second the response reader handles.
+
+Streams the sample response from a local fake Ollama server. Both readers
+do the same work per event (decode it, keep the text, route it to its
+section): "lines" the old way, with iter_lines, json.loads and string
+concatenation per line, "decoder" with the stream decoder. With --format
+each one formats the output as the app did, after every line and after
+every network read. "app" is ResponseStream, the reader as the app runs it,
+posting its updates nowhere. Run from the repository root:
+
+    python -m benchmarks.bench_stream
+"""
+
+import argparse
+import json
+import time
+
+import requests
+
+from benchmarks.fake_ollama import FakeOllama, sample_tokens
+from llm import IncrementalMarkdownResponseFormatter, ResponseStream
+from sections import SectionParser
+from stream import StreamText, iter_event_batches, orjson
+
+
+class NoFormatter:
+    """Skip formatting to measure reading alone"""
+
+    def format_output(self, output, streaming=False):
+        return ""
+
+
+def read_lines(response, formatter):
+    """The reader before the stream decoder: one format per line"""
+    full_response = ""
+    sections = SectionParser()
+    for line in response.iter_lines():
+        if line:
+            text = json.loads(line).get("response", "")
+            full_response += text
+            sections.feed(text)
+            if formatter:
+                formatter.format_output(sections.output, sections.output_open)
+    return full_response
+
+
+def read_batches(response, formatter):
+    """The stream decoder and section parser: one format per network read"""
+    full_response = StreamText()
+    sections = SectionParser()
+    for events in iter_event_batches(response):
+        for event in events:
+            text = event.get("response", "")
+            full_response.append(text)
+            sections.feed(text)
+        if formatter:
+            formatter.format_output(sections.output, sections.output_open)
+    return str(full_response)
+
+
+def read_app(response, formatter):
+    """The app's reader: sections, formatting and updates per network read"""
+    stream = ResponseStream(formatter or NoFormatter(), lambda *args, **kwargs: None)
+    for events in iter_event_batches(response):
+        stream.feed(events)
+    return stream.finish()
+
+
+def run(url: str, reader, format_output: bool) -> float:
+    """Stream one response and return the elapsed seconds"""
+    formatter = IncrementalMarkdownResponseFormatter() if format_output else None
+    start = time.perf_counter()
+    with requests.post(
+        f"{url}/api/generate", json={"model": "fake"}, stream=True
+    ) as response:
+        reader(response, formatter)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Repeat the sample")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds per token")
+    args = parser.parse_args()
+
+    tokens = sample_tokens(args.repeat)
+    print(f"{len(tokens)} tokens, JSON backend: {'orjson' if orjson else 'json'}")
+    print(f"{'reader':<10} {'format':<7} {'tokens/s':>10}")
+    with FakeOllama(tokens, args.delay) as fake:
+        for format_output in (False, True):
+            for name, reader in (
+                ("lines", read_lines),
+                ("decoder", read_batches),
+                ("app", read_app),
+            ):
+                elapsed = min(
+                    run(fake.url, reader, format_output) for _ in range(args.runs)
+                )
+                print(
+                    f"{name:<10} {str(format_output):<7} "
+                    f"{len(tokens) / elapsed:>10.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
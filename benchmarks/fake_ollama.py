@@ -0,0 +1,312 @@
+"""Local stand-in for the Ollama API that streams a canned response.
+
+Serves /api/generate, /api/chat, /api/tags and /api/ps. The stream can be
+paced like a model, with a first-token delay, stalls, errors and network
+chunks of a given size. Run it on its own and point the app at it:
+
+    python -m benchmarks.fake_ollama --port 11435 --rate 50 --stall-every 200
+    OLLAMA_HOST=http://localhost:11435 python main.py
+
+or start it from a benchmark with `FakeOllama`.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Prompt tokens evaluated per second
+PREFILL_RATE = 2000
+
+# Size of each fake model, on disk and loaded
+MODEL_SIZE = 4_700_000_000
+
+SAMPLE_FILE = Path(__file__).resolve().parent.parent / "docs/markdown_sample_output.md"
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into word and whitespace pieces, roughly like LLM tokens"""
+    return re.findall(r"\s+|\w+|[^\w\s]", text)
+
+
+def sample_tokens(repeat: int = 1) -> list[str]:
+    """Tokens of the sample response, repeated to make it longer"""
+    text = SAMPLE_FILE.read_text(encoding="utf-8")
+    # The thinking mentions <output> too, so look for it after </think>
+    start = text.index("<output>", text.index("</think>")) + len("<output>")
+    end = text.index("</output>", start)
+    return tokenize(text[:start] + text[start:end] * repeat + "</output>")
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [self._model(m) for m in self.server.models]})
+        elif self.path == "/api/ps":
+            models = []
+            for name, expires_at in self.server.loaded.items():
+                model = self._model(name)
+                model.update(size_vram=MODEL_SIZE, expires_at=expires_at)
+                models.append(model)
+            self._send_json({"models": models})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests.append(request)
+        if self.path not in ("/api/generate", "/api/chat"):
+            self.send_error(404)
+            return
+        chat = self.path == "/api/chat"
+        self._load(request)
+        if request.get("stream") is False:
+            self._respond_whole(request, chat)
+            return
+        if self.server.random.random() < self.server.error_rate:
+            self._send_json({"error": "fake server error"}, status=500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        server = self.server
+        model = request.get("model", "fake")
+        self._pending = bytearray()
+        start = time.perf_counter()
+        try:
+            # Loading the model and evaluating the prompt
+            time.sleep(server.first_token_delay)
+            for count, token in enumerate(server.tokens, 1):
+                if server.error_after is not None and count > server.error_after:
+                    # Ollama reports errors after the headers as an event
+                    self._send_event({"error": f"fake error after {count - 1} tokens"})
+                    self._end_stream()
+                    return
+                self._send_event(self._event(model, token, chat, done=False))
+                if server.stall_every and count % server.stall_every == 0:
+                    time.sleep(server.stall_time)
+                if server.token_delay:
+                    time.sleep(server.token_delay)
+            done = self._event(model, "", chat, done=True)
+            done["prompt_eval_count"] = self._prefill(model, request, chat)
+            done["prompt_eval_duration"] = int(
+                done["prompt_eval_count"] / PREFILL_RATE * 1e9
+            )
+            done["eval_count"] = len(server.tokens)
+            done["eval_duration"] = int((time.perf_counter() - start) * 1e9)
+            self._send_event(done)
+            self._end_stream()
+        except ConnectionError:
+            # Like Ollama, stop generating when the client disconnects
+            server.disconnects += 1
+            self.close_connection = True
+
+    def _respond_whole(self, request: dict, chat: bool):
+        """Answer a request with stream set to false in one JSON object"""
+        model = request.get("model", "fake")
+        if not request.get("prompt") and not request.get("messages"):
+            # Nothing to generate, Ollama only loads or unloads the model
+            response = self._event(model, "", chat, done=True)
+            unload = str(request.get("keep_alive")) == "0"
+            response["done_reason"] = "unload" if unload else "load"
+        else:
+            text = "".join(self.server.tokens)
+            response = self._event(model, text, chat, done=True)
+            response["prompt_eval_count"] = self._prefill(model, request, chat)
+        self._send_json(response)
+
+    def _send_json(self, response: dict, status: int = 200):
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _prefill(self, model: str, request: dict, chat: bool) -> int:
+        """Count the prompt tokens a prefix cache like Ollama's would miss.
+
+        The prompt is laid out like a chat template. Only what follows the
+        longest prefix it shares with the previous prompt and response of
+        the model is evaluated.
+        """
+        if chat:
+            prompt = "".join(
+                f"<|{message['role']}|>{message['content']}"
+                for message in request.get("messages", [])
+            )
+        else:
+            prompt = request.get("prompt", "")
+        cached = self.server.prompt_cache.get(model, "")
+        shared = len(os.path.commonprefix([cached, prompt]))
+        response = "".join(self.server.tokens)
+        self.server.prompt_cache[model] = f"{prompt}<|assistant|>{response}"
+        return len(tokenize(prompt[shared:]))
+
+    def _load(self, request: dict):
+        """Track which models are loaded, like /api/ps reports them"""
+        model = request.get("model", "fake")
+        if str(request.get("keep_alive")) == "0":
+            self.server.loaded.pop(model, None)
+        else:
+            if model not in self.server.loaded:
+                # Ollama answers once the model is loaded
+                time.sleep(self.server.load_delay)
+            self.server.loaded[model] = "2030-01-01T00:00:00Z"
+
+    @staticmethod
+    def _model(name: str) -> dict:
+        details = {"parameter_size": "7B", "quantization_level": "Q4_K_M"}
+        return {"name": name, "model": name, "size": MODEL_SIZE, "details": details}
+
+    @staticmethod
+    def _event(model: str, token: str, chat: bool, done: bool) -> dict:
+        if chat:
+            message = {"role": "assistant", "content": token}
+            return {"model": model, "message": message, "done": done}
+        return {"model": model, "response": token, "done": done}
+
+    def _send_event(self, event: dict):
+        """Send an event, or queue it until a chunk of `chunk_size` is full"""
+        self._pending += json.dumps(event).encode() + b"\n"
+        chunk_size = self.server.chunk_size or len(self._pending)
+        while len(self._pending) >= chunk_size:
+            self._send_chunk(self._pending[:chunk_size])
+            del self._pending[:chunk_size]
+
+    def _end_stream(self):
+        if self._pending:
+            self._send_chunk(self._pending)
+            self._pending.clear()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+class FakeOllama:
+    """Fake Ollama server running on a background thread.
+
+    Use as a context manager; `url` is the host to send requests to,
+    `requests` the request bodies received so far and `disconnects` the
+    number of responses the client closed early. `models` are the installed
+    models /api/tags lists; /api/ps lists those requested since (with a
+    keep_alive other than 0).
+
+    Requests for a model that isn't loaded wait `load_delay` seconds before
+    the headers are sent. Streams wait `first_token_delay` seconds before
+    the first token and `token_delay` after each one, and stall for
+    `stall_time` seconds every `stall_every` tokens. Events are written in
+    chunks of `chunk_size` bytes, split across events, or one at a time
+    with 0. A share `error_rate` of the streams fail with a 500, and with
+    `error_after` all streams end with an error event after that many
+    tokens.
+    """
+
+    def __init__(
+        self,
+        tokens: list[str],
+        token_delay: float = 0.0,
+        port: int = 0,
+        models: list[str] = ("fake",),
+        first_token_delay: float = 0.0,
+        load_delay: float = 0.0,
+        chunk_size: int = 0,
+        stall_every: int = 0,
+        stall_time: float = 0.0,
+        error_rate: float = 0.0,
+        error_after: int = None,
+        seed: int = 0,
+    ):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), FakeOllamaHandler)
+        self.server.daemon_threads = True
+        self.server.tokens = tokens
+        self.server.token_delay = token_delay
+        self.server.requests = []
+        self.server.prompt_cache = {}
+        self.server.disconnects = 0
+        self.server.models = list(models)
+        self.server.loaded = {}
+        self.server.first_token_delay = first_token_delay
+        self.server.load_delay = load_delay
+        self.server.chunk_size = chunk_size
+        self.server.stall_every = stall_every
+        self.server.stall_time = stall_time
+        self.server.error_rate = error_rate
+        self.server.error_after = error_after
+        self.server.random = random.Random(seed)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def requests(self) -> list[dict]:
+        return self.server.requests
+
+    @property
+    def disconnects(self) -> int:
+        return self.server.disconnects
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the sample")
+    parser.add_argument("--delay", type=float, default=0.01, help="Seconds per token")
+    parser.add_argument("--rate", type=float, help="Tokens per second, for --delay")
+    parser.add_argument("--models", nargs="+", default=["fake"])
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--load-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--chunk-size", type=int, default=0, help="Bytes per write, 0 per event"
+    )
+    parser.add_argument("--stall-every", type=int, default=0, help="Tokens")
+    parser.add_argument("--stall-time", type=float, default=1.0, help="Seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-after", type=int, help="Tokens")
+    args = parser.parse_args()
+
+    fake = FakeOllama(
+        sample_tokens(args.repeat),
+        1 / args.rate if args.rate else args.delay,
+        args.port,
+        args.models,
+        first_token_delay=args.first_token_delay,
+        load_delay=args.load_delay,
+        chunk_size=args.chunk_size,
+        stall_every=args.stall_every,
+        stall_time=args.stall_time,
+        error_rate=args.error_rate,
+        error_after=args.error_after,
+    )
+    print(f"Serving {len(fake.server.tokens)} tokens on {fake.url}")
+    fake.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from typing import Optional
+
+from templates import HTMLTemplates
+
+
+def split_blocks(html_content: str) -> list[str]:
+    """Split formatted content into blocks"""
+    if not html_content:
+        return []
+    return html_content.split(HTMLTemplates.BLOCK_SEPARATOR)
+
+
+def first_changed_block(shown: list[str], blocks: list[str]) -> Optional[int]:
+    """Return the index of the first block that differs, or None if none do.
+
+    Blocks from that index on have to be replaced; a shorter `blocks`
+    means the blocks after it are removed.
+    """
+    start = 0
+    common = min(len(shown), len(blocks))
+    while start < common and shown[start] == blocks[start]:
+        start += 1
+
+    if start == len(shown) == len(blocks):
+        return None
+    return start
+
+
+class BlockPatcher:
+    """Track which blocks a page shows and compute the patches to send it.
+
+    Content set before the page has loaded is kept and sent in full once
+    it has.
+    """
+
+    def __init__(self, content: str = ""):
+        self.loaded = False
+        self._shown_blocks: list[str] = []
+        self._blocks = split_blocks(content)
+
+    def set_content(self, html_content: str) -> Optional[tuple[int, list[str]]]:
+        """Return the (start, blocks) patch for new content, if one is due"""
+        self._blocks = split_blocks(html_content)
+        return self._patch() if self.loaded else None
+
+    def load_finished(self, ok: bool) -> Optional[tuple[int, list[str]]]:
+        """Return the patch that fills a freshly loaded, empty page"""
+        self.loaded = ok
+        self._shown_blocks = []
+        return self._patch() if ok else None
+
+    def _patch(self) -> Optional[tuple[int, list[str]]]:
+        start = first_changed_block(self._shown_blocks, self._blocks)
+        if start is None:
+            return None
+        self._shown_blocks = self._blocks
+        return start, self._blocks[start:]
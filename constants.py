@@ -1,3 +1,5 @@
+from pathlib import Path
+
 MODEL_LIST = [
     "deepseek-r1:32b",
     "deepseek-r1:8b",
@@ -7,6 +9,103 @@ MODEL_LIST = [
     "codellama",
 ]
 APP_NAME = "Ollama GUI"
+
+# Bundled web assets (e.g. mermaid.min.js, see `make assets`)
+ASSETS_DIR = Path(__file__).resolve().parent / "assets"
+
+# Streamed updates are coalesced into at most UI_MAX_FPS frames per second.
+# The frame rate drops when rendering is slow, but never below UI_MIN_FPS.
+UI_MAX_FPS = 30
+UI_MIN_FPS = 4
+
+# Lines kept by the console and raw event views, older lines are dropped
+CONSOLE_MAX_LINES = 5000
+
+# Number of highlighted code blocks kept by the formatter
+HIGHLIGHT_CACHE_SIZE = 256
+
+# Bytes read from the streaming response at once. Reads return as soon as
+# data arrives, so this only bounds the size of a read.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Connections kept open per Ollama host, and attempts to connect again
+# when a connection can't be established
+HTTP_POOL_SIZE = 4
+HTTP_RETRIES = 3
+# Seconds to wait for a connection, for the first token (which includes
+# loading the model) and between later tokens
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_FIRST_TOKEN_TIMEOUT = 300
+HTTP_READ_TIMEOUT = 60
+
+# How generations are streamed: "thread" runs them on a worker thread,
+# "async" on an asyncio loop (needs aiohttp) that can stream several at once
+# over at most ASYNC_MAX_CONNECTIONS connections. The chat runs one turn at
+# a time with either; only the fan-out view streams several at once
+LLM_ENGINE = "thread"
+
+# Ollama endpoint: "chat" sends the conversation as messages after a fixed
+# system message, so each turn's prompt extends the previous one and Ollama
+# reuses its cached prefill; "generate" sends one flat prompt per turn
+OLLAMA_API = "chat"
+ASYNC_MAX_CONNECTIONS = 8
+
+# Context window (num_ctx) requested from Ollama, per model (with or
+# without the tag) and for all others. Prompts are built to leave
+# CONTEXT_RESPONSE_TOKENS of it for the response; older turns that don't
+# fit are left out instead of being cut off by Ollama.
+CONTEXT_WINDOW = 8192
+MODEL_CONTEXT_WINDOWS = {"llama2": 4096, "codellama": 16384}
+CONTEXT_RESPONSE_TOKENS = 2048
+
+# Model that condenses the turns left out of the context into a summary,
+# which is sent in their place (e.g. "deepseek-r1:1.5b"). It runs in the
+# background after a response finished; None turns summaries off.
+SUMMARY_MODEL = None
+# Length the summary is asked to stay within, in tokens
+SUMMARY_TOKENS = 400
+
+# Finished turns are saved to this SQLite database
+CONVERSATION_DB = Path("conversations") / "conversations.db"
+
+# Responses are journaled as they stream, so a crash doesn't lose them;
+# deltas are written every JOURNAL_FLUSH_INTERVAL seconds. Finished turns
+# are saved AUTOSAVE_DELAY seconds after the last one, off the GUI thread.
+JOURNAL_FILE = Path("conversations") / "journal.jsonl"
+JOURNAL_FLUSH_INTERVAL = 0.25
+AUTOSAVE_DELAY = 1.0
+
+# Installed and loaded models are refreshed from Ollama every
+# MODEL_REFRESH_INTERVAL seconds and cached in MODEL_CACHE_FILE, so the model
+# list is there at startup before Ollama answers. MODEL_LIST is used until
+# the first refresh.
+MODEL_REFRESH_INTERVAL = 30
+MODEL_CACHE_FILE = Path.home() / ".cache" / "llm_gui" / "models.json"
+
+# How long Ollama keeps a model loaded after its last request, per model
+# (with or without the tag) and for all others: a duration like "10m",
+# "-1" to keep it loaded or "0" to unload it right away. Selecting a model
+# loads it in the background.
+KEEP_ALIVE = "30m"
+MODEL_KEEP_ALIVE = {"deepseek-r1:32b": "10m"}
+
+# Sampling options sent with every generation, e.g. {"temperature": 0} or
+# {"seed": 42}; Ollama's defaults sample differently every time
+GENERATION_OPTIONS = {}
+
+# Responses of deterministic generations (a seed or a temperature of 0)
+# are cached in RESPONSE_CACHE_DIR, keyed by model, prompt and options, and
+# replayed when the same request is sent again. The least recently used
+# are deleted beyond RESPONSE_CACHE_SIZE bytes; None turns the cache off.
+RESPONSE_CACHE_DIR = Path.home() / ".cache" / "llm_gui" / "responses"
+RESPONSE_CACHE_SIZE = 100 * 1024 * 1024
+
+# Generations a comparison runs at once; the others wait for a free slot.
+# Ollama itself runs OLLAMA_NUM_PARALLEL requests per model at a time.
+FAN_OUT_CONCURRENCY = 4
+
+# Streams `main.py batch` runs at once per model, unless --parallel is given
+BATCH_PARALLEL = 2
 FORMATTING_INSTRUCTIONS = """
 Please format your response with <think> tags for your thinking process and <output> tags for the final response. If you need to include any chart, please use Mermaid syntax within <mermaid> tags.
 
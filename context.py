@@ -0,0 +1,164 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+from constants import CONTEXT_RESPONSE_TOKENS, CONTEXT_WINDOW, MODEL_CONTEXT_WINDOWS
+from models import model_setting
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_THINK = re.compile(r"<think>.*?(?:</think>|\Z)", re.DOTALL)
+
+# Tokens the chat template adds around every message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens of a text, erring on the high side.
+
+    Tokenizers split text into word pieces of a few characters and most
+    punctuation into tokens of its own. Counting one token per started six
+    characters of a word and one per symbol lands slightly above the real
+    count for English prose and code.
+    """
+    return sum(1 + (len(piece) - 1) // 6 for piece in _PIECE.findall(text))
+
+
+@lru_cache(maxsize=1024)
+def strip_thinking(text: str) -> str:
+    """Remove the thinking sections of a response, including an unclosed one"""
+    return _THINK.sub("", text).strip()
+
+
+def message_tokens(message: dict) -> int:
+    return MESSAGE_OVERHEAD + estimate_tokens(message["content"])
+
+
+def context_window(model: Optional[str]) -> int:
+    """Context window (num_ctx) to request for a model"""
+    return model_setting(MODEL_CONTEXT_WINDOWS, model, CONTEXT_WINDOW)
+
+
+class ContextBuilder:
+    """Fit a conversation into a model's context window.
+
+    Earlier turns are kept whole, user message and response together, with
+    the thinking removed from responses. What doesn't fit the window, after
+    the system message, the new message and `reserve` tokens for the
+    response, is dropped from the start. Dropping cuts back to half the
+    budget, so the next turns keep the same prefix (and Ollama its cache)
+    until the window fills again.
+
+    With a `summarizer`, the dropped turns are replaced by its summary of
+    them, sent as a second system message. `summarize_dropped` asks for the
+    summary to catch up once a response finished.
+    """
+
+    def __init__(self, reserve: int = CONTEXT_RESPONSE_TOKENS, summarizer=None):
+        self.reserve = reserve
+        self.summarizer = summarizer
+        self._start = 0
+        self._dropped: Optional[tuple[list, int]] = None
+
+    def build(
+        self, system: str, chat_history: list, user_input: str, model: str = None
+    ) -> list[dict]:
+        """Return the messages to send for a turn"""
+        messages, turns, self._start = self._layout(
+            system, chat_history, user_input, model
+        )
+        if self.summarizer is not None and self._start:
+            self._dropped = (turns, self._start)
+        return messages
+
+    def usage(
+        self, system: str, chat_history: list, user_input: str, model: str = None
+    ) -> tuple[int, int]:
+        """Estimate the prompt tokens of the next turn and the model's window"""
+        try:
+            messages = self._layout(system, chat_history, user_input, model)[0]
+        except ValueError:
+            # Too long to fit, count it anyway
+            messages = [{"content": system}, {"content": user_input}]
+        return sum(map(message_tokens, messages)), context_window(model)
+
+    def summarize_dropped(self):
+        """Bring the summary up to the turns the last prompt left out"""
+        if self._dropped is not None:
+            self.summarizer.request(*self._dropped)
+            self._dropped = None
+
+    def _layout(
+        self, system: str, chat_history: list, user_input: str, model: Optional[str]
+    ) -> tuple[list[dict], list, int]:
+        """Return the messages of a turn, the earlier turns and the first sent"""
+        system_message = {"role": "system", "content": system}
+        turns, current = self._split(chat_history, user_input)
+        fixed = message_tokens(system_message) + message_tokens(current)
+        room = context_window(model) - self.reserve
+        if fixed > room:
+            raise ValueError(
+                f"The message is about {fixed} tokens, {model or 'the model'} "
+                f"has room for {room} in its context window"
+            )
+        # Leave room for the summary that will replace dropped turns
+        summary = self._summary(turns, self._start)
+        budget = room - fixed - sum(map(message_tokens, summary))
+        start = self._plan(turns, budget, self._start)
+        summary = self._summary(turns, start)
+
+        messages = [system_message, *summary]
+        for turn in turns[start:]:
+            messages.extend(turn)
+        messages.append(current)
+        return messages, turns, start
+
+    def _summary(self, turns: list, start: int) -> list[dict]:
+        """The summary message of the turns before `start`, if there is one"""
+        if self.summarizer is None or not start:
+            return []
+        _, summary = self.summarizer.summary(turns, min(start, len(turns)))
+        if not summary:
+            return []
+        return [
+            {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}",
+            }
+        ]
+
+    @staticmethod
+    def _split(chat_history: list, user_input: str) -> tuple[list, dict]:
+        """Split the history into earlier turns and the current message"""
+        turns = []
+        for entry in chat_history:
+            turn = [{"role": entry["role"], "content": entry["content"]}]
+            if "llm_history" in entry:
+                content = strip_thinking(entry["llm_history"])
+                turn.append({"role": "assistant", "content": content})
+            turns.append(turn)
+        current = {"role": "user", "content": user_input}
+        # The user message of this turn is usually in the history already
+        if turns and turns[-1] == [current]:
+            turns.pop()
+        return turns, current
+
+    @staticmethod
+    def _plan(turns: list, budget: int, start: int) -> int:
+        """Index of the first turn to send"""
+        if start > len(turns):
+            start = 0  # A new conversation
+        costs = [sum(map(message_tokens, turn)) for turn in turns]
+        if sum(costs[start:]) <= budget:
+            return start
+        # Cut back to half the budget, or as far as needed for the newest
+        # turns to fit at all
+        for limit in (budget // 2, budget):
+            total = sum(costs[start:])
+            first = start
+            while first < len(turns) and total > limit:
+                total -= costs[first]
+                first += 1
+            if first < len(turns):
+                return first
+        return len(turns)
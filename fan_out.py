@@ -0,0 +1,197 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
+
+from PySide6.QtCore import Signal
+
+from async_engine import AsyncEngine
+from constants import FAN_OUT_CONCURRENCY, UI_MAX_FPS, UI_MIN_FPS
+from context import ContextBuilder
+from llm import (
+    IncrementalMarkdownResponseFormatter,
+    LLMClient,
+    LLMSignals,
+    ResponseStream,
+)
+from scheduler import UpdateScheduler
+from stream import event_text
+
+
+class FanOutTarget(NamedTuple):
+    """One generation of a comparison: a model, and a seed for samples"""
+
+    model: str
+    seed: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        if self.seed is None:
+            return self.model
+        return f"{self.model} (seed {self.seed})"
+
+
+def fan_out_targets(models: list[str], samples: int = 1) -> list[FanOutTarget]:
+    """One target per model, or `samples` seeded targets per model"""
+    if samples == 1:
+        return [FanOutTarget(model) for model in models]
+    return [FanOutTarget(model, seed) for model in models for seed in range(samples)]
+
+
+@dataclass
+class StreamMetrics:
+    """Timing of one streamed generation, in seconds since it was sent"""
+
+    start: float
+    first_token: Optional[float] = None
+    end: Optional[float] = None
+    tokens: int = 0
+    # Ollama reports the evaluated tokens and their time with the last event
+    eval_count: int = 0
+    eval_duration: float = 0.0
+
+    def add(self, events: list[dict], now: float):
+        """Count the tokens of events that arrived at `now`"""
+        for event in events:
+            if any(event_text(event)):
+                self.tokens += 1
+            if event.get("done"):
+                self.eval_count = event.get("eval_count", 0)
+                self.eval_duration = event.get("eval_duration", 0) / 1e9
+        if self.first_token is None and self.tokens:
+            self.first_token = now - self.start
+
+    def finish(self, now: float):
+        self.end = now - self.start
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / self.eval_duration
+        if self.first_token is None or self.tokens < 2:
+            return 0.0
+        elapsed = (self.end or time.perf_counter() - self.start) - self.first_token
+        return (self.tokens - 1) / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        if self.first_token is None:
+            return "Waiting for the first token..."
+        text = (
+            f"first token {self.first_token:.2f} s · "
+            f"{self.tokens_per_second:.1f} tokens/s"
+        )
+        if self.end is not None:
+            text += f" · {self.end:.1f} s"
+        return text
+
+
+class FanOutSignals(LLMSignals):
+    metrics_update = Signal(str)
+
+
+class FanOutPane:
+    """State of one generation of a comparison and the signals of its pane"""
+
+    def __init__(self, target: FanOutTarget, max_fps: float):
+        self.target = target
+        self.signals = FanOutSignals()
+        self.scheduler = UpdateScheduler(self.signals, max_fps, UI_MIN_FPS)
+        self.formatter = IncrementalMarkdownResponseFormatter()
+        # The history kept for this model, independent of the other panes
+        self.context = ContextBuilder()
+        self.metrics: Optional[StreamMetrics] = None
+
+
+class FanOutHandler:
+    """Send one prompt to several models, or seeds of a model, at once.
+
+    Every generation streams into its own pane with its own formatter and
+    scheduler. At most `concurrency` generations run at a time on the async
+    engine; the metrics of a generation start when its request is sent, so
+    waiting for a slot doesn't count against a model. Results are not added
+    to the chat history.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = FAN_OUT_CONCURRENCY,
+        max_fps: float = UI_MAX_FPS,
+        engine: AsyncEngine = None,
+        client: LLMClient = None,
+    ):
+        self.concurrency = concurrency
+        self.max_fps = max_fps
+        self.client = client or LLMClient()
+        self._engine = engine
+        self.panes: list[FanOutPane] = []
+        self._current_future = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self._engine = AsyncEngine()
+        return self._engine
+
+    def set_targets(self, targets: list[FanOutTarget]) -> list[FanOutPane]:
+        """Create the panes of the next comparison, to connect their signals"""
+        self.cancel()
+        self.panes = [FanOutPane(target, self.max_fps) for target in targets]
+        return self.panes
+
+    def get_responses(self, user_input: str, chat_history: list):
+        """Start the generations of all panes"""
+        self.cancel()
+        self._current_future = self.engine.submit(
+            self._generate_all(user_input, chat_history, self.panes)
+        )
+
+    def cancel(self):
+        """Stop the running comparison"""
+        if self._current_future:
+            self._current_future.cancel()
+            self._current_future = None
+
+    async def _generate_all(
+        self, user_input: str, chat_history: list, panes: list[FanOutPane]
+    ):
+        slots = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(
+            *(self._generate(slots, user_input, chat_history, pane) for pane in panes)
+        )
+
+    async def _generate(
+        self,
+        slots: asyncio.Semaphore,
+        user_input: str,
+        chat_history: list,
+        pane: FanOutPane,
+    ):
+        post = pane.scheduler.post
+        model, seed = pane.target
+        try:
+            # Each model gets the history that fits its context window
+            prompt = self.client._format_prompt(
+                user_input, chat_history, model, context=pane.context
+            )
+            async with slots:
+                metrics = pane.metrics = StreamMetrics(time.perf_counter())
+                stream = ResponseStream(pane.formatter, post)
+                payload = self.client.build_payload(model, prompt, seed)
+                async for events in self.engine.stream_events(
+                    self.client.api_url, payload
+                ):
+                    metrics.add(events, time.perf_counter())
+                    # Formatting runs off the loop, the other panes keep reading
+                    await self.engine.run_blocking(stream.feed, events)
+                    post("metrics_update", str(metrics))
+                full_response = await self.engine.run_blocking(stream.finish)
+                metrics.finish(time.perf_counter())
+            post("metrics_update", str(metrics), coalesce=False)
+            post("llm_history_update", full_response, coalesce=False)
+        except Exception as e:
+            post("error_occurred", str(e), coalesce=False)
+
+    def close(self):
+        self.cancel()
+        if self._engine is not None:
+            self._engine.close()
@@ -0,0 +1,88 @@
+import html
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QLabel, QMainWindow, QSplitter, QVBoxLayout, QWidget
+
+from constants import APP_NAME
+from fan_out import FanOutHandler, FanOutPane, FanOutTarget
+from output_view import OutputView
+from styles import Styles
+from templates import HTMLTemplates
+
+
+class FanOutWindow(QMainWindow):
+    """Window that shows the generations of a comparison side by side"""
+
+    def __init__(self, handler: FanOutHandler = None):
+        super().__init__()
+        self.handler = handler or FanOutHandler()
+        self.setWindowTitle(f"{APP_NAME} - Compare")
+        self.setGeometry(150, 150, 1600, 900)
+        self.setStyleSheet(Styles.COMMON + Styles.MAIN_WINDOW)
+        self.splitter = QSplitter(Qt.Horizontal)
+        self.splitter.setHandleWidth(2)
+        self.splitter.setChildrenCollapsible(False)
+        self.splitter.setStyleSheet(Styles.SPLITTER)
+        self.setCentralWidget(self.splitter)
+
+    def compare(self, user_input: str, targets: list[FanOutTarget], chat_history):
+        """Replace the panes and start streaming into them"""
+        for index in reversed(range(self.splitter.count())):
+            self.splitter.widget(index).deleteLater()
+        for pane in self.handler.set_targets(targets):
+            self.splitter.addWidget(self.create_pane(pane))
+        width = self.width() // max(1, len(targets))
+        self.splitter.setSizes([width] * len(targets))
+        self.handler.get_responses(user_input, chat_history)
+
+    def create_pane(self, pane: FanOutPane) -> QWidget:
+        """Create the title, metrics line and output view of one generation"""
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+
+        title = QLabel(pane.target.label)
+        title.setStyleSheet(
+            f"""
+            background-color: {Styles.BACKGROUND_SECONDARY};
+            color: {Styles.TEXT_PRIMARY};
+            font-weight: bold;
+            padding: 4px 8px;
+        """
+        )
+        metrics = QLabel("Queued")
+        metrics.setStyleSheet(
+            f"""
+            background-color: {Styles.BACKGROUND_SECONDARY};
+            color: {Styles.TEXT_SECONDARY};
+            padding: 0px 8px 4px 8px;
+        """
+        )
+        output = OutputView(
+            HTMLTemplates.LOADING.format(text_secondary=Styles.TEXT_SECONDARY)
+        )
+
+        signals = pane.signals
+        signals.output_update.connect(output.set_content)
+        signals.metrics_update.connect(metrics.setText)
+        signals.error_occurred.connect(
+            lambda message: self.show_error(output, metrics, message)
+        )
+
+        layout.addWidget(title)
+        layout.addWidget(metrics)
+        layout.addWidget(output)
+        return container
+
+    def show_error(self, output: OutputView, metrics: QLabel, message: str):
+        metrics.setText("Failed")
+        output.set_content(
+            HTMLTemplates.ERROR.format(
+                error_color=Styles.ERROR_COLOR, message=html.escape(message)
+            )
+        )
+
+    def closeEvent(self, event):
+        self.handler.cancel()
+        super().closeEvent(event)
@@ -1,13 +1,15 @@
+import html
 from datetime import datetime
 from pathlib import Path
 
-from PySide6.QtCore import Qt
-from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QAction, QActionGroup
 from PySide6.QtWidgets import (
     QComboBox,
     QHBoxLayout,
     QLabel,
     QMainWindow,
+    QMessageBox,
     QPushButton,
     QSizePolicy,
     QSplitter,
@@ -16,29 +18,65 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
-from constants import APP_NAME, MODEL_LIST
+from constants import (
+    APP_NAME,
+    CONSOLE_MAX_LINES,
+    CONTEXT_RESPONSE_TOKENS,
+    MODEL_LIST,
+    MODEL_REFRESH_INTERVAL,
+    RESPONSE_CACHE_DIR,
+)
+from context import estimate_tokens
+from fan_out import fan_out_targets
+from fan_out_view import FanOutWindow
+from history_model import HistoryModel, HistoryView
+from journal import Journal
 from llm import LLMHandler, MarkdownResponseFormatter
+from models import ModelRegistry, ModelWarmer
+from models_view import ModelsWindow
+from output_view import OutputView
+from response_cache import ResponseCache
+from search_view import SearchWindow
+from store import Autosaver, ConversationStore
 from styles import Styles
 from templates import HTMLTemplates
+from text_sink import TextSink
 
 
 class OllamaGUI(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.llm_handler = LLMHandler()
+        self.chat_history = []
+        self.journal = Journal()
+        self.store = ConversationStore()
+        self.autosaver = Autosaver(self.store, self.journal)
+        cache = ResponseCache() if RESPONSE_CACHE_DIR is not None else None
+        self.llm_handler = LLMHandler(journal=self.journal, cache=cache)
+        self.request_id = None
+        # Whether the console still shows the placeholder of a new request
+        self.console_placeholder = False
+        self.model_warmer = ModelWarmer(self.llm_handler.client)
+        self.model_registry = ModelRegistry(self.llm_handler.client)
         self.formatter = MarkdownResponseFormatter()
         self.setup_llm_signals()
         self.setWindowTitle(APP_NAME)
         self.setGeometry(100, 100, 1920, 1080)
         self.setup_ui()
         self.apply_styles()
-        self.chat_history = []
+        self.update_token_count()
         self.save_timestamp = None
+        self.fan_out_window = None
+        self.models_window = None
+        self.search_window = None
+        self.model_warmer.warm(self.model_selector.currentText())
+        self.setup_model_refresh()
+        self.recover_unfinished()
 
     def apply_styles(self):
         """Apply custom styles to the application"""
         self.setStyleSheet(Styles.COMMON + Styles.MAIN_WINDOW)
         self.menuBar().setStyleSheet(Styles.MENU_BAR)
+        self.statusBar().setStyleSheet(Styles.STATUS_BAR)
         self.main_splitter.setStyleSheet(Styles.SPLITTER)
 
         # Apply styles to all QTextEdit widgets
@@ -51,14 +89,34 @@ class OllamaGUI(QMainWindow):
         # Style the model selector and send button
         self.model_selector.setStyleSheet(Styles.MODEL_SELECTOR)
         self.send_button.setStyleSheet(Styles.BUTTON)
+        self.compare_button.setStyleSheet(Styles.BUTTON)
+        self.stop_button.setStyleSheet(Styles.BUTTON)
 
     def setup_llm_signals(self):
         """Setup signal connections for LLM handler"""
         self.llm_handler.signals.thinking_update.connect(self.update_thinking)
         self.llm_handler.signals.output_update.connect(self.update_output)
         self.llm_handler.signals.console_update.connect(self.update_console)
+        self.llm_handler.signals.raw_events.connect(self.update_events)
         self.llm_handler.signals.llm_history_update.connect(self.update_llm_history)
         self.llm_handler.signals.error_occurred.connect(self.handle_error)
+        self.llm_handler.signals.generation_stopped.connect(self.handle_stopped)
+        self.llm_handler.signals.cache_hit.connect(self.statusBar().showMessage)
+        self.model_warmer.signals.model_status.connect(self.statusBar().showMessage)
+
+    def setup_model_refresh(self):
+        """Keep the installed and loaded models up to date"""
+        self.model_registry.signals.models_updated.connect(self.update_model_list)
+        self.model_refresh_timer = QTimer(self)
+        self.model_refresh_timer.timeout.connect(self.model_registry.refresh)
+        self.model_refresh_timer.start(MODEL_REFRESH_INTERVAL * 1000)
+        self.model_registry.refresh()
+
+    def model_names(self, models=None) -> list[str]:
+        """Names of the installed models, or MODEL_LIST until they're known"""
+        if models is None:
+            models = self.model_registry.models
+        return [model.name for model in models] or MODEL_LIST
 
     def setup_ui(self):
         """Setup the main UI components"""
@@ -118,6 +176,7 @@ class OllamaGUI(QMainWindow):
 
         # Add header text as QLabel instead of QTextEdit
         header_label = QLabel("Console")
+        self.console_label = header_label
         header_label.setStyleSheet(
             f"""
             background-color: {Styles.BACKGROUND_SECONDARY};
@@ -145,13 +204,16 @@ class OllamaGUI(QMainWindow):
         """
         )
 
-        self.console_content = QTextEdit()
-        self.console_content.setReadOnly(True)
+        # The response as it streams, or the raw events received
+        self.console_content = TextSink(max_lines=CONSOLE_MAX_LINES)
         self.console_content.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        self.console_content.setLineWrapMode(QTextEdit.WidgetWidth)
+        self.events_content = TextSink(max_lines=CONSOLE_MAX_LINES)
+        self.events_content.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.events_content.setVisible(False)
 
         console_layout.addWidget(header_container)
         console_layout.addWidget(self.console_content)
+        console_layout.addWidget(self.events_content)
 
         # Set size constraints for console panel
         self.console_panel.setMinimumWidth(100)
@@ -179,6 +241,71 @@ class OllamaGUI(QMainWindow):
         self.toggle_console_action.setCheckable(True)
         self.toggle_console_action.setChecked(True)
         self.toggle_console_action.triggered.connect(self.toggle_console_panel)
+        self.raw_events_action = view_menu.addAction("Show Raw Events")
+        self.raw_events_action.setCheckable(True)
+        self.raw_events_action.triggered.connect(self.toggle_raw_events)
+        models_action = view_menu.addAction("Models")
+        models_action.triggered.connect(self.show_models_window)
+
+        # Conversations menu: start over or continue a saved conversation
+        conversations_menu = menubar.addMenu("Conversations")
+        new_action = conversations_menu.addAction("New Conversation")
+        new_action.triggered.connect(self.new_conversation)
+        search_action = conversations_menu.addAction("Search...")
+        search_action.triggered.connect(self.show_search_window)
+
+        # Compare menu: the models and samples per model the Compare button uses
+        self.compare_menu = menubar.addMenu("Compare")
+        self.compare_model_actions = []
+        self.samples_menu = self.compare_menu.addMenu("Samples per Model")
+        self.samples_group = QActionGroup(self)
+        for samples in (1, 2, 4):
+            action = self.samples_menu.addAction(str(samples))
+            action.setCheckable(True)
+            action.setChecked(samples == 1)
+            action.setData(samples)
+            self.samples_group.addAction(action)
+        self.update_compare_models(self.model_names())
+
+    def update_compare_models(self, names: list[str]):
+        """List the models in the Compare menu, keeping the checked ones"""
+        checked = {a.text() for a in self.compare_model_actions if a.isChecked()}
+        for action in self.compare_model_actions:
+            self.compare_menu.removeAction(action)
+        self.compare_model_actions = []
+        for model in names:
+            action = QAction(model, self)
+            action.setCheckable(True)
+            action.setChecked(model in checked)
+            self.compare_menu.insertAction(self.samples_menu.menuAction(), action)
+            self.compare_model_actions.append(action)
+
+    def update_model_list(self, models):
+        """Offer the installed models in the selector and the Compare menu"""
+        names = self.model_names(models)
+        current = self.model_selector.currentText()
+        # Keep the selection, even if the model went away, rather than
+        # switching models under the user
+        if current not in names:
+            names = [current, *names]
+        listed = [
+            self.model_selector.itemText(i) for i in range(self.model_selector.count())
+        ]
+        if names != listed:
+            self.model_selector.blockSignals(True)
+            self.model_selector.clear()
+            self.model_selector.addItems(names)
+            self.model_selector.setCurrentText(current)
+            self.model_selector.blockSignals(False)
+        if names != [action.text() for action in self.compare_model_actions]:
+            self.update_compare_models(names)
+
+    def show_models_window(self):
+        """Show the installed and loaded models"""
+        if self.models_window is None:
+            self.models_window = ModelsWindow(self.model_registry)
+        self.models_window.show()
+        self.models_window.raise_()
 
     def create_input_panel(self, title):
         """Create an input panel with title"""
@@ -203,7 +330,7 @@ class OllamaGUI(QMainWindow):
         model_layout = QHBoxLayout()
         model_label = QLabel("Model:")
         self.model_selector = QComboBox()
-        self.model_selector.addItems(MODEL_LIST)
+        self.model_selector.addItems(self.model_names())
         model_layout.addWidget(model_label)
         model_layout.addWidget(self.model_selector)
         model_layout.addStretch()
@@ -212,17 +339,41 @@ class OllamaGUI(QMainWindow):
         self.model_input = QTextEdit()
         self.model_input.setMinimumHeight(100)
         self.model_input.setStyleSheet(Styles.PANEL_CONTENT + Styles.SCROLLBAR)
+        self.model_input.textChanged.connect(self.update_token_count)
+        self.model_selector.currentTextChanged.connect(self.update_token_count)
+        self.model_selector.currentTextChanged.connect(self.model_warmer.warm)
+
+        # Create live token count of the input and the prompt it makes
+        self.token_label = QLabel()
+        self.token_label.setStyleSheet(f"color: {Styles.TEXT_SECONDARY};")
 
         # Create send button
         self.send_button = QPushButton("Send")
         self.send_button.clicked.connect(self.process_input)
         self.send_button.setFixedHeight(32)
 
+        # Create compare button, it sends the input to the models of the
+        # Compare menu at once
+        self.compare_button = QPushButton("Compare")
+        self.compare_button.clicked.connect(self.compare_input)
+        self.compare_button.setFixedHeight(32)
+
+        # Create stop button, it aborts the response being generated
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.clicked.connect(self.stop_generation)
+        self.stop_button.setFixedHeight(32)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.send_button, 1)
+        button_layout.addWidget(self.compare_button)
+        button_layout.addWidget(self.stop_button)
+
         # Add widgets to layout
         layout.addWidget(header)
         layout.addLayout(model_layout)
         layout.addWidget(self.model_input)
-        layout.addWidget(self.send_button)
+        layout.addWidget(self.token_label)
+        layout.addLayout(button_layout)
 
         return container
 
@@ -278,28 +429,16 @@ class OllamaGUI(QMainWindow):
         """
         )
 
-        # Create display area - use QWebEngineView for output panel, QTextEdit for others
+        # Create display area - use OutputView for output panel, a list of the
+        # messages for history and a text sink for others
         if title == "Output":
-            display = QWebEngineView()
-            display.setContextMenuPolicy(Qt.NoContextMenu)
-            display.setHtml(
-                HTMLTemplates.BASE.format(
-                    content=f"Welcome to {APP_NAME}!",
-                    bg_tertiary=Styles.BACKGROUND_TERTIARY,
-                    bg_secondary=Styles.BACKGROUND_SECONDARY,
-                    bg_primary=Styles.BACKGROUND_PRIMARY,
-                    text_primary=Styles.TEXT_PRIMARY,
-                    accent=Styles.ACCENT_COLOR,
-                    border=Styles.BORDER_COLOR,
-                )
-            )
+            display = OutputView(f"Welcome to {APP_NAME}!")
+        elif title == "History":
+            self.history_model = HistoryModel(self)
+            display = HistoryView(self.history_model)
         else:
-            display = QTextEdit()
-            display.setReadOnly(True)
-            display.setAcceptRichText(True)
+            display = TextSink()
             display.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-            display.setLineWrapMode(QTextEdit.WidgetWidth)
-            display.setStyleSheet(Styles.PANEL_CONTENT + Styles.SCROLLBAR)
 
         # Add display to content container
         content_layout.addWidget(display)
@@ -326,120 +465,210 @@ class OllamaGUI(QMainWindow):
         if not user_input.strip():  # Skip empty input
             return
 
-        # Update history panel
-        current_history = self.history_panel.display.toPlainText()
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        new_entry = f"[{timestamp}] {user_input}\n"
-        if current_history:
-            new_entry = f"{current_history}{new_entry}"
-        self.history_panel.display.setPlainText(new_entry)
-
-        # Scroll to bottom of history
-        scrollbar = self.history_panel.display.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        # Update history panel, which scrolls to the new message
+        self.history_model.append(user_input, datetime.now().strftime("%H:%M:%S"))
 
-        self.chat_history.append({"role": "user", "content": user_input})
+        self.chat_history.append(
+            {
+                "role": "user",
+                "content": user_input,
+                "model": self.model_selector.currentText(),
+            }
+        )
         self.model_input.clear()
         self.clear_displays()
 
         # Show loading indicators
         self.thinking_panel.display.setPlainText("Analyzing your request...")
-        self.output_panel.display.setHtml(self.llm_handler.get_loading_html())
+        self.output_panel.display.set_content(self.llm_handler.get_loading_html())
         self.console_content.setPlainText("Processing request in progress...")
+        self.console_placeholder = True
 
         # Start async processing
-        self.llm_handler.get_response(
-            user_input, self.model_selector.currentText(), self.chat_history
+        self.request_id = self.llm_handler.get_response(
+            user_input,
+            self.model_selector.currentText(),
+            self.chat_history,
+            journal_meta={"session_id": self.autosaver.session_id},
+        )
+
+    def compare_input(self):
+        """Send the input to the checked models side by side"""
+        user_input = self.model_input.toPlainText()
+        if not user_input.strip():  # Skip empty input
+            return
+
+        # Without checked models, compare samples of the selected one
+        models = [
+            action.text() for action in self.compare_model_actions if action.isChecked()
+        ] or [self.model_selector.currentText()]
+        samples = self.samples_group.checkedAction().data()
+
+        if self.fan_out_window is None:
+            self.fan_out_window = FanOutWindow()
+        self.fan_out_window.compare(
+            user_input,
+            fan_out_targets(models, samples),
+            self.chat_history + [{"role": "user", "content": user_input}],
+        )
+        self.fan_out_window.show()
+        self.fan_out_window.raise_()
+
+    def update_token_count(self):
+        """Show the estimated tokens of the input and of the prompt it makes"""
+        user_input = self.model_input.toPlainText()
+        used, window = self.llm_handler.client.context_usage(
+            user_input, self.chat_history, self.model_selector.currentText()
         )
+        room = window - CONTEXT_RESPONSE_TOKENS
+        color = Styles.ERROR_COLOR if used > room else Styles.TEXT_SECONDARY
+        self.token_label.setStyleSheet(f"color: {color};")
+        self.token_label.setText(
+            f"~{estimate_tokens(user_input)} tokens · prompt ~{used} of {room}"
+        )
+
+    def stop_generation(self):
+        """Stop the response being generated"""
+        if self.llm_handler.stop():
+            self.thinking_panel.display.append_line("\n[Stopped]")
+
+    def handle_stopped(self, message):
+        """Show how long stopping took in the console"""
+        self.console_content.append_line(message)
 
     def update_thinking(self, content):
         """Update thinking panel with new content"""
-        self.thinking_panel.display.setPlainText(content)
-        self.thinking_panel.display.verticalScrollBar().setValue(
-            self.thinking_panel.display.verticalScrollBar().maximum()
-        )
+        self.thinking_panel.display.set_text(content)
 
     def update_output(self, content):
         """Update output panel with new content"""
         self._display_html_in_output(content)
 
-    def update_console(self, content):
-        """Update console panel with new content"""
-        self.console_content.setPlainText(content)
-        self.console_content.verticalScrollBar().setValue(
-            self.console_content.verticalScrollBar().maximum()
-        )
+    def update_console(self, text):
+        """Append streamed text to the console panel"""
+        if self.console_placeholder:
+            self.console_placeholder = False
+            self.console_content.setPlainText(text)
+        else:
+            self.console_content.append_text(text)
+
+    def update_events(self, lines):
+        """Add the raw events received to the event view"""
+        self.events_content.append_text(lines)
+
+    def toggle_raw_events(self):
+        """Show the raw events received in the console instead of the response"""
+        show_events = self.raw_events_action.isChecked()
+        self.llm_handler.raw_events = show_events
+        self.console_content.setVisible(not show_events)
+        self.events_content.setVisible(show_events)
+        self.console_label.setText("Raw Events" if show_events else "Console")
 
     def update_llm_history(self, llm_history):
         """Update LLM history"""
 
         if self.chat_history:
-            self.chat_history[-1]["llm_history"] = llm_history
+            entry = self.chat_history[-1]
+            entry["llm_history"] = llm_history
+            self.autosaver.save(
+                entry["content"],
+                llm_history,
+                entry.get("model", ""),
+                journal_key=self.request_id,
+            )
+        self.update_token_count()
+
+    def new_conversation(self):
+        """Start a conversation without earlier turns"""
+        self.open_conversation(None, [])
+
+    def show_search_window(self):
+        """Search saved conversations to continue one"""
+        if self.search_window is None:
+            self.search_window = SearchWindow(self.store)
+            self.search_window.session_opened.connect(
+                lambda session_id: self.open_conversation(
+                    session_id, self.store.history(session_id)
+                )
+            )
+        self.search_window.show()
+        self.search_window.raise_()
+
+    def open_conversation(self, session_id, chat_history):
+        """Replace the conversation, showing the last response of the new one"""
+        self.llm_handler.stop()
+        self.autosaver.open(session_id)
+        self.chat_history = chat_history
+        self.save_timestamp = None
+        self.history_model.reset([entry["content"] for entry in chat_history])
+        self.clear_displays()
+        if chat_history:
+            thinking, output = self.formatter.format_response(
+                chat_history[-1]["llm_history"]
+            )
+            self.thinking_panel.display.setPlainText(thinking)
+            self._display_html_in_output(output)
+        self.update_token_count()
 
     def handle_error(self, error_message):
         """Handle error cases"""
         self.thinking_panel.display.setPlainText(f"Error occurred: {error_message}")
-        self.output_panel.display.setHtml(error_message)
+        self.output_panel.display.set_content(
+            HTMLTemplates.ERROR.format(
+                error_color=Styles.ERROR_COLOR, message=html.escape(error_message)
+            )
+        )
         self.console_content.setPlainText(f"Error: {error_message}")
 
     def clear_displays(self):
         """Clear all display panels"""
         self.thinking_panel.display.clear()
-        if isinstance(self.output_panel.display, QWebEngineView):
-            self.output_panel.display.setHtml("")
-        else:
-            self.output_panel.display.clear()
+        self.output_panel.display.clear()
         self.console_content.clear()
 
     def _display_html_in_output(self, html_content):
         """Helper method to display HTML content in the output panel"""
-        styled_html = HTMLTemplates.apply_style(html_content)
-        self.output_panel.display.setHtml(styled_html)
+        self.output_panel.display.set_content(html_content)
 
     def save_conversation(self):
-        """Save current conversation to markdown file"""
+        """Export the current conversation to a markdown file"""
         if not self.chat_history:
             return
 
-        # Create conversations directory if it doesn't exist
-        Path("conversations").mkdir(exist_ok=True)
-
         # Generate filename with timestamp
         if self.save_timestamp is None:
             self.save_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        filename = f"conversations/chat_{self.save_timestamp}.md"
-
-        with open(filename, "w", encoding="utf-8") as f:
-            # Write header
-            f.write(
-                f"# Chat History - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        # Written on the autosave thread, once the last turns are saved
+        self.autosaver.export(Path(f"conversations/chat_{self.save_timestamp}.md"))
+
+    def recover_unfinished(self):
+        """Offer to save the responses that were cut off when the app stopped"""
+        turns = self.journal.unfinished()
+        if turns:
+            answer = QMessageBox.question(
+                self,
+                APP_NAME,
+                f"{len(turns)} response(s) were cut off when {APP_NAME} last "
+                "stopped. Save what was received?",
             )
-            f.write(f"Model: {self.model_selector.currentText()}\n\n")
-
-            # Write chat history
-            for entry in self.chat_history:
-                content = entry["content"]
-                full_response = entry["llm_history"]
-
-                f.write("## User Input\n")
-                f.write(f"{content}\n\n")
-                f.write("## Assistant Response\n")
-
-                # Extract thinking and output sections if present
-                thinking = self.formatter._extract_section(full_response, "think")
-                output = self.formatter._extract_section(full_response, "output")
-
-                if thinking and output:
-                    f.write("### Thinking Process\n")
-                    f.write(f"{thinking}\n\n")
-                    f.write("### Output\n")
-                    f.write(f"{output}\n\n")
-                else:
-                    # If no sections found, write the raw content
-                    f.write(f"{full_response}\n\n")
-
-                f.write("---\n\n")  # Add separator between entries
+            if answer == QMessageBox.Yes:
+                self.autosaver.recover(turns)
+                self.statusBar().showMessage(
+                    f"Recovered {len(turns)} response(s), find them with "
+                    "Conversations > Search..."
+                )
+        self.journal.clear()
+
+    def closeEvent(self, event):
+        """Stop the background work, saving the last turns"""
+        self.llm_handler.stop()
+        self.autosaver.close()
+        self.journal.close()
+        self.store.close()
+        self.model_warmer.close()
+        self.model_registry.close()
+        super().closeEvent(event)
 
     def hide_console_panel(self):
         """Hide console panel and update menu action"""
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from pygments import highlight
+from pygments.formatter import Formatter
+from pygments.lexer import Lexer
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+from language_detection import LanguageDetector
+
+
+class HighlightCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    lexers: int
+
+
+class CodeHighlighter:
+    """Pygments highlighting with a bounded LRU cache of highlighted HTML.
+
+    Results are keyed by language and a hash of the code, so code blocks
+    that are rendered again on every streamed chunk are only highlighted
+    once. Lexer instances are cached by language name. Code without a
+    known language is given to a `LanguageDetector`.
+    """
+
+    def __init__(self, formatter: Formatter, maxsize: int = 256):
+        self.formatter = formatter
+        self.maxsize = maxsize
+        self.detector = LanguageDetector()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[tuple[str, bytes], str] = OrderedDict()
+        self._lexers: dict[str, Lexer] = {}
+
+    def highlight(self, code: str, lang: Optional[str]) -> str:
+        """Return the highlighted HTML for a block of code.
+
+        A `lang` of None means the block didn't name a language.
+        """
+        lexer_name = self.lexer_name(code, lang)
+        key = (lexer_name, hashlib.blake2b(code.encode(), digest_size=16).digest())
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+
+        highlighted = highlight(code, self._lexer_by_name(lexer_name), self.formatter)
+
+        with self._lock:
+            self._cache[key] = highlighted
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return highlighted
+
+    def lexer_name(self, code: str, lang: Optional[str]) -> str:
+        """Return the name of the lexer to use, detecting it if `lang` is unknown"""
+        if lang and self._lexer_by_name(lang) is not None:
+            self.detector.remember(code, lang)
+            return lang
+
+        detected = self.detector.detect(code)
+        return detected if self._lexer_by_name(detected) is not None else "text"
+
+    def get_lexer(self, code: str, lang: Optional[str]) -> Lexer:
+        """Return the lexer for a language, detecting it from the code if unknown"""
+        return self._lexer_by_name(self.lexer_name(code, lang))
+
+    def _lexer_by_name(self, lang: str) -> Optional[Lexer]:
+        """Return the cached lexer for a language name, or None if unknown.
+
+        Only known names are cached, so the cache is bounded by the number
+        of Pygments aliases however many made-up names a model produces.
+        """
+        with self._lock:
+            lexer = self._lexers.get(lang)
+        if lexer is not None:
+            return lexer
+
+        try:
+            lexer = get_lexer_by_name(lang)
+        except ClassNotFound:
+            return None
+
+        with self._lock:
+            return self._lexers.setdefault(lang, lexer)
+
+    def cache_info(self) -> HighlightCacheInfo:
+        """Report cache statistics, like functools.lru_cache"""
+        with self._lock:
+            return HighlightCacheInfo(
+                self.hits,
+                self.misses,
+                self.maxsize,
+                len(self._cache),
+                len(self._lexers),
+            )
+
+    def cache_clear(self):
+        """Empty the cache and reset the statistics"""
+        with self._lock:
+            self._cache.clear()
+            self._lexers.clear()
+            self.hits = 0
+            self.misses = 0
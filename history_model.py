@@ -0,0 +1,72 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PySide6.QtWidgets import QAbstractItemView, QListView
+
+from styles import Styles
+
+# Characters of a message shown in its row, the tooltip has all of it
+ROW_LENGTH = 200
+
+
+class HistoryModel(QAbstractListModel):
+    """The messages of a conversation, one row each.
+
+    Appending inserts a single row, so the view only lays out and paints
+    what's new and visible, however long the history gets. Each row is one
+    line, made when the message is added; the tooltip shows the message.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: list[str] = []
+        self._messages: list[str] = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._rows[index.row()]
+        if role == Qt.ToolTipRole:
+            return self._messages[index.row()]
+        return None
+
+    def append(self, message: str, timestamp: str = ""):
+        """Add a message as the last row"""
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.append(self._row(message, timestamp))
+        self._messages.append(message)
+        self.endInsertRows()
+
+    def reset(self, messages: list[str]):
+        """Replace all rows, e.g. with the messages of another conversation"""
+        self.beginResetModel()
+        self._rows = [self._row(message) for message in messages]
+        self._messages = list(messages)
+        self.endResetModel()
+
+    @staticmethod
+    def _row(message: str, timestamp: str = "") -> str:
+        line = " ".join(message[: ROW_LENGTH * 2].split())[:ROW_LENGTH]
+        return f"[{timestamp}] {line}" if timestamp else line
+
+
+class HistoryView(QListView):
+    """List of the messages of a HistoryModel that follows new rows"""
+
+    def __init__(self, model: HistoryModel, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        # All rows have the height of one line, so the view can place any of
+        # them without measuring the others
+        self.setUniformItemSizes(True)
+        self.setWordWrap(False)
+        self.setTextElideMode(Qt.ElideRight)
+        self.setLayoutMode(QListView.Batched)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.setStyleSheet(Styles.PANEL_LIST + Styles.SCROLLBAR)
+        model.rowsInserted.connect(self.scrollToBottom)
@@ -0,0 +1,233 @@
+import socket
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from constants import HTTP_POOL_SIZE, HTTP_RETRIES
+
+# The RequestHandle of the requests the current thread is sending
+_tracking = threading.local()
+
+
+class RequestHandle:
+    """Abort a request from another thread, also before its headers arrive.
+
+    Requests sent on a `SessionPool` session inside `track()` register
+    their connection with the handle until it goes back to the pool, which
+    is when their response is closed. Aborting shuts the connections down:
+    a thread waiting for the headers (Ollama sends them with the first
+    token, after loading the model) or for the next chunk wakes up with an
+    error, and a connection opened after the abort is shut down as soon as
+    it connects.
+    """
+
+    def __init__(self):
+        self.aborted = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        """Register the connections of the requests sent in the block"""
+        previous = getattr(_tracking, "handle", None)
+        _tracking.handle = self
+        try:
+            yield self
+        finally:
+            _tracking.handle = previous
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            for connection in self._connections:
+                shutdown_connection(connection)
+
+    def _attach(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+            if self.aborted:
+                shutdown_connection(connection)
+
+    def _detach(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+
+class _TrackedConnection:
+    """Check the handle again once connected, the socket didn't exist before"""
+
+    def connect(self):
+        super().connect()
+        handle = getattr(self, "request_handle", None)
+        if handle is not None:
+            handle._attach(self)
+
+
+class _TrackedHTTPConnection(_TrackedConnection, HTTPConnection):
+    pass
+
+
+class _TrackedHTTPSConnection(_TrackedConnection, HTTPSConnection):
+    pass
+
+
+class _TrackedPool:
+    """Lend connections to the RequestHandle of the thread that takes them"""
+
+    def _get_conn(self, timeout=None):
+        connection = super()._get_conn(timeout)
+        handle = getattr(_tracking, "handle", None)
+        connection.request_handle = handle
+        if handle is not None:
+            handle._attach(connection)
+        return connection
+
+    def _put_conn(self, connection):
+        handle = getattr(connection, "request_handle", None)
+        if handle is not None:
+            handle._detach(connection)
+            connection.request_handle = None
+        super()._put_conn(connection)
+
+
+class _TrackedHTTPConnectionPool(_TrackedPool, HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPool, HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+class _TrackedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackedHTTPConnectionPool,
+            "https": _TrackedHTTPSConnectionPool,
+        }
+
+
+class PoolStats(NamedTuple):
+    host: str
+    requests: int
+    connections: int
+    idle: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.host}: {self.requests} requests over "
+            f"{self.connections} connections, {self.idle} idle"
+        )
+
+
+class SessionPool:
+    """Keep-alive `requests` sessions, one per host.
+
+    Connections are reused across turns instead of paying TCP setup for
+    every request. Failed connection attempts are retried with backoff;
+    requests that already reached the server are not, so a generation is
+    never started twice. Requests can be aborted with a `RequestHandle`.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES):
+        self.pool_size = pool_size
+        self.retries = retries
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url: str) -> requests.Session:
+        """Return the session for the host of a URL"""
+        key = self.host_key(url)
+        with self._lock:
+            if key not in self._sessions:
+                self._sessions[key] = self._create_session()
+            return self._sessions[key]
+
+    def _create_session(self) -> requests.Session:
+        retry = Retry(
+            total=None,
+            connect=self.retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        adapter = _TrackedAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def stats(self) -> list[PoolStats]:
+        """Report requests and connections per host"""
+        stats = []
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for key, session in sessions:
+            adapter = session.get_adapter(key)
+            requests_made = connections = idle = 0
+            for url in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(url)
+                if pool is None:
+                    continue
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+                idle += sum(conn is not None for conn in list(pool.pool.queue))
+            stats.append(PoolStats(key, requests_made, connections, idle))
+        return stats
+
+    def close(self):
+        """Close all sessions and their connections"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+def set_read_timeout(response: requests.Response, timeout: Optional[float]):
+    """Change the read timeout of a streaming response that is being read.
+
+    Requests applies one read timeout to the whole response. This lets the
+    wait for the first token (which includes loading the model) be longer
+    than the wait between later tokens.
+    """
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        sock.settimeout(timeout)
+
+
+def abort_response(response: requests.Response):
+    """Close the connection of a streaming response, from any thread.
+
+    Shutting the socket down wakes up a read that is waiting for data on
+    another thread, and the closed connection makes Ollama stop generating.
+    The reading thread still closes the response as usual.
+    """
+    shutdown_connection(getattr(response.raw, "connection", None))
+
+
+def shutdown_connection(connection):
+    """Shut the socket of a connection down, waking up its reader"""
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
@@ -0,0 +1,150 @@
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from constants import JOURNAL_FILE, JOURNAL_FLUSH_INTERVAL
+
+
+@dataclass
+class UnfinishedTurn:
+    """A response that was streaming when the app stopped"""
+
+    key: int
+    meta: dict = field(default_factory=dict)
+    text: str = ""
+
+
+class Journal:
+    """Write-ahead log of the responses being streamed.
+
+    Deltas are queued by the streaming thread and written by a writer thread
+    of its own, in one write and fsync per `interval`. A turn is started,
+    appended to and finished once it's saved elsewhere; turns the log holds
+    no finish for were cut off, and are returned by `unfinished` at the next
+    start. The file is emptied whenever no turn is open.
+    """
+
+    def __init__(self, path: Path = JOURNAL_FILE, interval=JOURNAL_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.interval = interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: queue.Queue = queue.Queue()
+        self._open: set = set()
+        self._writer = threading.Thread(target=self._write_batches, daemon=True)
+        self._writer.start()
+
+    def start(self, key: int, **meta):
+        """Open a turn, with what's needed to save it again (model, message)"""
+        self._queue.put({"op": "start", "key": key, "meta": meta})
+
+    def append(self, key: int, text: str):
+        if text:
+            self._queue.put({"op": "append", "key": key, "text": text})
+
+    def finish(self, key: int):
+        """Close a turn that was saved, or that isn't worth recovering"""
+        self._queue.put({"op": "finish", "key": key})
+
+    def unfinished(self) -> list[UnfinishedTurn]:
+        """Turns the log started but never finished.
+
+        Read them before starting turns, keys start over with every run;
+        `clear` forgets them.
+        """
+        turns: dict[int, UnfinishedTurn] = {}
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Cut off mid-write
+            key = record.get("key")
+            if record.get("op") == "start":
+                turns[key] = UnfinishedTurn(key, record.get("meta", {}))
+            elif record.get("op") == "append" and key in turns:
+                turns[key].text += record.get("text", "")
+            elif record.get("op") == "finish":
+                turns.pop(key, None)
+        return list(turns.values())
+
+    def clear(self):
+        """Forget the turns of earlier runs"""
+        self._queue.put({"op": "clear"})
+
+    def flush(self, timeout: float = 5):
+        """Wait until everything queued so far is on disk"""
+        written = threading.Event()
+        self._queue.put({"op": "flushed", "event": written})
+        written.wait(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _write_batches(self):
+        while True:
+            records = [self._queue.get()]
+            # Let deltas pile up, then write them together
+            time.sleep(self.interval)
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._write(records):
+                return
+
+    def _write(self, records: list) -> bool:
+        """Write a batch, return whether to go on"""
+        lines, events, running = [], [], True
+        for record in records:
+            if record is None:
+                running = False
+                break
+            op = record["op"]
+            if op == "flushed":
+                events.append(record["event"])
+                continue
+            if op == "clear":
+                lines, self._open = [], set()
+                self._truncate()
+                continue
+            if op == "start":
+                self._open.add(record["key"])
+            elif op == "finish":
+                self._open.discard(record["key"])
+            elif lines and lines[-1]["op"] == "append":
+                # Merge the deltas of a turn that arrived in a row
+                if lines[-1]["key"] == record["key"]:
+                    lines[-1] = {
+                        **lines[-1],
+                        "text": lines[-1]["text"] + record["text"],
+                    }
+                    continue
+            lines.append(record)
+        try:
+            if not self._open:
+                self._truncate()
+            elif lines:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(line) + "\n" for line in lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError:
+            pass  # Losing the log only loses recovery
+        for event in events:
+            event.set()
+        return running
+
+    def _truncate(self):
+        try:
+            self.path.write_bytes(b"")
+        except OSError:
+            pass
@@ -0,0 +1,206 @@
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Interpreters named in a shebang line, mapped to Pygments lexer names
+SHEBANGS = {
+    "python": "python",
+    "python3": "python",
+    "bash": "bash",
+    "sh": "bash",
+    "zsh": "bash",
+    "node": "javascript",
+    "ruby": "ruby",
+    "perl": "perl",
+}
+
+# Patterns that are typical for a language, keyed by Pygments lexer name.
+# Every match in the sample adds one to the language's score.
+LANGUAGE_PATTERNS = {
+    "python": [
+        r"^\s*def \w+\(.*\)\s*(->.*)?:\s*$",
+        r"^\s*(from [\w.]+ )?import \w",
+        r"^\s*class \w+(\(.*\))?:\s*$",
+        r"\bself\.\w",
+        r"^\s*(elif|except|with|for|while|if) .*:\s*$",
+        r"\bprint\(",
+        r"\b(None|True|False)\b",
+    ],
+    "javascript": [
+        r"\bfunction\b\s*\w*\s*\(",
+        r"\b(const|let|var) \w+\s*=",
+        r"=>",
+        r"\bconsole\.\w+\(",
+        r"\b(document|window)\.\w",
+        r"\brequire\(|\bmodule\.exports\b|^\s*export\b",
+    ],
+    "typescript": [
+        r"\w\s*:\s*(string|number|boolean|any|void)\b",
+        r"^\s*(export )?interface \w+",
+        r"^\s*(export )?type \w+\s*=",
+    ],
+    "json": [
+        r'^\s*"[^"\n]*"\s*:',
+        r"^\s*[{\[]\s*$",
+    ],
+    "bash": [
+        r"^\s*(sudo|apt|apt-get|pip|npm|cd|ls|echo|export|git|docker|curl|mkdir)\b",
+        r"\$\{?\w+\}?",
+        r"^\s*if \[",
+        r"^\s*(fi|done|esac)\s*$",
+    ],
+    "html": [
+        r"<(!DOCTYPE|html|head|body|div|span|p|a|ul|li|script|style)\b",
+        r"</\w+>",
+    ],
+    "css": [
+        r"^\s*[.#]?[\w-]+[\w\s.#:,>-]*\{\s*$",
+        r"^\s*[\w-]+\s*:\s*[^;{}]+;\s*$",
+    ],
+    "sql": [
+        r"(?i)\bSELECT\b.+\bFROM\b",
+        r"(?i)\b(INSERT INTO|CREATE TABLE|UPDATE \w+ SET|DELETE FROM)\b",
+        r"(?i)^\s*(WHERE|GROUP BY|ORDER BY|JOIN)\b",
+    ],
+    "java": [
+        r"\bpublic\s+(static\s+)?(class|void|int|String)\b",
+        r"\bSystem\.out\.print",
+        r"^\s*import java\.",
+    ],
+    "c": [
+        r"#include\s*<\w+\.h>",
+        r"\bint main\s*\(",
+        r"\bprintf\(",
+    ],
+    "cpp": [
+        r"#include\s*<(iostream|vector|string|map|memory)>",
+        r"\bstd::",
+        r"\bcout\s*<<",
+    ],
+    "go": [
+        r"^package \w+",
+        r"^\s*func\b",
+        r":=",
+        r"\bfmt\.\w+\(",
+    ],
+    "rust": [
+        r"^\s*(pub )?fn \w+",
+        r"\blet mut\b",
+        r"\bprintln!\(",
+        r"^\s*impl\b",
+    ],
+    "yaml": [
+        r"^\s*[\w-]+:\s*$",
+        r"^\s*- [\w-]+[:=]",
+        r"^\s*[\w-]+: [^{};=()]+$",
+    ],
+}
+
+# TypeScript is scored on the JavaScript patterns as well, so it only wins
+# when TypeScript-specific syntax shows up
+LANGUAGE_PATTERNS["typescript"] += LANGUAGE_PATTERNS["javascript"]
+
+COMPILED_PATTERNS = {
+    language: [re.compile(pattern, re.MULTILINE) for pattern in patterns]
+    for language, patterns in LANGUAGE_PATTERNS.items()
+}
+
+
+class LanguageDetector:
+    """Guess the language of a code block within a time budget.
+
+    Unlike `pygments.lexers.guess_lexer`, which runs every lexer's
+    `analyse_text` over the whole block, this only looks at a bounded
+    sample. It checks for a shebang, then scores a few patterns per
+    language, and prefers languages named by earlier blocks of the same
+    conversation when the evidence is close. Results are cached per block
+    and conversation history.
+    """
+
+    # Minimum score for a language to be picked over plain text
+    MIN_SCORE = 2
+    # Score added per earlier block in the same language
+    HISTORY_BONUS = 0.5
+
+    def __init__(
+        self,
+        budget: float = 0.005,
+        sample_size: int = 1024,
+        history_size: int = 5,
+        cache_size: int = 512,
+    ):
+        self.budget = budget
+        self.sample_size = sample_size
+        self.history_size = history_size
+        self.cache_size = cache_size
+        self._history: OrderedDict[bytes, str] = OrderedDict()
+        self._cache: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def block_key(code: str) -> bytes:
+        """Hash identifying a block of code"""
+        return hashlib.blake2b(code.encode(), digest_size=16).digest()
+
+    def remember(self, code: str, language: str):
+        """Record the language a block names explicitly.
+
+        Blocks are recorded once, however often they are rendered, so the
+        history only depends on which blocks the conversation contains.
+        """
+        if not language or language == "text":
+            return
+        key = self.block_key(code)
+        with self._lock:
+            if key not in self._history:
+                self._history[key] = language
+                if len(self._history) > self.history_size:
+                    self._history.popitem(last=False)
+
+    def new_conversation(self):
+        """Forget the languages of earlier blocks"""
+        with self._lock:
+            self._history.clear()
+
+    def detect(self, code: str) -> str:
+        """Return the Pygments lexer name for the code, or "text" """
+        with self._lock:
+            history = tuple(self._history.values())
+            key = (self.block_key(code), history)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        language = self._detect(code[: self.sample_size], Counter(history))
+
+        with self._lock:
+            self._cache[key] = language
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return language
+
+    def _detect(self, sample: str, recent: Counter) -> str:
+        """Score the sample for every language until the budget runs out"""
+        first_line = sample.lstrip().split("\n", 1)[0]
+        if first_line.startswith("#!"):
+            interpreter = first_line.split("/")[-1].split()
+            if interpreter and interpreter[0] == "env" and len(interpreter) > 1:
+                interpreter = interpreter[1:]
+            if interpreter and interpreter[0] in SHEBANGS:
+                return SHEBANGS[interpreter[0]]
+
+        deadline = time.perf_counter() + self.budget
+        best_language, best_score = "text", 0.0
+        for language, patterns in COMPILED_PATTERNS.items():
+            score = sum(len(pattern.findall(sample)) for pattern in patterns)
+            if score:
+                # Earlier blocks only break ties between comparable candidates
+                score += self.HISTORY_BONUS * recent[language]
+            if score > best_score:
+                best_language, best_score = language, score
+            if time.perf_counter() > deadline:
+                break
+
+        return best_language if best_score >= self.MIN_SCORE else "text"
@@ -1,23 +1,45 @@
+import itertools
 import json
 import os
 import re
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional, Protocol
 
 import markdown
 import requests
-from pygments import highlight
 from pygments.formatters import HtmlFormatter
-from pygments.lexers import get_lexer_by_name, guess_lexer
-from pygments.util import ClassNotFound
 from PySide6.QtCore import QObject, Signal
 
-from constants import FORMATTING_INSTRUCTIONS
+from async_engine import AsyncEngine
+from constants import (
+    FORMATTING_INSTRUCTIONS,
+    GENERATION_OPTIONS,
+    HIGHLIGHT_CACHE_SIZE,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_FIRST_TOKEN_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    LLM_ENGINE,
+    OLLAMA_API,
+    SUMMARY_MODEL,
+    UI_MAX_FPS,
+    UI_MIN_FPS,
+)
+from context import ContextBuilder, context_window
+from highlighter import CodeHighlighter
+from http_pool import RequestHandle, SessionPool, set_read_timeout
+from models import keep_alive
+from scheduler import UpdateScheduler
+from sections import SectionParser
+from stream import StreamText, event_text, iter_event_batches
 from styles import OneDarkStyle, Styles
+from summarizer import Summarizer
 from templates import HTMLTemplates
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
-OLLAMA_API_URL = f"{OLLAMA_HOST}/api/generate"
 
 
 class LLMSignals(QObject):
@@ -26,6 +48,11 @@ class LLMSignals(QObject):
     console_update = Signal(str)
     error_occurred = Signal(str)
     llm_history_update = Signal(str)
+    generation_stopped = Signal(str)
+    # Timestamped lines of the events received, when raw events are shown
+    raw_events = Signal(str)
+    # The response was replayed from the response cache
+    cache_hit = Signal(str)
 
 
 class ResponseFormatter(Protocol):
@@ -33,6 +60,22 @@ class ResponseFormatter(Protocol):
         """Format the response and return (thinking, output) tuple"""
         pass
 
+    def format_output(self, output: str, streaming: bool) -> str: ...
+
+    def new_conversation(self) -> None:
+        """Forget state carried over from earlier turns"""
+        pass
+
+
+@dataclass
+class ListState:
+    """Line-by-line state carried by the list pre-processor"""
+
+    current_indent: int = 0
+    in_list: bool = False
+    in_numbered_list: bool = False
+    numbered_list_indent: int = 0
+
 
 class MarkdownResponseFormatter:
     def __init__(self):
@@ -49,6 +92,7 @@ class MarkdownResponseFormatter:
         self.code_formatter = HtmlFormatter(
             style=OneDarkStyle, cssclass="highlight", linenos=False, noclasses=True
         )
+        self.highlighter = CodeHighlighter(self.code_formatter, HIGHLIGHT_CACHE_SIZE)
 
     def _extract_section(self, text: str, tag: str) -> str:
         """Extract content from a specific XML-like tag"""
@@ -62,19 +106,13 @@ class MarkdownResponseFormatter:
             return content
 
         def replace_code_block(match):
-            lang = match.group(1) if len(match.groups()) > 1 else "text"
-            code = match.group(2) if len(match.groups()) > 1 else match.group(1)
+            labeled = len(match.groups()) > 1
+            lang = match.group(1) if labeled else "text"
+            code = match.group(2) if labeled else match.group(1)
             code = code.strip()
 
-            try:
-                lexer = get_lexer_by_name(lang)
-            except ClassNotFound:
-                try:
-                    lexer = guess_lexer(code)
-                except ClassNotFound:
-                    lexer = get_lexer_by_name("text")
-
-            highlighted = highlight(code, lexer, self.code_formatter)
+            # Blocks without a language are highlighted as the detected one
+            highlighted = self.highlighter.highlight(code, lang if labeled else None)
 
             # Add both Pygments highlighting and markdown code block classes
             return f'<pre class="code-block"><code class="language-{lang}">{highlighted}</code></pre>'
@@ -99,13 +137,20 @@ class MarkdownResponseFormatter:
 
     def _preprocess_lists(self, content: str) -> str:
         """Pre-process lists to ensure proper nesting and formatting"""
+        lines, _ = self._preprocess_list_lines(content.split("\n"), ListState())
+        return "\n".join(lines)
+
+    def _preprocess_list_lines(
+        self, source_lines: list[str], state: ListState
+    ) -> tuple[list[str], ListState]:
+        """Pre-process list lines starting from a given state, return the new state"""
         lines = []
-        current_indent = 0
-        in_list = False
-        in_numbered_list = False
-        numbered_list_indent = 0
+        current_indent = state.current_indent
+        in_list = state.in_list
+        in_numbered_list = state.in_numbered_list
+        numbered_list_indent = state.numbered_list_indent
 
-        for line in content.split("\n"):
+        for line in source_lines:
             stripped = line.lstrip()
 
             # Skip empty lines
@@ -150,7 +195,9 @@ class MarkdownResponseFormatter:
 
             lines.append(line)
 
-        return "\n".join(lines)
+        return lines, ListState(
+            current_indent, in_list, in_numbered_list, numbered_list_indent
+        )
 
     def _postprocess_html(self, content: str) -> str:
         """Post-process HTML to fix nested lists and other formatting"""
@@ -168,8 +215,12 @@ class MarkdownResponseFormatter:
 
         return content
 
-    def _process_mermaid(self, content: str) -> str:
-        """Process mermaid diagrams, but only those not inside code blocks"""
+    def _process_mermaid(self, content: str, streaming: bool = False) -> str:
+        """Process mermaid diagrams, but only those not inside code blocks.
+
+        While `streaming`, an unclosed diagram at the end of the content is
+        shown as a placeholder instead of its partial source.
+        """
         if not content:
             return content
 
@@ -177,11 +228,15 @@ class MarkdownResponseFormatter:
         code_blocks = []
 
         def save_code_block(match):
+            # Mermaid fences are matched too, so that their closing fence
+            # can't be paired with the opening fence of the next code block
+            if match.group(1) == "mermaid":
+                return match.group(0)
             code_blocks.append(match.group(0))
             return f"CODE_BLOCK_{len(code_blocks)-1}"
 
         content = re.sub(
-            r"```(?!mermaid\n)(\w+)?\n(.*?)```",
+            r"```(\w+)?\n(.*?)```",
             save_code_block,
             content,
             flags=re.DOTALL,
@@ -204,8 +259,15 @@ class MarkdownResponseFormatter:
             r"```mermaid\s*(.*?)\s*```", save_mermaid, content, flags=re.DOTALL
         )
 
-        # Restore code blocks before processing them
-        for i, block in enumerate(code_blocks):
+        # A diagram that is still streaming in runs to the end of the content.
+        # Once the response is complete, an unclosed diagram is left as is.
+        pending = re.search(r"(?m)^[ \t]*(?:<mermaid>|```mermaid)", content)
+        if streaming and pending:
+            content = content[: pending.start()] + "\n\nMERMAID_PENDING\n"
+
+        # Restore code blocks before processing them. Placeholders are restored
+        # last-first so that e.g. CODE_BLOCK_1 doesn't match CODE_BLOCK_10
+        for i, block in reversed(list(enumerate(code_blocks))):
             content = content.replace(f"CODE_BLOCK_{i}", block)
 
         # Process code blocks
@@ -214,10 +276,19 @@ class MarkdownResponseFormatter:
         # Convert markdown to HTML
         content = self.md.convert(content)
 
-        # Restore mermaid diagrams
-        for i, diagram in enumerate(mermaid_blocks):
-            mermaid_div = f'<div class="mermaid">\n{diagram}\n</div>'
-            content = content.replace(f"MERMAID_PLACEHOLDER_{i}", mermaid_div)
+        # Restore mermaid diagrams. Placeholders on their own line were made
+        # paragraphs by markdown, and a <div> can't go inside a <p>.
+        def restore_mermaid(match):
+            if match.group(2) == "PENDING":
+                return HTMLTemplates.MERMAID_PENDING
+            diagram = mermaid_blocks[int(match.group(3))]
+            return f'<div class="mermaid">\n{diagram}\n</div>'
+
+        content = re.sub(
+            r"(<p>)?MERMAID_(PENDING|PLACEHOLDER_(\d+))(?(1)</p>)",
+            restore_mermaid,
+            content,
+        )
 
         return content
 
@@ -243,53 +314,239 @@ class MarkdownResponseFormatter:
 
         return content
 
-    def _generate_html(self, content: str) -> str:
-        """Generate HTML with consistent styling"""
-        if not content:
-            return ""
-
-        return HTMLTemplates.apply_style(content)
+    def _render_output(self, output: str, streaming: bool = False) -> str:
+        """Render the output section source to an HTML fragment"""
+        # Preprocess lists
+        output = self._preprocess_lists(output)
 
-    def format_response(self, response_text: str) -> tuple[str, str]:
-        """Format the response and return (thinking, output) tuple"""
-        thinking = self._extract_section(response_text, "think")
-        output = self._extract_section(response_text, "output")
+        # Pre-process lists before any other processing
+        output = self._preprocess_lists(output)
 
-        if not output and thinking:
-            output = response_text.replace(thinking, "")
+        # Process code blocks and mermaid
+        output = self._process_mermaid(output, streaming)
+        content = self._process_code_blocks(output)
 
-        if output:
-            # Preprocess lists
-            output = self._preprocess_lists(output)
+        # Fix nested list formatting
+        formatted_output = self._fix_nested_lists(content)
 
-            # Pre-process lists before any other processing
-            output = self._preprocess_lists(output)
+        # Post-process HTML
+        return self._postprocess_html(formatted_output)
 
-            # Process code blocks and mermaid
-            output = self._process_mermaid(output)
-            content = self._process_code_blocks(output)
+    def new_conversation(self):
+        """Forget state carried over from earlier turns"""
+        self.highlighter.detector.new_conversation()
 
-            # Fix nested list formatting
-            formatted_output = self._fix_nested_lists(content)
+    def format_response(self, response_text: str) -> tuple[str, str]:
+        """Format the response and return (thinking, output) tuple.
+
+        The output is an HTML fragment, to be shown in the output page.
+        """
+        parser = SectionParser()
+        parser.feed(response_text)
+        return parser.thinking, self.format_output(parser.output, parser.output_open)
+
+    def format_output(self, output: str, streaming: bool = False) -> str:
+        """Format the source of the output section to an HTML fragment.
+
+        While `streaming`, the output section hasn't been closed yet.
+        """
+        return self._render_output(output, streaming) if output else ""
+
+
+class IncrementalMarkdownResponseFormatter(MarkdownResponseFormatter):
+    """Markdown formatter for streamed responses.
+
+    The output section is split into top-level blocks. Blocks that can no
+    longer change are rendered once and cached, so each new chunk only
+    re-renders the trailing open block. Blocks are joined with
+    `HTMLTemplates.BLOCK_SEPARATOR`; without the separators the result
+    matches a full render of the same text.
+    """
+
+    LIST_ITEM_PATTERN = re.compile(r"^(?:[-*] |\d+\.)")
+    HTML_OPEN_PATTERN = re.compile(r"^<([a-zA-Z][\w-]*)")
+    # Lines that continue a blockquote or definition list after a blank line
+    CONTINUATION_PATTERN = re.compile(r"^(?:>|:[ \t])")
+    DEFINITION_PATTERN = re.compile(r"^ {0,3}:[ \t]")
+    # Reference links, footnotes and abbreviations resolve across the whole
+    # document, so any of these forces a full render
+    GLOBAL_SYNTAX_PATTERN = re.compile(r"(?m)^ {0,3}\[[^\]]+\]:|\[\^|^\*\[")
+    BLOCK_MARKER = "INCREMENTAL_BLOCK_MARKER"
 
-            # Convert to HTML
-            html_output = self._generate_html(formatted_output)
-            # Post-process HTML
-            html_output = self._postprocess_html(html_output)
-        else:
-            html_output = ""
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def new_conversation(self):
+        """Forget state carried over from earlier turns"""
+        super().new_conversation()
+        self.reset()
+
+    def reset(self):
+        """Drop all cached blocks"""
+        self._source = ""
+        self._block_html: list[str] = []
+        self._list_states = (ListState(), ListState())
+        self._needs_full_render = False
+
+    def format_output(self, output: str, streaming: bool = False) -> str:
+        """Format the output section, re-rendering only its open block"""
+        return self._render_incremental(output, streaming) if output else ""
+
+    def _render_incremental(self, output: str, streaming: bool = False) -> str:
+        """Render output, re-using the HTML of blocks finished in earlier calls"""
+        if not output.startswith(self._source):
+            self.reset()
+
+        tail = output[len(self._source) :]
+        if self.GLOBAL_SYNTAX_PATTERN.search(tail):
+            self._needs_full_render = True
+        if self._needs_full_render:
+            return self._render_output(output, streaming)
+
+        lines = tail.split("\n")
+        for block_lines, length in self._closed_blocks(lines):
+            html, self._list_states = self._render_block(block_lines, closed=True)
+            self._block_html.append(html)
+            self._source += tail[:length]
+            tail = tail[length:]
+            lines = lines[len(block_lines) :]
+
+        open_html, _ = self._render_block(lines, closed=False, streaming=streaming)
+        blocks = self._block_html.copy()
+        if open_html.strip():
+            blocks.append(open_html)
+        if not blocks:
+            return ""
+        blocks[0] = blocks[0].lstrip()
+        blocks[-1] = blocks[-1].rstrip()
+        return HTMLTemplates.BLOCK_SEPARATOR.join(blocks)
+
+    def _closed_blocks(self, lines: list[str]):
+        """Yield (lines, source length) for each block that can no longer change.
+
+        A block closes at a blank line followed by an unindented line that does
+        not continue a list, blockquote or definition list, as long as no code
+        fence, mermaid diagram or raw HTML block is open. After a definition,
+        a line only starts a new block once the next line with text shows it
+        isn't a term. The last line may still be partial, so it is
+        never used to close a block.
+        """
+        start = 0
+        length = 0
+        fenced = False
+        open_tag = None
+        definitions = False
+        for i, line in enumerate(lines[:-1]):
+            stripped = line.strip()
+            if (
+                i > start
+                and stripped
+                and not fenced
+                and open_tag is None
+                and not lines[i - 1].strip()
+                and not line[0].isspace()
+                and not self.LIST_ITEM_PATTERN.match(line)
+                and not self.CONTINUATION_PATTERN.match(line)
+                and not (definitions and self._may_be_term(lines, i))
+            ):
+                yield lines[start:i], length
+                start = i
+                length = 0
+                definitions = False
+
+            length += len(line) + 1
+            if not fenced and self.DEFINITION_PATTERN.match(line):
+                definitions = True
+            if stripped.startswith("```"):
+                fenced = not fenced
+            elif fenced:
+                continue
+            elif open_tag is not None:
+                if f"</{open_tag}>" in line:
+                    open_tag = None
+            elif "<mermaid>" in line:
+                if "</mermaid>" not in line.split("<mermaid>")[-1]:
+                    open_tag = "mermaid"
+            else:
+                match = self.HTML_OPEN_PATTERN.match(stripped)
+                if (
+                    match
+                    and self.md.is_block_level(match.group(1))
+                    and f"</{match.group(1)}>" not in line
+                ):
+                    open_tag = match.group(1)
+
+    def _may_be_term(self, lines: list[str], i: int) -> bool:
+        """Whether line `i` may be the term of a definition that follows it"""
+        following = next((line for line in lines[i + 1 : -1] if line.strip()), None)
+        return following is None or bool(self.CONTINUATION_PATTERN.match(following))
+
+    def _render_block(
+        self, lines: list[str], closed: bool, streaming: bool = False
+    ) -> tuple[str, tuple[ListState, ListState]]:
+        """Render one block, continuing from the list state of the blocks before it.
+
+        Only the trailing open block of a `streaming` response can show a
+        pending diagram placeholder.
+        """
+        first_state, second_state = self._list_states
+        lines, first_state = self._preprocess_list_lines(lines, first_state)
+        lines, second_state = self._preprocess_list_lines(lines, second_state)
+
+        # Markdown strips its output, so the block is rendered after (and, when
+        # closed, before) a marker paragraph to keep the whitespace a full
+        # render would have. The open block may hold an unclosed raw HTML
+        # block that would swallow a trailing marker, and the end of the
+        # document is stripped anyway.
+        marker = f"<p>{self.BLOCK_MARKER}</p>"
+        source = f"{self.BLOCK_MARKER}\n\n" + "\n".join(lines)
+        if closed:
+            source += f"\n\n{self.BLOCK_MARKER}"
+
+        content = self._process_mermaid(source, streaming and not closed)
+        content = self._process_code_blocks(content)
+        content = self._fix_nested_lists(content)
+        content = self._postprocess_html(content)
 
-        return thinking, html_output
+        start = content.index(marker) + len(marker) + 1
+        end = content.rindex(marker) if closed else len(content)
+        return content[start:end], (first_state, second_state)
 
 
 class LLMClient:
-    def __init__(self):
-        self.api_url = OLLAMA_API_URL
-
-    def _format_prompt(self, user_input: str, chat_history: list) -> str:
-        """Format prompt with chat history"""
+    def __init__(
+        self, sessions: SessionPool = None, host: str = OLLAMA_HOST, api=OLLAMA_API
+    ):
+        self.host = host
+        self.api = api
+        self.sessions = sessions or SessionPool()
+        summarizer = Summarizer(self) if SUMMARY_MODEL else None
+        self.context = ContextBuilder(summarizer=summarizer)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.host}/api/{self.api}"
+
+    def _format_prompt(
+        self,
+        user_input: str,
+        chat_history: list,
+        model: str = None,
+        context: ContextBuilder = None,
+    ):
+        """Format the prompt of a turn for the configured endpoint.
+
+        The client's `context` remembers what the last turn sent, pass one
+        of its own for a prompt of another conversation.
+        """
+        messages = (context or self.context).build(
+            FORMATTING_INSTRUCTIONS, chat_history, user_input, model
+        )
+        if self.api == "chat":
+            return messages
         history_text = "\n".join(
-            [f"{msg['role']}: {msg['content']}" for msg in chat_history[-5:]]
+            [f"{msg['role']}: {msg['content']}" for msg in messages[1:-1]]
         )
         return f"""Previous conversation:
 {history_text}
@@ -298,71 +555,441 @@ class LLMClient:
 
 User: {user_input}"""
 
-    def stream_response(self, model: str, prompt: str):
-        """Stream response from API"""
-        payload = {"model": model, "prompt": prompt}
-        response = requests.post(self.api_url, json=payload, stream=True)
+    def context_usage(self, user_input: str, chat_history: list, model: str):
+        """Estimated prompt tokens of sending `user_input`, and the window"""
+        return self.context.usage(
+            FORMATTING_INSTRUCTIONS, chat_history, user_input, model
+        )
+
+    def build_payload(self, model: str, prompt, seed: int = None) -> dict:
+        """Request body for a streamed generation"""
+        key = "messages" if self.api == "chat" else "prompt"
+        payload = {"model": model, key: prompt}
+        payload.update(self._model_options(model))
+        payload["options"].update(GENERATION_OPTIONS)
+        if seed is not None:
+            payload["options"]["seed"] = seed
+        return payload
+
+    def _model_options(self, model: str) -> dict:
+        """Settings that are the same for every request to a model.
+
+        A request with a different num_ctx than the loaded model's makes
+        Ollama reload it, so the warm-up asks for the same settings.
+        """
+        # Ask for the window the prompt was built for, so nothing is cut off
+        return {
+            "keep_alive": keep_alive(model),
+            "options": {"num_ctx": context_window(model)},
+        }
+
+    def preload(self, model: str):
+        """Load a model into Ollama's memory without generating anything"""
+        self._post_empty({"model": model, **self._model_options(model)})
+
+    def unload(self, model: str):
+        """Free the memory of a loaded model"""
+        self._post_empty({"model": model, "keep_alive": 0})
+
+    def _post_empty(self, payload: dict):
+        """Send a generate request without a prompt, which only (un)loads"""
+        url = f"{self.host}/api/generate"
+        response = self.sessions.session(url).post(
+            url,
+            json={**payload, "stream": False},
+            timeout=(HTTP_CONNECT_TIMEOUT, HTTP_FIRST_TOKEN_TIMEOUT),
+        )
         response.raise_for_status()
+
+    def get_json(self, endpoint: str) -> dict:
+        """Fetch one of the API's listings, e.g. tags or ps"""
+        url = f"{self.host}/api/{endpoint}"
+        response = self.sessions.session(url).get(
+            url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream_response(self, model: str, prompt):
+        """Stream response from API"""
+        return self.stream_payload(self.build_payload(model, prompt))
+
+    def stream_payload(self, payload: dict, handle: RequestHandle = None):
+        """Stream the response to a request body from `build_payload`.
+
+        Aborting `handle` also stops a request still waiting for its headers.
+        """
+        session = self.sessions.session(self.api_url)
+        with (handle or RequestHandle()).track():
+            response = session.post(
+                self.api_url,
+                json=payload,
+                stream=True,
+                timeout=(HTTP_CONNECT_TIMEOUT, HTTP_FIRST_TOKEN_TIMEOUT),
+            )
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        # Ollama sends the headers with the first token
+        set_read_timeout(response, HTTP_READ_TIMEOUT)
         return response
 
+    def pool_stats(self) -> str:
+        """Describe the connection pools, for the console"""
+        return "\n".join(f"[pool] {stats}" for stats in self.sessions.stats())
+
+
+class ResponseStream:
+    """One streamed response: its text, its sections and the updates posted.
+
+    Each delta is routed to its section as it arrives; newer Ollama versions
+    send the thinking in a separate field. The output is only formatted when
+    it changed.
+    """
+
+    def __init__(self, formatter: ResponseFormatter, post, raw_events=False):
+        self.formatter = formatter
+        self.post = post
+        self.raw_events = raw_events
+        self.text = StreamText()
+        # Thinking sent apart from the text, by newer Ollama versions
+        self.thinking = StreamText()
+        self.sections = SectionParser()
+        self.done_event: Optional[dict] = None
+        self._versions = (0, 0)
+        self._last_output = ""
+
+    def feed(self, events: list[dict]) -> str:
+        """Handle the events that arrived together, return their text"""
+        texts = []
+        for event in events:
+            text, thinking = event_text(event)
+            texts.append(text)
+            self.text.append(text)
+            self.thinking.append(thinking)
+            self.sections.feed_thinking(thinking)
+            self.sections.feed(text)
+            if event.get("done"):
+                self.done_event = event
+        self._post_sections()
+        delta = "".join(texts)
+        if delta:
+            # The console appends, so only the new text is posted
+            self.post("console_update", delta, join=True)
+        if self.raw_events:
+            stamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+            lines = "".join(f"{stamp} {json.dumps(event)}\n" for event in events)
+            self.post("raw_events", lines, join=True)
+        return delta
+
+    def prefill_stats(self) -> str:
+        """Describe how much of the prompt Ollama had to evaluate.
+
+        Ollama only counts the prompt tokens it didn't find in its cache,
+        so this shrinks when the prompt prefix is reused.
+        """
+        if self.done_event is None or "prompt_eval_count" not in self.done_event:
+            return ""
+        count = self.done_event.get("prompt_eval_count", 0)
+        seconds = self.done_event.get("prompt_eval_duration", 0) / 1e9
+        return f"[prefill] {count} prompt tokens evaluated in {seconds:.2f} s"
+
+    def as_event(self) -> dict:
+        """The whole response as one final event, as the endpoint sends them.
+
+        Timings are left out, they don't describe a replay.
+        """
+        done = self.done_event or {}
+        event = {name: done[name] for name in ("model", "done_reason") if name in done}
+        fields = {"content" if "message" in done else "response": str(self.text)}
+        if self.thinking:
+            fields["thinking"] = str(self.thinking)
+        if "message" in done:
+            event["message"] = {"role": "assistant", **fields}
+        else:
+            event.update(fields)
+        event["done"] = True
+        return event
+
+    def finish(self) -> str:
+        """Post the final sections and return the full response text"""
+        self.sections.close()
+        self._post_sections()
+        return str(self.text)
+
+    def _post_sections(self):
+        sections = self.sections
+        thinking_version, output_version = self._versions
+        self._versions = (sections.thinking_version, sections.output_version)
+
+        if sections.thinking_version != thinking_version:
+            self.post("thinking_update", sections.thinking)
+
+        if sections.output_version != output_version:
+            output = self.formatter.format_output(sections.output, sections.output_open)
+            if output and output != self._last_output:
+                self.post("output_update", output)
+                self._last_output = output
+
+
+class Generation:
+    """A turn being generated, which can be stopped from any thread.
+
+    Its updates are posted with its request ID, so the scheduler drops them
+    once the next turn started. Stopping cancels the future and closes the
+    connection of its request, which makes Ollama stop loading the model or
+    generating instead of finishing a response nobody reads.
+    """
+
+    def __init__(self, request_id: int, scheduler: UpdateScheduler):
+        self.request_id = request_id
+        self.scheduler = scheduler
+        self.future: Optional[Future] = None
+        self.cancelled_at: Optional[float] = None
+        # Whether the worker took it up, it then reports when it stopped
+        self.started = False
+        self.request = RequestHandle()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancelled_at is not None
+
+    def post(self, name: str, value: str, coalesce: bool = True, join=False):
+        self.scheduler.post(
+            name, value, coalesce, request_id=self.request_id, join=join
+        )
+
+    def begin(self) -> bool:
+        """Mark the generation as taken up by its worker, unless it was stopped"""
+        with self._lock:
+            self.started = not self.cancelled
+            return self.started
+
+    def cancel(self):
+        """Stop the generation; the worker notices and winds down"""
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled_at = time.perf_counter()
+        if self.future is not None:
+            self.future.cancel()
+        self.request.abort()
+
 
 class LLMHandler:
-    def __init__(self, formatter: ResponseFormatter = None):
+    def __init__(
+        self,
+        formatter: ResponseFormatter = None,
+        max_fps: float = UI_MAX_FPS,
+        engine: str = LLM_ENGINE,
+        journal=None,
+        cache=None,
+    ):
         self.signals = LLMSignals()
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        self.formatter = formatter or MarkdownResponseFormatter()
+        # Updates from the worker thread reach the GUI through the scheduler,
+        # a max_fps of 0 emits them directly
+        self.scheduler = UpdateScheduler(self.signals, max_fps, UI_MIN_FPS)
+        self.formatter = formatter or IncrementalMarkdownResponseFormatter()
         self.client = LLMClient()
-        self._current_future: Optional[object] = None
-
-    def get_response(self, user_input: str, model: str, chat_history: list):
-        """Start async response generation"""
-        if self._current_future:
-            self._current_future.cancel()
-
-        self._current_future = self.executor.submit(
-            self._generate_response, user_input, model, chat_history
+        self.engine = engine
+        if engine == "async":
+            self.async_engine = AsyncEngine()
+        elif engine == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            raise ValueError(f"Unknown engine {engine!r}, use 'thread' or 'async'")
+        self._request_ids = itertools.count(1)
+        self._generation: Optional[Generation] = None
+        # Write-ahead log of the responses, finished by whoever saves them
+        self.journal = journal
+        # ResponseCache replaying deterministic generations, None for none
+        self.cache = cache
+        # Whether to post the events received as raw_events
+        self.raw_events = False
+        # Seconds from stopping a generation until its worker was idle
+        self.stop_time: Optional[float] = None
+
+    def get_response(
+        self, user_input: str, model: str, chat_history: list, journal_meta=None
+    ) -> int:
+        """Start async response generation, return its request id.
+
+        The journal entry of the response is keyed by the request id and
+        holds `journal_meta` next to the message and model.
+        """
+        self.stop()
+        generation = Generation(next(self._request_ids), self.scheduler)
+        self.scheduler.set_request_id(generation.request_id)
+        self._generation = generation
+        if self.journal is not None:
+            self.journal.start(
+                generation.request_id,
+                user=user_input,
+                model=model,
+                **(journal_meta or {}),
+            )
+
+        if self.engine == "async":
+            generation.future = self.async_engine.submit(
+                self._agenerate_response(generation, user_input, model, chat_history)
+            )
+        else:
+            generation.future = self.executor.submit(
+                self._generate_response, generation, user_input, model, chat_history
+            )
+        return generation.request_id
+
+    def stop(self) -> bool:
+        """Stop the current generation, return whether one was running"""
+        generation, self._generation = self._generation, None
+        if generation is None or generation.future.done():
+            return False
+        self.scheduler.set_request_id(None)
+        generation.cancel()
+        if not generation.started:
+            # It never ran and never will, so nothing else reports it
+            self._stopped(generation)
+        return True
+
+    def _start_response(self, user_input: str, model: str, chat_history: list):
+        """Prepare a turn and return its prompt"""
+        # The user message of this turn is already in the history
+        if len(chat_history) <= 1:
+            self.formatter.new_conversation()
+        return self.client._format_prompt(user_input, chat_history, model)
+
+    def _finish_response(
+        self, generation: Generation, stream: ResponseStream, pool_stats: str
+    ):
+        full_response = str(stream.text)
+        stats = "\n".join(filter(None, [stream.prefill_stats(), pool_stats]))
+        if stats:
+            generation.post("console_update", f"\n\n{stats}", join=True)
+        generation.post("llm_history_update", full_response, coalesce=False)
+        # Summaries run after the response, so they don't compete with it
+        self.client.context.summarize_dropped()
+
+    def _journal(self, generation: Generation, text: str):
+        if self.journal is not None:
+            self.journal.append(generation.request_id, text)
+
+    def _discard(self, generation: Generation):
+        """Drop the journal entry of a response that won't be saved"""
+        if self.journal is not None:
+            self.journal.finish(generation.request_id)
+
+    def _cache_key(self, payload: dict) -> Optional[str]:
+        return self.cache.key(payload) if self.cache is not None else None
+
+    def _replay(self, generation: Generation, key: Optional[str]) -> bool:
+        """Post the cached response of `key` like a streamed one, if cached"""
+        event = self.cache.get(key) if key is not None else None
+        if event is None:
+            return False
+        stream = ResponseStream(self.formatter, generation.post, self.raw_events)
+        self._journal(generation, stream.feed([event]))
+        stream.finish()
+        generation.post(
+            "cache_hit", f"Response replayed from cache ({key[:12]})", coalesce=False
+        )
+        self._finish_response(generation, stream, f"[cache] replayed {key[:12]}")
+        return True
+
+    def _store(self, key: Optional[str], stream: ResponseStream):
+        """Cache a response that was generated to the end"""
+        if key is not None and stream.done_event is not None:
+            self.cache.put(key, stream.as_event())
+
+    def _stopped(self, generation: Generation):
+        """Report how long the generation took to stop"""
+        self._discard(generation)
+        self.stop_time = time.perf_counter() - generation.cancelled_at
+        self.scheduler.post(
+            "generation_stopped",
+            f"[stop] request {generation.request_id} stopped after "
+            f"{self.stop_time * 1000:.0f} ms",
+            coalesce=False,
         )
 
-    def _generate_response(self, user_input: str, model: str, chat_history: list):
+    def _generate_response(
+        self, generation: Generation, user_input: str, model: str, chat_history: list
+    ):
         """Generate response in background thread"""
+        if not generation.begin():
+            return
         try:
-            prompt = self.client._format_prompt(user_input, chat_history)
-            response = self.client.stream_response(model, prompt)
-            full_response = self._process_response(response)
-            self.signals.llm_history_update.emit(full_response)
+            prompt = self._start_response(user_input, model, chat_history)
+            payload = self.client.build_payload(model, prompt)
+            key = self._cache_key(payload)
+            if self._replay(generation, key):
+                return
+            # Closing the response returns its connection to the pool
+            with self.client.stream_payload(payload, generation.request) as response:
+                stream = self._process_response(response, generation)
+            if not generation.cancelled:
+                self._finish_response(generation, stream, self.client.pool_stats())
+                self._store(key, stream)
         except Exception as e:
-            self.signals.error_occurred.emit(str(e))
-
-    def _process_response(self, response) -> None:
+            # Reading an aborted response fails, that's not an error
+            if not generation.cancelled:
+                self._discard(generation)
+                generation.post("error_occurred", str(e), coalesce=False)
+        finally:
+            if generation.cancelled:
+                self._stopped(generation)
+
+    async def _agenerate_response(
+        self, generation: Generation, user_input: str, model: str, chat_history: list
+    ):
+        """Generate response on the async engine's event loop.
+
+        Formatting, the journal and the cache run on the engine's worker
+        thread, so the loop keeps reading other streams meanwhile.
+        """
+        if not generation.begin():
+            return
+        engine = self.async_engine
+        try:
+            prompt = await engine.run_blocking(
+                self._start_response, user_input, model, chat_history
+            )
+            payload = self.client.build_payload(model, prompt)
+            key = self._cache_key(payload)
+            if await engine.run_blocking(self._replay, generation, key):
+                return
+            stream = ResponseStream(self.formatter, generation.post, self.raw_events)
+            async for events in engine.stream_events(self.client.api_url, payload):
+                await engine.run_blocking(self._feed, generation, stream, events)
+            await engine.run_blocking(stream.finish)
+            self._finish_response(generation, stream, engine.pool_stats())
+            await engine.run_blocking(self._store, key, stream)
+        except Exception as e:
+            if not generation.cancelled:
+                self._discard(generation)
+                generation.post("error_occurred", str(e), coalesce=False)
+        finally:
+            # Cancelling the task raises CancelledError, which isn't caught
+            if generation.cancelled:
+                self._stopped(generation)
+
+    def _process_response(self, response, generation: Generation) -> ResponseStream:
         """Process streaming response"""
-        full_response = ""
-        last_thinking = ""
-        last_output = ""
-
-        for line in response.iter_lines():
-            if line:
-                json_response = json.loads(line)
-                response_text = json_response.get("response", "")
-                full_response += response_text
-
-                # Format the response
-                thinking, output = self.formatter.format_response(full_response)
-
-                if thinking and thinking != last_thinking:
-                    self.signals.thinking_update.emit(thinking)
-                    last_thinking = thinking
-
-                if output and output != last_output:
-                    self.signals.output_update.emit(output)
-                    last_output = output
-
-                self.signals.console_update.emit(full_response)
-
-        return full_response
+        stream = ResponseStream(self.formatter, generation.post, self.raw_events)
+        # Events that arrived in the same read are handled together
+        for events in iter_event_batches(response):
+            if generation.cancelled:
+                break
+            self._feed(generation, stream, events)
+        stream.finish()
+        return stream
+
+    def _feed(self, generation: Generation, stream: ResponseStream, events: list):
+        """Handle the events that arrived together and journal their text"""
+        self._journal(generation, stream.feed(events))
 
     def get_loading_html(self) -> str:
         """Generate loading HTML"""
-        loading_content = HTMLTemplates.LOADING.format(
-            text_secondary=Styles.TEXT_SECONDARY
-        )
-        return self.formatter._generate_html(loading_content)
+        return HTMLTemplates.LOADING.format(text_secondary=Styles.TEXT_SECONDARY)
@@ -1,11 +1,22 @@
 import sys
 
-from PySide6.QtWidgets import QApplication
 
-from gui import OllamaGUI
+def main(argv: list[str]) -> int:
+    # The batch mode runs without Qt widgets, so without a display
+    if argv[1:2] == ["batch"]:
+        from batch import main as batch_main
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+        return batch_main(argv[2:])
+
+    from PySide6.QtWidgets import QApplication
+
+    from gui import OllamaGUI
+
+    app = QApplication(argv)
     window = OllamaGUI()
     window.show()
-    sys.exit(app.exec())
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
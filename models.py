@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from constants import KEEP_ALIVE, MODEL_CACHE_FILE, MODEL_KEEP_ALIVE
+
+
+def model_setting(settings: dict, model: Optional[str], default):
+    """Look a model up by its full name, then by its name without the tag"""
+    if model in settings:
+        return settings[model]
+    return settings.get((model or "").split(":")[0], default)
+
+
+def keep_alive(model: Optional[str]) -> str:
+    """How long Ollama should keep a model loaded after a request"""
+    return model_setting(MODEL_KEEP_ALIVE, model, KEEP_ALIVE)
+
+
+def format_size(size: int) -> str:
+    """Format a size in bytes like Ollama does, e.g. 4.7 GB"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000:
+            break
+        size /= 1000
+    else:
+        unit = "TB"
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+@dataclass
+class ModelInfo:
+    """An installed model and, while it's loaded, the memory it takes"""
+
+    name: str
+    size: int = 0  # On disk
+    parameter_size: str = ""
+    quantization: str = ""
+    loaded: bool = False
+    memory: int = 0  # While loaded
+    memory_vram: int = 0  # Part of the memory on the GPU
+    expires_at: str = ""
+
+    @property
+    def residency(self) -> str:
+        """Where the model is loaded, e.g. 5.4 GB (100% GPU)"""
+        if not self.loaded:
+            return ""
+        gpu = round(100 * self.memory_vram / self.memory) if self.memory else 0
+        if gpu == 100:
+            where = "100% GPU"
+        elif gpu == 0:
+            where = "100% CPU"
+        else:
+            where = f"{100 - gpu}%/{gpu}% CPU/GPU"
+        return f"{format_size(self.memory)} ({where})"
+
+
+def merge_models(tags: dict, ps: dict) -> list[ModelInfo]:
+    """Combine the responses of /api/tags and /api/ps into one list"""
+    models = {}
+    for entry in tags.get("models", []) + ps.get("models", []):
+        details = entry.get("details", {})
+        models.setdefault(
+            entry["name"],
+            ModelInfo(
+                entry["name"],
+                parameter_size=details.get("parameter_size", ""),
+                quantization=details.get("quantization_level", ""),
+            ),
+        )
+    for entry in tags.get("models", []):
+        models[entry["name"]].size = entry.get("size", 0)
+    for entry in ps.get("models", []):
+        model = models[entry["name"]]
+        model.loaded = True
+        model.memory = entry.get("size", 0)
+        model.memory_vram = entry.get("size_vram", 0)
+        model.expires_at = entry.get("expires_at", "")
+    return sorted(models.values(), key=lambda model: model.name)
+
+
+class ModelSignals(QObject):
+    model_status = Signal(str)
+    models_updated = Signal(list)
+
+
+class ModelWarmer:
+    """Load the selected model before the first prompt needs it.
+
+    Loading a large model takes seconds to minutes, which otherwise shows
+    up as the first response hanging. An empty generate request makes
+    Ollama load the model and keep it for its keep-alive duration. Loads
+    run on a worker thread of their own; a model selected and replaced
+    before its turn came is skipped. Only the status of the model selected
+    last is emitted.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.signals = ModelSignals()
+        self._selected: Optional[str] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def warm(self, model: str) -> Future:
+        """Start loading a model in the background"""
+        with self._lock:
+            self._selected = model
+        self._status(model, f"Loading {model}...")
+        return self._executor.submit(self._load, model)
+
+    def _load(self, model: str):
+        if model != self._selected:
+            return
+        start = time.perf_counter()
+        try:
+            self.client.preload(model)
+        except Exception as e:
+            self._status(model, f"Could not load {model}: {e}")
+            return
+        seconds = time.perf_counter() - start
+        self._status(model, f"{model} ready (loaded in {seconds:.1f} s)")
+
+    def _status(self, model: str, message: str):
+        with self._lock:
+            if model != self._selected:
+                return
+        self.signals.model_status.emit(message)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ModelRegistry:
+    """Installed models and the memory the loaded ones take, kept up to date.
+
+    `refresh` asks Ollama in the background and emits `models_updated` with
+    the new list. The last list is cached on disk and read at startup, so
+    the models are known before Ollama answered (with their residency as it
+    was then, until the first refresh).
+    """
+
+    def __init__(self, client, cache_file: Path = MODEL_CACHE_FILE):
+        self.client = client
+        self.cache_file = Path(cache_file)
+        self.signals = ModelSignals()
+        self.models = self._read_cache()
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future: Optional[Future] = None
+
+    def refresh(self) -> Optional[Future]:
+        """Update the models in the background, unless an update is running"""
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return None
+            self._future = self._executor.submit(self._refresh)
+            return self._future
+
+    def unload(self, model: str) -> Future:
+        """Free the memory of a loaded model, then update the models"""
+        return self._executor.submit(self._unload, model)
+
+    def _unload(self, model: str):
+        try:
+            self.client.unload(model)
+        except Exception as e:
+            self.last_error = str(e)
+            return
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            models = merge_models(
+                self.client.get_json("tags"), self.client.get_json("ps")
+            )
+        except Exception as e:
+            self.last_error = str(e)
+            return
+        self.last_error = None
+        self.models = models
+        self._write_cache(models)
+        self.signals.models_updated.emit(models)
+
+    def _read_cache(self) -> list[ModelInfo]:
+        try:
+            entries = json.loads(self.cache_file.read_text(encoding="utf-8"))
+            return [ModelInfo(**entry) for entry in entries]
+        except (OSError, ValueError, TypeError):
+            return []
+
+    def _write_cache(self, models: list[ModelInfo]):
+        # Write a new file and swap it in, so a crash can't leave half a list
+        temporary = self.cache_file.with_suffix(".tmp")
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temporary.write_text(
+                json.dumps([asdict(model) for model in models]), encoding="utf-8"
+            )
+            temporary.replace(self.cache_file)
+        except OSError:
+            pass
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,115 @@
+from typing import Optional
+
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QHBoxLayout,
+    QHeaderView,
+    QLabel,
+    QMainWindow,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from constants import APP_NAME
+from models import ModelInfo, ModelRegistry, format_size
+from styles import Styles
+
+COLUMNS = ["Model", "Size", "Parameters", "Quantization", "Loaded", "Expires"]
+
+
+class ModelsWindow(QMainWindow):
+    """Installed models, which of them are loaded and the memory they take"""
+
+    def __init__(self, registry: ModelRegistry):
+        super().__init__()
+        self.registry = registry
+        self.models: list[ModelInfo] = []
+        self.setWindowTitle(f"{APP_NAME} - Models")
+        self.setGeometry(200, 200, 900, 500)
+        self.setStyleSheet(Styles.COMMON + Styles.MAIN_WINDOW)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setStyleSheet(Styles.PANEL_LIST + Styles.SCROLLBAR)
+        self.table.itemSelectionChanged.connect(self.update_buttons)
+
+        self.summary = QLabel()
+        self.summary.setStyleSheet(f"color: {Styles.TEXT_SECONDARY};")
+        self.unload_button = QPushButton("Unload")
+        self.unload_button.setStyleSheet(Styles.BUTTON)
+        self.unload_button.clicked.connect(self.unload_selected)
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.setStyleSheet(Styles.BUTTON)
+        self.refresh_button.clicked.connect(self.registry.refresh)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.summary)
+        buttons.addStretch()
+        buttons.addWidget(self.refresh_button)
+        buttons.addWidget(self.unload_button)
+
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        self.setCentralWidget(container)
+
+        self.registry.signals.models_updated.connect(self.show_models)
+        self.show_models(self.registry.models)
+
+    def show_models(self, models: list[ModelInfo]):
+        """Fill the table, keeping the selected model selected"""
+        selected = self.selected_model()
+        self.models = models
+        self.table.clearSelection()
+        self.table.setRowCount(len(models))
+        for row, model in enumerate(models):
+            values = [
+                model.name,
+                format_size(model.size) if model.size else "",
+                model.parameter_size,
+                model.quantization,
+                model.residency,
+                model.expires_at[:19].replace("T", " "),
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+            if model.name == selected:
+                self.table.selectRow(row)
+
+        loaded = [model for model in models if model.loaded]
+        memory = format_size(sum(model.memory for model in loaded))
+        self.summary.setText(
+            f"{len(models)} installed, {len(loaded)} loaded using {memory}"
+        )
+        self.update_buttons()
+
+    def selected_model(self) -> Optional[str]:
+        rows = self.table.selectionModel().selectedRows()
+        if not rows or rows[0].row() >= len(self.models):
+            return None
+        return self.models[rows[0].row()].name
+
+    def update_buttons(self):
+        name = self.selected_model()
+        loaded = any(model.loaded for model in self.models if model.name == name)
+        self.unload_button.setEnabled(loaded)
+
+    def unload_selected(self):
+        name = self.selected_model()
+        if name is not None:
+            self.unload_button.setEnabled(False)
+            self.registry.unload(name)
+
+    def showEvent(self, event):
+        self.registry.refresh()
+        super().showEvent(event)
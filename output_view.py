@@ -0,0 +1,44 @@
+import json
+
+from PySide6.QtCore import Qt, QUrl
+from PySide6.QtWebEngineWidgets import QWebEngineView
+
+from block_patch import BlockPatcher
+from constants import ASSETS_DIR
+from templates import HTMLTemplates
+
+
+class OutputView(QWebEngineView):
+    """Web view that loads the output page once and then patches it.
+
+    Content is split into blocks on `HTMLTemplates.BLOCK_SEPARATOR`. Only the
+    blocks that differ from what the page already shows are sent to it, so
+    streamed updates don't reload the page or lose the scroll position.
+    """
+
+    def __init__(self, content: str = ""):
+        super().__init__()
+        self.setContextMenuPolicy(Qt.NoContextMenu)
+        self._patcher = BlockPatcher(content)
+        self.loadFinished.connect(self._on_load_finished)
+        # Resolve the page's scripts from the bundled assets, not the network
+        self.setHtml(HTMLTemplates.page(), QUrl.fromLocalFile(f"{ASSETS_DIR}/"))
+
+    def set_content(self, html_content: str):
+        """Show new content, patching only the blocks that changed"""
+        self._send(self._patcher.set_content(html_content))
+
+    def clear(self):
+        """Remove all content from the page"""
+        self.set_content("")
+
+    def _on_load_finished(self, ok: bool):
+        """Send the current content once the page shell is ready"""
+        self._send(self._patcher.load_finished(ok))
+
+    def _send(self, patch):
+        """Replace the blocks from the first changed one on"""
+        if patch is None:
+            return
+        start, blocks = patch
+        self.page().runJavaScript(f"patchBlocks({start}, {json.dumps(blocks)});")
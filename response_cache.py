@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from constants import RESPONSE_CACHE_DIR, RESPONSE_CACHE_SIZE
+
+# Payload options that don't change what's generated
+IGNORED_OPTIONS = {"num_ctx", "num_thread", "num_gpu", "use_mmap"}
+
+
+class ResponseCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    max_bytes: int
+    size: int
+    entries: int
+
+
+def normalize_text(text: str) -> str:
+    """Text without the whitespace that doesn't change its meaning"""
+    lines = text.replace("\r\n", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def is_deterministic(options: dict) -> bool:
+    """Whether a generation with these options always gives the same text.
+
+    Greedy sampling (temperature 0) and a fixed seed are reproducible; by
+    default Ollama samples with a new seed every time.
+    """
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+class ResponseCache:
+    """Responses of deterministic generations, stored on disk by content.
+
+    Entries are keyed by a hash of the model, the prompt with its whitespace
+    normalized and the options that change sampling, and stored in a file
+    named after the key. Reading an entry touches its file, so modification
+    times order the entries by use across runs; once they take more than
+    `max_bytes`, the least recently used are deleted.
+    """
+
+    def __init__(
+        self, directory: Path = RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_SIZE
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Sizes of the entries, least recently used first
+        self._entries: OrderedDict[str, int] = self._scan()
+        self._size = sum(self._entries.values())
+
+    def key(self, payload: dict) -> Optional[str]:
+        """Key of the response to a request body, None if it can't be cached"""
+        options = {
+            name: value
+            for name, value in payload.get("options", {}).items()
+            if name not in IGNORED_OPTIONS
+        }
+        if not is_deterministic(options):
+            return None
+        if "messages" in payload:
+            prompt = [
+                {"role": message["role"], "content": normalize_text(message["content"])}
+                for message in payload["messages"]
+            ]
+        else:
+            prompt = normalize_text(payload.get("prompt", ""))
+        content = json.dumps(
+            {"model": payload["model"], "prompt": prompt, "options": options},
+            sort_keys=True,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """The cached response event of `key`, marked as just used"""
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                event = json.loads(path.read_text(encoding="utf-8"))
+                os.utime(path)
+            except (OSError, ValueError):
+                # Deleted or cut off by something else, forget it
+                self._size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return event
+
+    def put(self, key: str, event: dict):
+        """Store the response event of `key`, evicting what doesn't fit"""
+        path = self._path(key)
+        data = json.dumps(event).encode("utf-8")
+        with self._lock:
+            # Write a new file and swap it in, so a crash can't leave half an entry
+            temporary = path.with_suffix(".tmp")
+            try:
+                temporary.write_bytes(data)
+                temporary.replace(path)
+            except OSError:
+                return
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._size > self.max_bytes and self._entries:
+                evicted, size = self._entries.popitem(last=False)
+                self._size -= size
+                self._path(evicted).unlink(missing_ok=True)
+
+    def cache_info(self) -> ResponseCacheInfo:
+        with self._lock:
+            return ResponseCacheInfo(
+                self.hits, self.misses, self.max_bytes, self._size, len(self._entries)
+            )
+
+    def cache_clear(self):
+        """Delete every entry"""
+        with self._lock:
+            for key in self._entries:
+                self._path(key).unlink(missing_ok=True)
+            self._entries.clear()
+            self._size = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _scan(self) -> OrderedDict:
+        """The entries left by earlier runs, least recently used first"""
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                if path.suffix == ".tmp":
+                    path.unlink()  # Left by a crash while writing
+                elif path.suffix == ".json":
+                    stat = path.stat()
+                    entries.append((stat.st_mtime_ns, path.stem, stat.st_size))
+            except OSError:
+                continue
+        return OrderedDict((key, size) for _, key, size in sorted(entries))
@@ -0,0 +1,140 @@
+import threading
+import time
+from typing import Optional
+
+from PySide6.QtCore import QObject, Qt, QTimer, Signal
+
+
+class UpdateScheduler(QObject):
+    """Coalesce updates from a worker thread into frames on the GUI thread.
+
+    Workers `post` values by signal name. Coalesced signals only keep their
+    latest value, older values are dropped. At most one frame is delivered
+    per frame interval, and the interval grows when delivering a frame
+    (i.e. running the connected slots) takes longer than the frame budget.
+    Non-coalesced signals (e.g. errors, final results) are never dropped and
+    keep their order relative to the coalesced values posted before them.
+    Joined signals carry pieces of text: the values posted between frames
+    are concatenated instead of replaced.
+
+    Updates can be tagged with the ID of the request that posted them. Once
+    another request is started with `set_request_id`, the pending and later
+    updates of the old one are dropped, so a request that is still winding
+    down can't write into the next turn. Untagged updates are always
+    delivered.
+    """
+
+    _wake = Signal()
+
+    # Smoothing factor for the measured render time
+    RENDER_TIME_ALPHA = 0.3
+    # Keep the GUI thread at most this busy with rendering
+    RENDER_BUDGET = 0.5
+
+    def __init__(self, signals: QObject, max_fps: float = 30, min_fps: float = 4):
+        super().__init__()
+        self.signals = signals
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.render_time = 0.0
+        self.posted = 0
+        self.delivered = 0
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._latest: dict[str, tuple[str, Optional[int]]] = {}
+        self._queue: list[tuple[str, tuple[str, Optional[int]]]] = []
+        self._request_id: Optional[int] = None
+        self._frame_pending = False
+        self._last_frame = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._deliver_frame)
+        self._wake.connect(self._schedule_frame, Qt.QueuedConnection)
+
+    @property
+    def frame_interval(self) -> float:
+        """Current time between frames in seconds"""
+        interval = max(1 / self.max_fps, self.render_time / self.RENDER_BUDGET)
+        return min(interval, 1 / self.min_fps)
+
+    def set_request_id(self, request_id: Optional[int]):
+        """Deliver only the updates of `request_id` (and untagged ones)"""
+        with self._lock:
+            self._request_id = request_id
+            latest = {
+                name: update
+                for name, update in self._latest.items()
+                if self._is_current(update[1])
+            }
+            queue = [item for item in self._queue if self._is_current(item[1][1])]
+            self.dropped += len(self._latest) + len(self._queue)
+            self.dropped -= len(latest) + len(queue)
+            self._latest, self._queue = latest, queue
+
+    def _is_current(self, request_id: Optional[int]) -> bool:
+        return request_id is None or request_id == self._request_id
+
+    def post(
+        self,
+        name: str,
+        value: str,
+        coalesce: bool = True,
+        request_id: Optional[int] = None,
+        join: bool = False,
+    ):
+        """Post a value for the signal called `name`, from any thread"""
+        if not self.max_fps:
+            with self._lock:
+                current = self._is_current(request_id)
+            if current:
+                getattr(self.signals, name).emit(value)
+            return
+
+        with self._lock:
+            self.posted += 1
+            if not self._is_current(request_id):
+                self.dropped += 1
+                return
+            if join and self._latest.get(name, (None, request_id))[1] == request_id:
+                pending = self._latest.get(name, ("", None))[0]
+                self._latest[name] = (pending + value, request_id)
+            elif coalesce:
+                if name in self._latest:
+                    self.dropped += 1
+                self._latest[name] = (value, request_id)
+            else:
+                # Freeze the values posted so far so they are delivered first
+                self._queue.extend(self._latest.items())
+                self._latest.clear()
+                self._queue.append((name, (value, request_id)))
+
+            if self._frame_pending:
+                return
+            self._frame_pending = True
+
+        self._wake.emit()
+
+    def _schedule_frame(self):
+        """Start the frame timer, respecting the current frame interval"""
+        delay = self._last_frame + self.frame_interval - time.perf_counter()
+        self._timer.start(max(0, int(delay * 1000)))
+
+    def _deliver_frame(self):
+        """Emit everything posted since the last frame and measure its cost"""
+        with self._lock:
+            updates = self._queue + list(self._latest.items())
+            self._queue = []
+            self._latest = {}
+            self._frame_pending = False
+
+        start = time.perf_counter()
+        for name, (value, _) in updates:
+            getattr(self.signals, name).emit(value)
+        self._last_frame = time.perf_counter()
+
+        self.delivered += len(updates)
+        self.render_time += self.RENDER_TIME_ALPHA * (
+            self._last_frame - start - self.render_time
+        )
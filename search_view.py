@@ -0,0 +1,80 @@
+from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtWidgets import (
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QMainWindow,
+    QVBoxLayout,
+    QWidget,
+)
+
+from constants import APP_NAME
+from store import ConversationStore
+from styles import Styles
+
+# Milliseconds of typing pause before searching
+SEARCH_DELAY = 200
+
+
+class SearchWindow(QMainWindow):
+    """Search the saved conversations and pick one to continue"""
+
+    session_opened = Signal(int)
+
+    def __init__(self, store: ConversationStore):
+        super().__init__()
+        self.store = store
+        self.setWindowTitle(f"{APP_NAME} - Conversations")
+        self.setGeometry(200, 200, 800, 600)
+        self.setStyleSheet(Styles.COMMON + Styles.MAIN_WINDOW)
+
+        self.query = QLineEdit()
+        self.query.setPlaceholderText("Search conversations")
+        self.query.setStyleSheet(Styles.PANEL_LIST)
+        self.results = QListWidget()
+        self.results.setWordWrap(True)
+        self.results.setStyleSheet(Styles.PANEL_LIST + Styles.SCROLLBAR)
+        self.results.itemActivated.connect(self.open_item)
+
+        # Search once typing pauses instead of on every key
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.search)
+        self.query.textChanged.connect(self.search_timer.start)
+
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.addWidget(self.query)
+        layout.addWidget(self.results)
+        self.setCentralWidget(container)
+
+    def search(self):
+        """List the matching turns, or the latest conversations without a query"""
+        self.results.clear()
+        query = self.query.text()
+        if query.strip():
+            rows = [
+                (hit.session_id, f"{hit.title}\n  {' '.join(hit.snippet.split())}")
+                for hit in self.store.search(query)
+            ]
+        else:
+            rows = [
+                (
+                    session.id,
+                    f"{session.title}\n  {session.started_at.replace('T', ' ')}"
+                    f" · {session.turns} turns",
+                )
+                for session in self.store.sessions()
+            ]
+        for session_id, text in rows:
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, session_id)
+            self.results.addItem(item)
+
+    def open_item(self, item: QListWidgetItem):
+        self.session_opened.emit(item.data(Qt.UserRole))
+
+    def showEvent(self, event):
+        self.search()
+        super().showEvent(event)
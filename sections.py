@@ -0,0 +1,142 @@
+from stream import StreamText
+
+# Parser states: outside any section, or inside <think> or <output>
+TEXT, THINK, OUTPUT = "text", "think", "output"
+
+# Tags that end the text of each state, and the state they lead to
+TRANSITIONS = {
+    TEXT: {"<think>": THINK, "<output>": OUTPUT, "</think>": TEXT},
+    THINK: {"</think>": TEXT},
+    OUTPUT: {"</output>": TEXT},
+}
+MAX_TAG_LENGTH = max(len(tag) for tags in TRANSITIONS.values() for tag in tags)
+
+
+class SectionParser:
+    """Split a streamed response into thinking and output as it arrives.
+
+    Each delta is scanned once and its text appended to the channel of the
+    section it belongs to, so the work per chunk is O(delta). Tags split
+    across chunks are held back until they are complete. Tags inside a
+    section other than its closing tag are treated as text.
+
+    When a response has a thinking section but no <output> tag (yet), the
+    text outside the sections is the output. Text before a `</think>`
+    without opening tag (models whose template opens the thinking section)
+    is taken as thinking.
+    """
+
+    def __init__(self):
+        self.state = TEXT
+        self.thinking_version = 0
+        self.output_version = 0
+        self._thinking = StreamText()
+        self._output = StreamText()
+        self._loose = StreamText()
+        self._pending = ""
+        self._seen_output = False
+        self._seen_section = False
+        self._closed = False
+
+    @property
+    def thinking(self) -> str:
+        return str(self._thinking)
+
+    @property
+    def output(self) -> str:
+        if self._seen_output:
+            return str(self._output)
+        return str(self._loose) if self._seen_section else ""
+
+    @property
+    def output_open(self) -> bool:
+        """Whether the output section has started but not finished"""
+        return self.state == OUTPUT and not self._closed
+
+    def feed(self, delta: str):
+        """Route a delta of the response text to its section"""
+        if not delta:
+            return
+        text = self._pending + delta
+        self._pending = ""
+        pos = 0
+        while True:
+            transitions = TRANSITIONS[self.state]
+            found, tag = -1, None
+            for candidate in transitions:
+                index = text.find(candidate, pos)
+                if index >= 0 and (found < 0 or index < found):
+                    found, tag = index, candidate
+            if tag is None:
+                break
+            self._append(text[pos:found])
+            self._enter(tag, transitions[tag])
+            pos = found + len(tag)
+
+        # Hold back a trailing "<..." that may be the start of a tag
+        hold = text.rfind("<", max(pos, len(text) - MAX_TAG_LENGTH + 1))
+        if hold >= 0 and any(
+            tag.startswith(text[hold:]) for tag in TRANSITIONS[self.state]
+        ):
+            self._pending = text[hold:]
+            text = text[:hold]
+        self._append(text[pos:])
+
+    def feed_thinking(self, delta: str):
+        """Add thinking that the API returned separately from the response"""
+        self._append_to(self._thinking, delta)
+        if delta:
+            self.thinking_version += 1
+
+    def close(self):
+        """Mark the response as complete, releasing any held back text"""
+        pending, self._pending = self._pending, ""
+        self._append(pending)
+        self._closed = True
+        self.output_version += 1
+
+    def _enter(self, tag: str, state: str):
+        # Like the leading whitespace, trailing whitespace of a finished
+        # section is dropped
+        if self.state == THINK:
+            self._thinking = self._rstripped(self._thinking)
+        elif self.state == OUTPUT:
+            self._output = self._rstripped(self._output)
+        if tag == "</think>" and self.state == TEXT and not self._seen_section:
+            # The thinking section was opened by the prompt template
+            self._thinking = self._rstripped(self._loose)
+            self._loose = StreamText()
+            self.thinking_version += 1
+        if tag == "<output>":
+            self._seen_output = True
+        self._seen_section = True
+        self.state = state
+        # Which text is the output may have changed
+        self.output_version += 1
+
+    def _append(self, text: str):
+        if not text:
+            return
+        if self.state == THINK:
+            if self._append_to(self._thinking, text):
+                self.thinking_version += 1
+        elif self.state == OUTPUT:
+            if self._append_to(self._output, text):
+                self.output_version += 1
+        elif self._append_to(self._loose, text):
+            if self._seen_section and not self._seen_output:
+                self.output_version += 1
+
+    @staticmethod
+    def _rstripped(channel: StreamText) -> StreamText:
+        stripped = StreamText()
+        stripped.append(str(channel).rstrip())
+        return stripped
+
+    @staticmethod
+    def _append_to(channel: StreamText, text: str) -> bool:
+        """Append text, dropping leading whitespace of the channel"""
+        if not len(channel):
+            text = text.lstrip()
+        channel.append(text)
+        return bool(text)
@@ -0,0 +1,304 @@
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from constants import AUTOSAVE_DELAY, CONVERSATION_DB
+from sections import SectionParser
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    position INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    model TEXT NOT NULL,
+    user TEXT NOT NULL,
+    thinking TEXT NOT NULL,
+    output TEXT NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_by_session ON turns (session_id, position);
+"""
+
+# Turns are only ever inserted, so the index only needs an insert trigger
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5 (
+    user, thinking, output, content='turns', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts (rowid, user, thinking, output)
+    VALUES (new.id, new.user, new.thinking, new.output);
+END;
+"""
+
+# Length of a session title taken from its first message
+TITLE_LENGTH = 80
+
+
+@dataclass
+class Session:
+    id: int
+    started_at: str
+    title: str
+    turns: int
+
+
+@dataclass
+class SearchHit:
+    session_id: int
+    position: int
+    title: str
+    snippet: str
+
+
+def split_response(response: str) -> tuple[str, str]:
+    """Split a finished response into its thinking and output"""
+    parser = SectionParser()
+    parser.feed(response)
+    parser.close()
+    return parser.thinking, parser.output
+
+
+class ConversationStore:
+    """Conversations in a SQLite database, searchable with FTS5.
+
+    Each finished turn is inserted once, split into thinking and output, so
+    saving never rewrites earlier turns. When the SQLite library lacks FTS5,
+    search falls back to a (slower) LIKE scan.
+    """
+
+    def __init__(self, path: Path = CONVERSATION_DB):
+        self.path = Path(path)
+        if str(path) != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.executescript(SCHEMA)
+            try:
+                self._db.executescript(FTS_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError:
+                self.full_text = False
+
+    def new_session(self, title: str) -> int:
+        """Start a conversation and return its id"""
+        title = " ".join(title.split())[:TITLE_LENGTH]
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO sessions (started_at, title) VALUES (?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), title),
+            )
+        return cursor.lastrowid
+
+    def add_turn(
+        self, session_id: int, user: str, response: str, model: str = ""
+    ) -> int:
+        """Append a turn to a conversation and return its position"""
+        thinking, output = split_response(response)
+        with self._lock, self._db:
+            position = self._db.execute(
+                "SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            self._db.execute(
+                "INSERT INTO turns (session_id, position, created_at, model, user,"
+                " thinking, output, response) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    session_id,
+                    position,
+                    datetime.now().isoformat(timespec="seconds"),
+                    model,
+                    user,
+                    thinking,
+                    output,
+                    response,
+                ),
+            )
+        return position
+
+    def sessions(self, limit: int = 100) -> list[Session]:
+        """The latest conversations, newest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT sessions.id, started_at, title, COUNT(turns.id) AS turns"
+                " FROM sessions LEFT JOIN turns ON turns.session_id = sessions.id"
+                " GROUP BY sessions.id ORDER BY sessions.id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [Session(*row) for row in rows]
+
+    def turns(self, session_id: int) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM turns WHERE session_id = ? ORDER BY position",
+                (session_id,),
+            ).fetchall()
+
+    def history(self, session_id: int) -> list[dict]:
+        """A conversation as chat history, to continue it"""
+        return [
+            {
+                "role": "user",
+                "content": turn["user"],
+                "llm_history": turn["response"],
+                "model": turn["model"],
+            }
+            for turn in self.turns(session_id)
+        ]
+
+    def search(self, query: str, limit: int = 50) -> list[SearchHit]:
+        """Find turns whose message, thinking or output contain all words"""
+        words = query.split()
+        if not words:
+            return []
+        if self.full_text:
+            # Quote every word, so the query's own syntax can't break it
+            match = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+            sql = (
+                "SELECT turns.session_id, turns.position, sessions.title,"
+                " snippet(turns_fts, -1, '[', ']', '…', 12)"
+                " FROM turns_fts JOIN turns ON turns.id = turns_fts.rowid"
+                " JOIN sessions ON sessions.id = turns.session_id"
+                " WHERE turns_fts MATCH ? ORDER BY rank LIMIT ?"
+            )
+            parameters = (match, limit)
+        else:
+            text = "(turns.user || ' ' || turns.thinking || ' ' || turns.output)"
+            sql = (
+                "SELECT turns.session_id, turns.position, sessions.title,"
+                " substr(turns.user, 1, 80)"
+                " FROM turns JOIN sessions ON sessions.id = turns.session_id"
+                f" WHERE {' AND '.join([f'{text} LIKE ?'] * len(words))}"
+                " ORDER BY turns.id DESC LIMIT ?"
+            )
+            parameters = (*[f"%{word}%" for word in words], limit)
+        with self._lock:
+            rows = self._db.execute(sql, parameters).fetchall()
+        return [SearchHit(*row) for row in rows]
+
+    def export_markdown(self, session_id: int) -> str:
+        """Render a conversation as markdown"""
+        with self._lock:
+            session = self._db.execute(
+                "SELECT started_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        turns = self.turns(session_id)
+        models = ", ".join(
+            dict.fromkeys(turn["model"] for turn in turns if turn["model"])
+        )
+        started_at = session["started_at"].replace("T", " ") if session else ""
+        parts = [f"# Chat History - {started_at}\n\n", f"Model: {models}\n\n"]
+        for turn in turns:
+            parts.append(f"## User Input\n{turn['user']}\n\n")
+            parts.append("## Assistant Response\n")
+            if turn["thinking"] and turn["output"]:
+                parts.append(f"### Thinking Process\n{turn['thinking']}\n\n")
+                parts.append(f"### Output\n{turn['output']}\n\n")
+            else:
+                # If no sections found, write the raw content
+                parts.append(f"{turn['response']}\n\n")
+            parts.append("---\n\n")
+        return "".join(parts)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Autosaver:
+    """Save finished turns to a store from a worker thread.
+
+    Turns are collected until none arrived for `delay` seconds and then
+    written together, so the GUI thread never waits for the disk. A new
+    conversation gets its session when its first turn is written. With a
+    `journal`, the journal entry of a turn is finished once it's saved.
+    """
+
+    def __init__(self, store: ConversationStore, journal=None, delay=AUTOSAVE_DELAY):
+        self.store = store
+        self.journal = journal
+        self.delay = delay
+        # The session id of the current conversation, once it's known
+        self._session: list[Optional[int]] = [None]
+        self._pending: list[tuple] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def session_id(self) -> Optional[int]:
+        return self._session[0]
+
+    def open(self, session_id: Optional[int]):
+        """Save the next turns to another conversation, None for a new one"""
+        self.flush()
+        self._session = [session_id]
+
+    def save(self, user: str, response: str, model: str = "", journal_key=None):
+        """Save a turn of the current conversation soon"""
+        with self._lock:
+            self._pending.append((self._session, user, response, model, journal_key))
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> Future:
+        """Write the collected turns now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, []
+            return self._executor.submit(self._write, pending)
+
+    def export(self, path: Path) -> Future:
+        """Write the current conversation as markdown, once it's saved"""
+        self.flush()
+        session = self._session
+        return self._executor.submit(self._export, session, Path(path))
+
+    def recover(self, turns: list) -> Future:
+        """Save the cut off turns a journal returned, to their conversations"""
+        pending = [
+            (
+                [turn.meta.get("session_id")],
+                turn.meta.get("user", ""),
+                turn.text,
+                turn.meta.get("model", ""),
+                None,
+            )
+            for turn in turns
+        ]
+        return self._executor.submit(self._write, pending)
+
+    def _write(self, pending: list[tuple]):
+        for session, user, response, model, journal_key in pending:
+            if session[0] is None:
+                session[0] = self.store.new_session(user)
+            self.store.add_turn(session[0], user, response, model)
+            if self.journal is not None and journal_key is not None:
+                self.journal.finish(journal_key)
+
+    def _export(self, session: list, path: Path):
+        if session[0] is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.store.export_markdown(session[0]), encoding="utf-8")
+
+    def close(self):
+        """Write what's left and wait for it"""
+        self.flush()
+        self._executor.shutdown(wait=True)
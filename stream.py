@@ -0,0 +1,121 @@
+import json
+from typing import Iterator
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+from constants import STREAM_CHUNK_SIZE
+
+
+class StreamError(Exception):
+    """Ollama reported an error in the middle of a stream"""
+
+
+def loads(data):
+    """Decode one JSON document, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+class NDJSONDecoder:
+    """Incremental decoder for newline-delimited JSON.
+
+    Bytes are appended to one reusable buffer. Complete lines are decoded
+    from views into the buffer, and the consumed prefix is dropped once per
+    `feed`, so a chunk holding many small events is not copied per line.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[dict]:
+        """Add bytes and return the events of all lines they complete"""
+        buffer = self._buffer
+        start = len(buffer)
+        buffer += data
+        # Lines can only end in the new data
+        end = buffer.find(b"\n", start)
+        if end < 0:
+            return []
+
+        events = []
+        start = 0
+        try:
+            with memoryview(buffer) as view:
+                while end >= 0:
+                    # Lines are consumed before decoding, so a malformed one
+                    # is dropped rather than decoded again by the next feed
+                    line_start, start = start, end + 1
+                    # Drop the \r of \r\n line endings
+                    stop = (
+                        end - 1 if end > line_start and buffer[end - 1] == 13 else end
+                    )
+                    if stop > line_start:
+                        with view[line_start:stop] as line:
+                            events.append(loads(line))
+                    end = buffer.find(b"\n", start)
+        finally:
+            del buffer[:start]
+        return events
+
+    def flush(self) -> list[dict]:
+        """Decode a last line that wasn't terminated by a newline"""
+        data = bytes(self._buffer).strip()
+        self._buffer.clear()
+        return [loads(data)] if data else []
+
+
+class StreamText:
+    """Text built from streamed chunks, joined only when it is read"""
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._joined = ""
+        self._length = 0
+
+    def append(self, text: str):
+        if text:
+            self._chunks.append(text)
+            self._length += len(text)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        if self._chunks:
+            self._joined = "".join([self._joined, *self._chunks])
+            self._chunks.clear()
+        return self._joined
+
+
+def event_text(event: dict) -> tuple[str, str]:
+    """Return the (response, thinking) text of a generate or chat event"""
+    if "error" in event:
+        # Errors after the headers are sent come as an event of their own
+        raise StreamError(event["error"])
+    message = event.get("message")
+    if message is not None:
+        return message.get("content", ""), message.get("thinking", "")
+    return event.get("response", ""), event.get("thinking", "")
+
+
+def iter_event_batches(
+    response, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[list[dict]]:
+    """Yield the events decoded from each read of a streaming response.
+
+    Reads return as soon as data arrives on a chunked response, so a large
+    `chunk_size` only bounds how much is read at once. Every event that
+    arrived together is yielded in one batch.
+    """
+    decoder = NDJSONDecoder()
+    for data in response.iter_content(chunk_size=chunk_size):
+        events = decoder.feed(data)
+        if events:
+            yield events
+    events = decoder.flush()
+    if events:
+        yield events
@@ -68,6 +68,15 @@ class Styles:
         }}
     """
 
+    # Status bar
+    STATUS_BAR = f"""
+        QStatusBar {{
+            background-color: {BACKGROUND_SECONDARY};
+            border-top: 1px solid {BORDER_COLOR};
+            color: {TEXT_SECONDARY};
+        }}
+    """
+
     # Panels
     PANEL_HEADER = f"""
         QTextEdit {{
@@ -87,7 +96,7 @@ class Styles:
     """
 
     PANEL_CONTENT = f"""
-        QTextEdit {{
+        QTextEdit, QPlainTextEdit {{
             background-color: {BACKGROUND_TERTIARY};
             color: {TEXT_PRIMARY};
             border: 1px solid {BORDER_COLOR};
@@ -96,11 +105,35 @@ class Styles:
             padding: 8px;
             selection-background-color: {ACCENT_COLOR}40;
         }}
-        QTextEdit::viewport {{
+        QTextEdit::viewport, QPlainTextEdit::viewport {{
             border: none;
         }}
     """
 
+    # Lists and tables in panels, one row per item
+    PANEL_LIST = f"""
+        QListView, QTableView, QLineEdit {{
+            background-color: {BACKGROUND_TERTIARY};
+            color: {TEXT_PRIMARY};
+            border: 1px solid {BORDER_COLOR};
+            border-bottom-left-radius: 4px;
+            border-bottom-right-radius: 4px;
+            padding: 4px;
+            selection-background-color: {ACCENT_COLOR}40;
+            selection-color: {TEXT_PRIMARY};
+            outline: none;
+        }}
+        QListView::item {{
+            padding: 2px 4px;
+        }}
+        QHeaderView::section {{
+            background-color: {BACKGROUND_SECONDARY};
+            color: {TEXT_PRIMARY};
+            border: none;
+            padding: 4px;
+        }}
+    """
+
     # Input area
     MODEL_SELECTOR = f"""
         QComboBox {{
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from constants import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_FIRST_TOKEN_TIMEOUT,
+    SUMMARY_MODEL,
+    SUMMARY_TOKENS,
+)
+from context import strip_thinking
+
+SUMMARY_INSTRUCTIONS = """
+Condense the conversation below into a summary of at most {words} words for
+an assistant that continues it. Keep facts, decisions, names, code
+identifiers and open questions; drop greetings and repetition. Reply with
+the summary only.
+"""
+
+
+class Summarizer:
+    """Condense turns that dropped out of the context into a running summary.
+
+    Summaries are made by a small model on a worker thread of their own, so
+    they never hold up a response. Each summary is cached under a digest of
+    the turns it covers; the next one starts from the longest cached summary
+    and only reads the turns added since.
+    """
+
+    # Summaries kept, for the current conversation and a few earlier ones
+    CACHE_SIZE = 64
+
+    def __init__(self, client, model: str = SUMMARY_MODEL, max_tokens=SUMMARY_TOKENS):
+        # The host and connections of the client the summaries are made for
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.last_error: Optional[str] = None
+        self._cache: OrderedDict[str, tuple[int, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future: Optional[Future] = None
+
+    @staticmethod
+    def digests(turns: list) -> list[str]:
+        """Digest of the first n turns, for each n from 0 to len(turns)"""
+        digest = hashlib.sha1()
+        digests = [digest.hexdigest()]
+        for turn in turns:
+            digest.update(json.dumps(turn).encode())
+            digests.append(digest.hexdigest())
+        return digests
+
+    def summary(self, turns: list, count: int) -> tuple[int, str]:
+        """Return (turns covered, summary) of the best summary of turns[:count]"""
+        digests = self.digests(turns[:count])
+        with self._lock:
+            for covered in range(count, 0, -1):
+                if digests[covered] in self._cache:
+                    self._cache.move_to_end(digests[covered])
+                    return self._cache[digests[covered]]
+        return 0, ""
+
+    def request(self, turns: list, count: int) -> Optional[Future]:
+        """Summarize turns[:count] in the background, unless it's known or busy"""
+        if self.summary(turns, count)[0] == count:
+            return None
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return None
+            self._future = self._executor.submit(self._summarize, turns[:count])
+            return self._future
+
+    def _summarize(self, turns: list):
+        covered, summary = self.summary(turns, len(turns))
+        transcript = "\n\n".join(
+            f"{message['role']}: {message['content']}"
+            for turn in turns[covered:]
+            for message in turn
+        )
+        if summary:
+            transcript = f"Summary so far:\n{summary}\n\nLater turns:\n{transcript}"
+        try:
+            summary = self._complete(transcript)
+        except Exception as e:
+            self.last_error = str(e)
+            return
+        self.last_error = None
+        with self._lock:
+            self._cache[self.digests(turns)[-1]] = (len(turns), summary)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _complete(self, transcript: str) -> str:
+        """Ask the summary model for one whole reply"""
+        url = f"{self.client.host}/api/chat"
+        # Thinking models spend tokens before the summary, so the length is
+        # asked for instead of cutting the reply off with num_predict
+        instructions = SUMMARY_INSTRUCTIONS.format(words=self.max_tokens * 3 // 4)
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": transcript},
+            ],
+            "stream": False,
+        }
+        response = self.client.sessions.session(url).post(
+            url, json=payload, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_FIRST_TOKEN_TIMEOUT)
+        )
+        response.raise_for_status()
+        return strip_thinking(response.json()["message"]["content"])
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -25,10 +25,15 @@ class HTMLStyle:
 
 
 class HTMLTemplates:
-    BASE = """
-    <html>
+    # Separates top-level blocks in formatted output, so the output page
+    # can replace only the blocks that changed
+    BLOCK_SEPARATOR = "<!-- block -->"
+
+    # Shown in place of a mermaid diagram that is still streaming in
+    MERMAID_PENDING = '<div class="mermaid-pending">Drawing diagram...</div>'
+
+    HEAD = """
     <head>
-        <script src="https://cdn.jsdelivr.net/npm/mermaid/dist/mermaid.min.js"></script>
         <style>
             body {{
                 background-color: {bg_tertiary};
@@ -61,12 +66,16 @@ class HTMLTemplates:
             th {{
                 background-color: {bg_secondary};
             }}
-            .mermaid {{
+            .mermaid, .mermaid-pending {{
                 background-color: {bg_secondary};
                 padding: 8px;
                 border-radius: 4px;
                 margin: 8px 0;
             }}
+            .mermaid-pending {{
+                font-style: italic;
+                opacity: 0.6;
+            }}
             h3 {{
                 margin-top: 16px;
                 margin-bottom: 8px;
@@ -94,9 +103,9 @@ class HTMLTemplates:
             }}
         </style>
     </head>
-    <body>
-        {content}
-        <script>
+    """
+
+    MERMAID_INIT = """
             mermaid.initialize({{
                 startOnLoad: true,
                 theme: 'dark',
@@ -112,14 +121,108 @@ class HTMLTemplates:
                 securityLevel: 'loose',
                 fontFamily: 'Consolas, Menlo, Monaco, monospace'
             }});
-            // Force mermaid to render after a short delay
-            setTimeout(function() {{
-                mermaid.init(undefined, document.querySelectorAll('.mermaid'));
-            }}, 500);
+    """
+
+    # Output page that is loaded once and then patched block by block. It is
+    # loaded with the assets directory as base URL, so mermaid works offline.
+    PAGE = (
+        """
+    <html>
+    """
+        + HEAD
+        + """
+    <body>
+        <div id="content"></div>
+        <script>
+            // Promises of rendered diagrams (or null for diagrams that don't
+            // parse), keyed by a hash of their source. Renders still in flight
+            // are shared, so re-patched blocks don't render a diagram twice.
+            var svgCache = new Map();
+            var svgCacheSize = 200;
+            var diagramCount = 0;
+
+            function hashSource(source) {{
+                var hash = 0x811c9dc5;
+                for (var i = 0; i < source.length; i++) {{
+                    hash ^= source.charCodeAt(i);
+                    hash = Math.imul(hash, 0x01000193);
+                }}
+                return (hash >>> 0).toString(16) + ':' + source.length;
+            }}
+
+            function renderSvg(source) {{
+                var key = hashSource(source);
+                if (svgCache.has(key)) {{
+                    return svgCache.get(key);
+                }}
+                var id = 'diagram-' + diagramCount++;
+                var svg = mermaid.render(id, source).then(function(result) {{
+                    return result.svg;
+                }}).catch(function() {{
+                    var leftover = document.getElementById('d' + id);
+                    if (leftover) {{
+                        leftover.remove();
+                    }}
+                    return null;
+                }});
+                svgCache.set(key, svg);
+                if (svgCache.size > svgCacheSize) {{
+                    svgCache.delete(svgCache.keys().next().value);
+                }}
+                return svg;
+            }}
+
+            function renderDiagrams(nodes) {{
+                if (typeof mermaid === 'undefined') {{
+                    return;
+                }}
+                nodes.forEach(function(node) {{
+                    node.setAttribute('data-processed', 'true');
+                    renderSvg(node.textContent).then(function(svg) {{
+                        // Keep showing the source of diagrams that don't parse
+                        if (svg !== null) {{
+                            node.innerHTML = svg;
+                        }}
+                    }});
+                }});
+            }}
+
+            // Replace all blocks from index `start` on with new blocks
+            function patchBlocks(start, blocks) {{
+                var content = document.getElementById('content');
+                var scroller = document.scrollingElement;
+                var atBottom = scroller.scrollTop + window.innerHeight
+                    >= scroller.scrollHeight - 4;
+
+                while (content.children.length > start) {{
+                    content.removeChild(content.lastChild);
+                }}
+                var diagrams = [];
+                blocks.forEach(function(html) {{
+                    var block = document.createElement('div');
+                    block.className = 'block';
+                    block.innerHTML = html;
+                    content.appendChild(block);
+                    diagrams.push.apply(diagrams, block.querySelectorAll('.mermaid'));
+                }});
+                renderDiagrams(diagrams);
+                if (atBottom) {{
+                    scroller.scrollTop = scroller.scrollHeight;
+                }}
+            }}
+        </script>
+        <script src="mermaid.min.js"></script>
+        <script>
+            if (typeof mermaid !== 'undefined') {{
+    """
+        + MERMAID_INIT
+        + """
+            }}
         </script>
     </body>
     </html>
     """
+    )
 
     ERROR = """
     <h3 style="color: {error_color};">Error Occurred</h3>
@@ -133,8 +236,8 @@ class HTMLTemplates:
     """
 
     @staticmethod
-    def apply_style(content: str, style: HTMLStyle = None) -> str:
-        """Apply HTML styling to content"""
+    def page(style: HTMLStyle = None) -> str:
+        """Return the output page shell that blocks are patched into"""
         if style is None:
             style = HTMLStyle.default()
-        return HTMLTemplates.BASE.format(content=content, **style.__dict__)
+        return HTMLTemplates.PAGE.format(**style.__dict__)
@@ -0,0 +1,28 @@
+"""Helpers the tests share"""
+
+import json
+import time
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+class FakeResponse:
+    """A streamed response that reads as the given chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    @classmethod
+    def from_events(cls, events, chunk_size=7):
+        """The NDJSON lines of `events`, split into chunks across lines"""
+        data = b"".join(json.dumps(event).encode() + b"\n" for event in events)
+        return cls([data[i : i + chunk_size] for i in range(0, len(data), chunk_size)])
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from async_engine import AsyncEngine
+from benchmarks.fake_ollama import FakeOllama
+from llm import LLMHandler
+
+RESPONSE = ["<think>", "Hmm", "</think>", "<output>", "# Done", "</output>"]
+
+
+class TestAsyncEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = AsyncEngine(max_connections=2)
+        self.addCleanup(self.engine.close)
+
+    async def collect(self, url):
+        events = []
+        async for batch in self.engine.stream_events(f"{url}/api/generate", {}):
+            events.extend(batch)
+        return "".join(event["response"] for event in events)
+
+    def test_concurrent_streams_share_connections(self):
+        """Test many streams run at once over at most max_connections"""
+
+        async def run_all(url):
+            return await asyncio.gather(*(self.collect(url) for _ in range(6)))
+
+        with FakeOllama(RESPONSE, token_delay=0.01) as fake:
+            results = self.engine.submit(run_all(fake.url)).result(timeout=10)
+
+        self.assertEqual(results, ["".join(RESPONSE)] * 6)
+        self.assertEqual(self.engine.requests, 6)
+        self.assertLessEqual(self.engine.connections, 2)
+
+    def test_cancelling_stops_the_stream(self):
+        """Test cancelling the future of a generation cancels its coroutine"""
+
+        async def other_tasks():
+            await asyncio.sleep(0.05)
+            return len(asyncio.all_tasks()) - 1
+
+        with FakeOllama(RESPONSE * 100, token_delay=0.01) as fake:
+            future = self.engine.submit(self.collect(fake.url))
+            time.sleep(0.1)
+            self.assertTrue(future.cancel())
+            self.assertEqual(self.engine.submit(other_tasks()).result(timeout=5), 0)
+
+
+class TestAsyncHandler(unittest.TestCase):
+    def test_response_is_posted(self):
+        """Test the async engine posts the same updates as the thread engine"""
+        handler = LLMHandler(max_fps=0, engine="async")
+        self.addCleanup(handler.async_engine.close)
+        posts = []
+        handler.scheduler.post = lambda name, value, *args, **kwargs: posts.append(
+            (name, value)
+        )
+
+        with FakeOllama(RESPONSE) as fake:
+            handler.client.host = fake.url
+            handler.get_response("Hi", "fake", [{"role": "user", "content": "Hi"}])
+            handler._generation.future.result(timeout=10)
+
+        names = [name for name, _ in posts]
+        self.assertEqual(names[-1], "llm_history_update")
+        self.assertEqual(posts[-1][1], "".join(RESPONSE))
+        self.assertIn(("thinking_update", "Hmm"), posts)
+        output = [value for name, value in posts if name == "output_update"]
+        self.assertIn("<h1>Done</h1>", output[-1])
+
+    def test_formatting_runs_off_the_loop(self):
+        """Test the event loop only reads, the worker thread formats"""
+        handler = LLMHandler(max_fps=0, engine="async")
+        self.addCleanup(handler.async_engine.close)
+        handler.scheduler.post = lambda *args, **kwargs: None
+        threads = set()
+        format_output = handler.formatter.format_output
+
+        def recorded(*args, **kwargs):
+            threads.add(threading.current_thread().name)
+            return format_output(*args, **kwargs)
+
+        handler.formatter.format_output = recorded
+        with FakeOllama(RESPONSE) as fake:
+            handler.client.host = fake.url
+            handler.get_response("Hi", "fake", [{"role": "user", "content": "Hi"}])
+            handler._generation.future.result(timeout=10)
+
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith("llm-cpu") for name in threads))
+
+    def test_unknown_engine(self):
+        """Test a misspelled engine is reported"""
+        with self.assertRaises(ValueError):
+            LLMHandler(engine="threads")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from batch import (
+    BatchJob,
+    BatchRunner,
+    finished_results,
+    history_entries,
+    main,
+    read_jobs,
+)
+from benchmarks.fake_ollama import FakeOllama
+from llm import LLMClient
+
+RESPONSE = ["<think>", "Hmm", "</think>", "<output>", "**Hello**", "</output>"]
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.prompts = self.directory / "prompts.jsonl"
+        self.output = self.directory / "results.jsonl"
+
+    def write_prompts(self, *records):
+        self.prompts.write_text("".join(json.dumps(r) + "\n" for r in records))
+
+    def results(self) -> list[dict]:
+        return [json.loads(line) for line in self.output.read_text().splitlines()]
+
+    def runner(self, url: str, parallel=2) -> BatchRunner:
+        client = LLMClient(host=url)
+        client.context = None  # Prompts bring a context of their own
+        return BatchRunner(client, parallel)
+
+    def test_read_jobs(self):
+        """Test prompts without a model run on each given model"""
+        self.write_prompts(
+            "Hi",
+            {"id": "q", "prompt": "Ho", "model": "m", "seed": 3},
+        )
+        jobs = read_jobs(self.prompts, ["a", "b"])
+        self.assertEqual(
+            jobs,
+            [
+                BatchJob(1, "a", "Hi"),
+                BatchJob(1, "b", "Hi"),
+                BatchJob("q", "m", "Ho", seed=3),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            read_jobs(self.prompts, [])
+
+    def test_history_entries(self):
+        entries = history_entries(
+            [
+                {"role": "user", "content": "Q"},
+                {"role": "assistant", "content": "A"},
+                {"role": "user", "content": "Next"},
+            ]
+        )
+        self.assertEqual(
+            entries,
+            [
+                {"role": "user", "content": "Q", "llm_history": "A"},
+                {"role": "user", "content": "Next"},
+            ],
+        )
+
+    def test_results(self):
+        """Test every prompt and model gets its sections, HTML and timing"""
+        self.write_prompts(
+            {"id": 1, "prompt": "One"},
+            {"id": 2, "prompt": "Two", "history": [{"role": "user", "content": "Q"}]},
+        )
+        with FakeOllama(RESPONSE) as fake:
+            failures = self.runner(fake.url).run(
+                read_jobs(self.prompts, ["a", "b"]), self.output
+            )
+
+        self.assertEqual(failures, 0)
+        results = self.results()
+        self.assertEqual(
+            sorted((r["id"], r["model"]) for r in results),
+            [(1, "a"), (1, "b"), (2, "a"), (2, "b")],
+        )
+        result = results[0]
+        self.assertEqual(result["text"], "".join(RESPONSE))
+        self.assertEqual(result["thinking"], "Hmm")
+        self.assertEqual(result["output"], "**Hello**")
+        self.assertIn("<strong>Hello</strong>", result["html"])
+        self.assertGreater(result["timing"]["tokens"], 0)
+        # Prompts don't share their history
+        contents = [
+            [m["content"] for m in request["messages"][1:]] for request in fake.requests
+        ]
+        self.assertEqual(
+            sorted(contents), [["One"], ["One"], ["Q", "Two"], ["Q", "Two"]]
+        )
+
+    def test_resume(self):
+        """Test only prompts without a finished result run again"""
+        self.write_prompts(*({"id": i, "prompt": f"P{i}"} for i in range(4)))
+        self.output.write_text(
+            json.dumps({"id": 0, "model": "a", "text": "done"})
+            + "\n"
+            + json.dumps({"id": 1, "model": "a", "error": "refused"})
+            + "\n"
+            + '{"id": 2, "mod'
+        )
+        with FakeOllama(RESPONSE) as fake:
+            self.runner(fake.url).run(read_jobs(self.prompts, ["a"]), self.output)
+
+        self.assertEqual(len(fake.requests), 3)
+        results = self.results()
+        self.assertEqual(results[0]["text"], "done")
+        self.assertEqual(sorted(r["id"] for r in results), [0, 1, 2, 3])
+        self.assertFalse(any("error" in r for r in results))
+
+    def test_parallel_streams_per_model(self):
+        """Test each model streams `parallel` prompts at once"""
+        self.write_prompts(*({"prompt": f"P{i}"} for i in range(6)))
+        with FakeOllama(RESPONSE, token_delay=0.02) as fake:
+            runner = self.runner(fake.url, parallel=3)
+            active, peak, lock = [0], [0], threading.Lock()
+            generate = runner.generate
+
+            def counted(job):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                try:
+                    return generate(job)
+                finally:
+                    with lock:
+                        active[0] -= 1
+
+            runner.generate = counted
+            runner.run(read_jobs(self.prompts, ["a", "b"]), self.output)
+
+        self.assertEqual(peak[0], 6)
+        self.assertEqual(len(self.results()), 12)
+
+    def test_stop(self):
+        """Test stopping drops the running streams without a result"""
+        self.write_prompts({"prompt": "Hi"})
+        with FakeOllama(RESPONSE * 100, token_delay=0.01) as fake:
+            runner = self.runner(fake.url)
+            timer = threading.Timer(0.2, runner.stop)
+            timer.start()
+            failures = runner.run(read_jobs(self.prompts, ["a"]), self.output)
+            timer.join()
+
+        self.assertEqual(failures, 0)
+        self.assertEqual(self.results(), [])
+        self.assertEqual(fake.disconnects, 1)
+
+    def test_stop_while_the_model_loads(self):
+        """Test stopping doesn't wait for the headers of the running streams"""
+        self.write_prompts({"prompt": "Hi"})
+        with FakeOllama(RESPONSE, load_delay=2) as fake:
+            runner = self.runner(fake.url)
+            timer = threading.Timer(0.2, runner.stop)
+            timer.start()
+            start = time.perf_counter()
+            failures = runner.run(read_jobs(self.prompts, ["a"]), self.output)
+            elapsed = time.perf_counter() - start
+            timer.join()
+
+        self.assertEqual(failures, 0)
+        self.assertEqual(self.results(), [])
+        self.assertLess(elapsed, 1)
+
+    def test_error_events_fail_the_job(self):
+        """Test a stream cut off by an error event runs again on resume"""
+        self.write_prompts({"prompt": "Hi"})
+        with FakeOllama(RESPONSE, error_after=2) as fake:
+            failures = self.runner(fake.url).run(
+                read_jobs(self.prompts, ["a"]), self.output
+            )
+        self.assertEqual(failures, 1)
+        (result,) = self.results()
+        self.assertIn("error after 2 tokens", result["error"])
+        self.assertEqual(finished_results(self.output), [])
+
+    def test_failures_are_recorded(self):
+        self.write_prompts({"prompt": "Hi"})
+        with FakeOllama(RESPONSE) as fake:
+            url = fake.url
+        exit_code = main(
+            [str(self.prompts), str(self.output), "--model", "a", "--host", url]
+        )
+        self.assertEqual(exit_code, 1)
+        (result,) = self.results()
+        self.assertIn("error", result)
+
+    def test_main(self):
+        self.write_prompts({"prompt": "Hi"})
+        with FakeOllama(RESPONSE) as fake:
+            exit_code = main(
+                [
+                    str(self.prompts),
+                    str(self.output),
+                    "--model",
+                    "a",
+                    "--host",
+                    fake.url,
+                ]
+            )
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(self.results()[0]["output"], "**Hello**")
+
+
+if __name__ == "__main__":
+    unittest.main()
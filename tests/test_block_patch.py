@@ -0,0 +1,70 @@
+import unittest
+
+from block_patch import BlockPatcher, first_changed_block, split_blocks
+from templates import HTMLTemplates
+
+
+def join(*blocks):
+    return HTMLTemplates.BLOCK_SEPARATOR.join(blocks)
+
+
+class TestFirstChangedBlock(unittest.TestCase):
+    def test_common_prefix_is_skipped(self):
+        """Test only blocks after the common prefix are replaced"""
+        self.assertEqual(first_changed_block(["a", "b", "c"], ["a", "b", "x"]), 2)
+        self.assertEqual(first_changed_block(["a", "b"], ["a", "b", "c"]), 2)
+        self.assertEqual(first_changed_block(["a"], ["x", "b"]), 0)
+
+    def test_shrinking_content(self):
+        """Test removed trailing blocks are patched from where they start"""
+        self.assertEqual(first_changed_block(["a", "b", "c"], ["a"]), 1)
+        self.assertEqual(first_changed_block(["a", "b"], []), 0)
+
+    def test_unchanged_content(self):
+        """Test identical blocks need no patch"""
+        self.assertIsNone(first_changed_block(["a", "b"], ["a", "b"]))
+        self.assertIsNone(first_changed_block([], []))
+
+
+class TestBlockPatcher(unittest.TestCase):
+    def test_split_blocks(self):
+        """Test content is split on the block separator"""
+        self.assertEqual(split_blocks(""), [])
+        self.assertEqual(
+            split_blocks(join("<p>a</p>", "<p>b</p>")), ["<p>a</p>", "<p>b</p>"]
+        )
+
+    def test_content_before_load_is_sent_on_load(self):
+        """Test content set before the page loaded is sent once it has"""
+        patcher = BlockPatcher("<p>a</p>")
+        self.assertIsNone(patcher.set_content(join("<p>a</p>", "<p>b</p>")))
+        self.assertEqual(patcher.load_finished(True), (0, ["<p>a</p>", "<p>b</p>"]))
+
+    def test_failed_load_sends_nothing(self):
+        """Test nothing is sent to a page that didn't load"""
+        patcher = BlockPatcher("<p>a</p>")
+        self.assertIsNone(patcher.load_finished(False))
+        self.assertIsNone(patcher.set_content("<p>b</p>"))
+
+    def test_only_changed_blocks_are_sent(self):
+        """Test streamed updates only send the trailing changed blocks"""
+        patcher = BlockPatcher()
+        self.assertIsNone(patcher.load_finished(True))
+        self.assertEqual(patcher.set_content("<p>a</p>"), (0, ["<p>a</p>"]))
+        self.assertEqual(patcher.set_content(join("<p>a</p>", "<p>b")), (1, ["<p>b"]))
+        self.assertEqual(
+            patcher.set_content(join("<p>a</p>", "<p>b</p>")), (1, ["<p>b</p>"])
+        )
+        self.assertIsNone(patcher.set_content(join("<p>a</p>", "<p>b</p>")))
+        self.assertEqual(patcher.set_content(""), (0, []))
+
+    def test_reload_sends_everything(self):
+        """Test a reloaded (empty) page gets all blocks again"""
+        patcher = BlockPatcher()
+        patcher.load_finished(True)
+        patcher.set_content(join("<p>a</p>", "<p>b</p>"))
+        self.assertEqual(patcher.load_finished(True), (0, ["<p>a</p>", "<p>b</p>"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import time
+import unittest
+from unittest import mock
+
+from helpers import wait_for
+from PySide6.QtCore import QCoreApplication, Qt
+
+from benchmarks.fake_ollama import FakeOllama
+from llm import LLMHandler, LLMSignals
+from scheduler import UpdateScheduler
+
+SLOW_RESPONSE = ["<output>"] + ["word "] * 200 + ["</output>"]
+
+
+class TestRequestIds(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.signals = LLMSignals()
+        self.received = []
+        self.signals.output_update.connect(self.received.append)
+
+    def test_updates_of_old_requests_are_dropped(self):
+        """Test only the current request and untagged updates are emitted"""
+        scheduler = UpdateScheduler(self.signals, max_fps=0)
+        scheduler.set_request_id(2)
+        scheduler.post("output_update", "old", request_id=1)
+        scheduler.post("output_update", "new", request_id=2)
+        scheduler.post("output_update", "untagged")
+        self.assertEqual(self.received, ["new", "untagged"])
+
+    def test_pending_updates_are_dropped(self):
+        """Test starting a request drops what the old one left undelivered"""
+        scheduler = UpdateScheduler(self.signals, max_fps=30)
+        scheduler.set_request_id(1)
+        scheduler.post("output_update", "old", request_id=1)
+        scheduler.post("llm_history_update", "old", coalesce=False, request_id=1)
+        scheduler.set_request_id(2)
+        scheduler.post("output_update", "new", request_id=2)
+        scheduler._deliver_frame()
+        self.assertEqual(self.received, ["new"])
+        self.assertEqual(scheduler.dropped, 2)
+
+
+class TestStop(unittest.TestCase):
+    def setUp(self):
+        self.handler = LLMHandler(max_fps=0)
+        self.stopped = []
+        self.outputs = []
+        # The worker thread emits directly, there is no event loop to queue to
+        signals = self.handler.signals
+        signals.generation_stopped.connect(self.stopped.append, Qt.DirectConnection)
+        signals.output_update.connect(self.outputs.append, Qt.DirectConnection)
+
+    def test_stop_aborts_the_generation(self):
+        """Test stopping closes the connection so the server stops sending"""
+        with FakeOllama(SLOW_RESPONSE, token_delay=0.01) as fake:
+            self.handler.client.host = fake.url
+            self.handler.get_response("Hi", "fake", [])
+            wait_for(lambda: self.outputs)
+            future = self.handler._generation.future
+
+            self.assertTrue(self.handler.stop())
+            future.result(timeout=2)
+            wait_for(lambda: fake.disconnects == 1)
+
+        self.assertEqual(len(self.stopped), 1)
+        self.assertLess(self.handler.stop_time, 1)
+        self.assertIn("request 1 stopped after", self.stopped[0])
+        outputs = len(self.outputs)
+        time.sleep(0.05)
+        self.assertEqual(len(self.outputs), outputs)
+
+    def test_new_turn_stops_the_old_one(self):
+        """Test a new turn gets no updates from the turn it replaced"""
+        history = []
+        self.handler.signals.llm_history_update.connect(
+            history.append, Qt.DirectConnection
+        )
+        with FakeOllama(SLOW_RESPONSE, token_delay=0.01) as fake:
+            self.handler.client.host = fake.url
+            self.handler.get_response("First", "fake", [])
+            wait_for(lambda: self.outputs)
+            self.handler.get_response("Second", "fake", [])
+            self.handler._generation.future.result(timeout=10)
+
+        self.assertEqual(history, ["".join(SLOW_RESPONSE)])
+        self.assertEqual(len(self.stopped), 1)
+
+    def test_async_stop_aborts_the_generation(self):
+        """Test stopping on the async engine closes the connection too"""
+        handler = LLMHandler(max_fps=0, engine="async")
+        self.addCleanup(handler.async_engine.close)
+        stopped = []
+        handler.signals.generation_stopped.connect(stopped.append, Qt.DirectConnection)
+        with FakeOllama(SLOW_RESPONSE, token_delay=0.01) as fake:
+            handler.client.host = fake.url
+            handler.get_response("Hi", "fake", [])
+            wait_for(lambda: handler.async_engine.requests)
+            time.sleep(0.05)
+
+            self.assertTrue(handler.stop())
+            wait_for(lambda: fake.disconnects == 1)
+
+        wait_for(lambda: stopped)
+        self.assertLess(handler.stop_time, 1)
+
+    def test_stop_while_the_model_loads(self):
+        """Test stopping before the headers arrived doesn't wait for them"""
+        with FakeOllama(SLOW_RESPONSE, load_delay=2) as fake:
+            self.handler.client.host = fake.url
+            self.handler.get_response("Hi", "fake", [])
+            wait_for(lambda: fake.requests)
+            future = self.handler._generation.future
+
+            self.assertTrue(self.handler.stop())
+            future.result(timeout=1)
+
+        self.assertEqual(len(self.stopped), 1)
+        self.assertLess(self.handler.stop_time, 1)
+        self.assertEqual(self.outputs, [])
+
+    def test_stop_before_the_generation_starts(self):
+        """Test a generation stopped before its worker took it up is reported"""
+        journal = mock.Mock()
+        self.handler.journal = journal
+        # Keep the worker busy so the generation waits its turn
+        self.handler.executor.submit(time.sleep, 0.2)
+        request_id = self.handler.get_response("Hi", "fake", [])
+
+        self.assertTrue(self.handler.stop())
+        self.assertEqual(len(self.stopped), 1)
+        journal.finish.assert_called_once_with(request_id)
+        time.sleep(0.3)
+        self.assertEqual(len(self.stopped), 1)
+
+    def test_async_stop_before_the_generation_starts(self):
+        """Test the same on the async engine, whose task never runs then"""
+        journal = mock.Mock()
+        handler = LLMHandler(max_fps=0, engine="async", journal=journal)
+        self.addCleanup(handler.async_engine.close)
+        stopped = []
+        handler.signals.generation_stopped.connect(stopped.append, Qt.DirectConnection)
+        # Keep the event loop busy so the task can't start yet
+        handler.async_engine._loop.call_soon_threadsafe(time.sleep, 0.2)
+        request_id = handler.get_response("Hi", "fake", [])
+
+        self.assertTrue(handler.stop())
+        self.assertEqual(len(stopped), 1)
+        journal.finish.assert_called_once_with(request_id)
+        time.sleep(0.3)
+        self.assertEqual(len(stopped), 1)
+
+    def test_stop_when_idle(self):
+        """Test stopping without a running generation does nothing"""
+        self.assertFalse(self.handler.stop())
+        self.assertEqual(self.stopped, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
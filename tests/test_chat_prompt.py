@@ -0,0 +1,119 @@
+import unittest
+
+from benchmarks.fake_ollama import FakeOllama
+from constants import CONTEXT_WINDOW, FORMATTING_INSTRUCTIONS
+from llm import LLMClient, MarkdownResponseFormatter, ResponseStream
+from stream import iter_event_batches
+
+RESPONSE = ["<output>", "Sure", "</output>"]
+
+
+def converse(client: LLMClient, questions: list[str]) -> list[int]:
+    """Run a conversation and return the prompt tokens evaluated per turn"""
+    history, counts = [], []
+    for question in questions:
+        history.append({"role": "user", "content": question})
+        stream = ResponseStream(
+            MarkdownResponseFormatter(), lambda *args, **kwargs: None
+        )
+        prompt = client._format_prompt(question, history)
+        with client.stream_response("fake", prompt) as response:
+            for events in iter_event_batches(response):
+                stream.feed(events)
+        history[-1]["llm_history"] = stream.finish()
+        counts.append(stream.done_event["prompt_eval_count"])
+    return counts
+
+
+class TestChatMessages(unittest.TestCase):
+    def setUp(self):
+        self.client = LLMClient(api="chat")
+        self.history = [
+            {"role": "user", "content": "Hi", "llm_history": "Hello"},
+            {"role": "user", "content": "How are you?"},
+        ]
+
+    def test_layout(self):
+        """Test instructions come first and earlier turns keep their responses"""
+        messages = self.client._format_prompt("How are you?", self.history)
+        self.assertEqual(
+            messages,
+            [
+                {"role": "system", "content": FORMATTING_INSTRUCTIONS},
+                {"role": "user", "content": "Hi"},
+                {"role": "assistant", "content": "Hello"},
+                {"role": "user", "content": "How are you?"},
+            ],
+        )
+
+    def test_input_outside_history(self):
+        """Test the input is added when the history doesn't hold it yet"""
+        messages = self.client._format_prompt("Bye", self.history[:1])
+        self.assertEqual(messages[-1], {"role": "user", "content": "Bye"})
+        self.assertEqual(len(messages), 4)
+
+    def test_prefix_is_stable(self):
+        """Test each turn's messages start with all of the previous turn's"""
+        previous = self.client._format_prompt("Hi", self.history[:1])[:-1]
+        current = self.client._format_prompt("How are you?", self.history)
+        self.assertEqual(current[: len(previous)], previous)
+
+    def test_payload(self):
+        """Test chat requests send messages and generate requests a prompt"""
+        payload = self.client.build_payload("m", [{"role": "user"}], seed=3)
+        self.assertEqual(payload["messages"], [{"role": "user"}])
+        self.assertEqual(payload["options"], {"num_ctx": CONTEXT_WINDOW, "seed": 3})
+        payload = LLMClient(api="generate").build_payload("llama2", "p")
+        self.assertEqual(payload["prompt"], "p")
+        self.assertEqual(payload["options"], {"num_ctx": 4096})
+        self.assertEqual(payload["keep_alive"], "30m")
+        self.assertTrue(self.client.api_url.endswith("/api/chat"))
+
+
+class TestPrefill(unittest.TestCase):
+    def test_chat_reuses_the_cached_prefix(self):
+        """Test later chat turns only prefill what was added since"""
+        questions = ["What is a monad?", "Show an example", "In Python please"]
+        with FakeOllama(RESPONSE) as fake:
+            chat = LLMClient(host=fake.url, api="chat")
+            generate = LLMClient(host=fake.url, api="generate")
+            chat_counts = converse(chat, questions)
+            generate_counts = converse(generate, questions)
+
+        # The system message is only evaluated once
+        self.assertLess(max(chat_counts[1:]), chat_counts[0] // 10)
+        # The flat prompt puts the instructions after the history
+        self.assertGreater(min(generate_counts[1:]), generate_counts[0] // 2)
+
+    def test_prefill_stats(self):
+        """Test the prompt evaluation is reported from the last event"""
+        stream = ResponseStream(
+            MarkdownResponseFormatter(), lambda *args, **kwargs: None
+        )
+        stream.feed(
+            [{"done": True, "prompt_eval_count": 12, "prompt_eval_duration": 5e7}]
+        )
+        self.assertEqual(
+            stream.prefill_stats(), "[prefill] 12 prompt tokens evaluated in 0.05 s"
+        )
+
+
+class TestResponseStream(unittest.TestCase):
+    def test_console_gets_deltas(self):
+        """Test each batch posts only its new text, to be appended"""
+        posts = []
+        stream = ResponseStream(
+            MarkdownResponseFormatter(),
+            lambda name, value, **kwargs: posts.append((name, value, kwargs)),
+        )
+        stream.feed([{"response": "Hel"}, {"response": "lo"}])
+        stream.feed([{"response": " there"}])
+        stream.feed([{"response": "", "done": True}])
+        console = [post[1:] for post in posts if post[0] == "console_update"]
+        self.assertEqual(
+            console, [("Hello", {"join": True}), (" there", {"join": True})]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+from context import (
+    ContextBuilder,
+    context_window,
+    estimate_tokens,
+    message_tokens,
+    strip_thinking,
+)
+
+
+def conversation(turns: int, words: int = 50) -> list[dict]:
+    """A finished conversation with responses of `words` words"""
+    return [
+        {
+            "role": "user",
+            "content": f"Question {i}",
+            "llm_history": f"<think>Hmm</think><output>{'word ' * words}</output>",
+        }
+        for i in range(turns)
+    ]
+
+
+class TestEstimates(unittest.TestCase):
+    def test_estimate_tokens(self):
+        """Test estimates count words, long words and punctuation"""
+        self.assertEqual(estimate_tokens("Hello, world!"), 4)
+        self.assertEqual(estimate_tokens("internationalization"), 4)
+        self.assertEqual(estimate_tokens("def f(x): return x * 2"), 10)
+
+    def test_estimates_are_cached(self):
+        """Test estimating the same text again is a cache hit"""
+        text = "cached " * 100
+        estimate_tokens(text)
+        hits = estimate_tokens.cache_info().hits
+        estimate_tokens(text)
+        self.assertEqual(estimate_tokens.cache_info().hits, hits + 1)
+
+    def test_strip_thinking(self):
+        """Test closed and unclosed thinking sections are removed"""
+        self.assertEqual(
+            strip_thinking("<think>a</think>\n<output>b</output>"), "<output>b</output>"
+        )
+        self.assertEqual(
+            strip_thinking("<output>b</output><think>cut off"), "<output>b</output>"
+        )
+
+    def test_context_window(self):
+        """Test windows are looked up by model, then by name without the tag"""
+        self.assertEqual(context_window("llama2"), 4096)
+        self.assertEqual(context_window("llama2:13b"), 4096)
+        self.assertEqual(context_window("mistral"), 8192)
+        self.assertEqual(context_window(None), 8192)
+
+
+class TestContextBuilder(unittest.TestCase):
+    def setUp(self):
+        self.builder = ContextBuilder(reserve=0)
+
+    def test_responses_without_thinking(self):
+        """Test earlier responses are sent without their thinking"""
+        messages = self.builder.build("sys", conversation(1, words=2), "Next")
+        self.assertEqual(
+            messages,
+            [
+                {"role": "system", "content": "sys"},
+                {"role": "user", "content": "Question 0"},
+                {"role": "assistant", "content": "<output>word word </output>"},
+                {"role": "user", "content": "Next"},
+            ],
+        )
+
+    def test_everything_fits(self):
+        """Test a short conversation is sent whole"""
+        messages = self.builder.build("sys", conversation(10), "Next")
+        self.assertEqual(len(messages), 22)
+
+    def test_old_turns_are_dropped(self):
+        """Test the oldest turns are left out once the window is full"""
+        history = conversation(200)
+        messages = self.builder.build("sys", history, "Next", "llama2")
+        self.assertLessEqual(sum(map(message_tokens, messages)), 4096)
+        self.assertEqual(messages[-1], {"role": "user", "content": "Next"})
+        self.assertNotEqual(messages[1]["content"], "Question 0")
+        # Whole turns are kept
+        self.assertEqual(messages[1]["role"], "user")
+
+    def test_prefix_stays_stable(self):
+        """Test after dropping, the next turns start at the same turn"""
+        history = conversation(200)
+        first = self.builder.build("sys", history, "Next", "llama2")
+        history.append({"role": "user", "content": "Next", "llm_history": "Ok"})
+        second = self.builder.build("sys", history, "More", "llama2")
+        self.assertEqual(second[: len(first) - 1], first[:-1])
+
+    def test_message_too_long(self):
+        """Test a message that can't fit is reported instead of cut off"""
+        with self.assertRaises(ValueError):
+            self.builder.build("sys", [], "word " * 5000, "llama2")
+
+    def test_usage(self):
+        """Test the usage estimate matches the messages that would be sent"""
+        history = conversation(200)
+        used, window = self.builder.usage("sys", history, "Next", "llama2")
+        messages = self.builder.build("sys", history, "Next", "llama2")
+        self.assertEqual(used, sum(map(message_tokens, messages)))
+        self.assertEqual(window, 4096)
+
+
+if __name__ == "__main__":
+    unittest.main()
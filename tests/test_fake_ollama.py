@@ -0,0 +1,84 @@
+import time
+import unittest
+from unittest import mock
+
+import requests
+from helpers import wait_for
+from PySide6.QtCore import QCoreApplication, Qt
+
+from benchmarks.fake_ollama import FakeOllama
+from llm import LLMHandler
+from stream import NDJSONDecoder
+
+RESPONSE = ["<output>", "Hello", " there", "</output>"]
+
+
+def stream(url: str) -> tuple[list[bytes], list[dict]]:
+    """The network chunks of a generation and the events they carry"""
+    response = requests.post(f"{url}/api/generate", json={"model": "fake"}, stream=True)
+    response.raise_for_status()
+    chunks = list(response.raw.read_chunked(decode_content=False))
+    decoder = NDJSONDecoder()
+    events = [event for chunk in chunks for event in decoder.feed(chunk)]
+    return chunks, events + decoder.flush()
+
+
+class TestFakeOllama(unittest.TestCase):
+    def test_chunks_split_events(self):
+        """Test events are written in chunks of chunk_size bytes"""
+        with FakeOllama(RESPONSE, chunk_size=10) as fake:
+            chunks, events = stream(fake.url)
+        self.assertTrue(all(len(chunk) == 10 for chunk in chunks[:-1]))
+        self.assertLessEqual(len(chunks[-1]), 10)
+        self.assertEqual("".join(e["response"] for e in events), "".join(RESPONSE))
+        self.assertTrue(events[-1]["done"])
+
+    def test_first_token_delay_and_stalls(self):
+        with FakeOllama(
+            RESPONSE, first_token_delay=0.1, stall_every=2, stall_time=0.1
+        ) as fake:
+            start = time.perf_counter()
+            stream(fake.url)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+    def test_errors(self):
+        """Test failed requests and streams that end in an error event"""
+        with FakeOllama(RESPONSE, error_rate=1.0) as fake:
+            with self.assertRaises(requests.HTTPError):
+                stream(fake.url)
+        with FakeOllama(RESPONSE, error_after=2) as fake:
+            _, events = stream(fake.url)
+        self.assertEqual([e["response"] for e in events[:2]], RESPONSE[:2])
+        self.assertIn("error", events[-1])
+
+    def test_handler_reports_stream_errors(self):
+        """Test an error event ends the generation with error_occurred"""
+        self.check_stream_error("thread")
+
+    def test_async_handler_reports_stream_errors(self):
+        self.check_stream_error("async")
+
+    def check_stream_error(self, engine: str):
+        QCoreApplication.instance() or QCoreApplication([])
+        journal = mock.Mock()
+        handler = LLMHandler(max_fps=0, engine=engine, journal=journal)
+        if engine == "async":
+            self.addCleanup(handler.async_engine.close)
+        errors, history = [], []
+        handler.signals.error_occurred.connect(errors.append, Qt.DirectConnection)
+        handler.signals.llm_history_update.connect(history.append, Qt.DirectConnection)
+        with FakeOllama(RESPONSE, error_after=2) as fake:
+            handler.client.host = fake.url
+            request_id = handler.get_response(
+                "Hi", "fake", [{"role": "user", "content": "Hi"}]
+            )
+            wait_for(lambda: errors)
+        self.assertIn("error after 2 tokens", errors[0])
+        self.assertEqual(history, [])
+        # The cut off response isn't kept for recovery either
+        wait_for(lambda: journal.finish.called)
+        journal.finish.assert_called_once_with(request_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+
+from async_engine import AsyncEngine
+from benchmarks.fake_ollama import FakeOllama
+from context import ContextBuilder
+from fan_out import FanOutHandler, FanOutTarget, StreamMetrics, fan_out_targets
+
+RESPONSE = ["<think>", "Hmm", "</think>", "<output>", "# Done", "</output>"]
+
+
+class TestFanOutTargets(unittest.TestCase):
+    def test_one_target_per_model(self):
+        """Test a single sample compares the models without seeds"""
+        targets = fan_out_targets(["mistral", "llama2"])
+        self.assertEqual(targets, [FanOutTarget("mistral"), FanOutTarget("llama2")])
+        self.assertEqual(targets[0].label, "mistral")
+
+    def test_samples_are_seeded(self):
+        """Test samples of a model get distinct seeds"""
+        targets = fan_out_targets(["mistral"], samples=3)
+        self.assertEqual([target.seed for target in targets], [0, 1, 2])
+        self.assertEqual(targets[1].label, "mistral (seed 1)")
+
+
+class TestStreamMetrics(unittest.TestCase):
+    def test_measured_rate(self):
+        """Test tokens/s is measured from the first token without eval stats"""
+        metrics = StreamMetrics(start=10.0)
+        metrics.add([{"response": "a"}], 10.5)
+        metrics.add([{"response": "b"}, {"response": "c"}], 11.5)
+        metrics.finish(11.5)
+        self.assertEqual(metrics.first_token, 0.5)
+        self.assertEqual(metrics.tokens_per_second, 2.0)
+        self.assertEqual(str(metrics), "first token 0.50 s · 2.0 tokens/s · 1.5 s")
+
+    def test_reported_rate(self):
+        """Test Ollama's eval stats are preferred when the stream ends"""
+        metrics = StreamMetrics(start=0.0)
+        metrics.add([{"response": "a"}], 0.1)
+        metrics.add([{"done": True, "eval_count": 50, "eval_duration": 2e9}], 3.0)
+        self.assertEqual(metrics.tokens_per_second, 25.0)
+
+    def test_waiting(self):
+        """Test metrics before the first token"""
+        metrics = StreamMetrics(start=0.0)
+        metrics.add([{"response": ""}], 1.0)
+        self.assertIsNone(metrics.first_token)
+        self.assertEqual(str(metrics), "Waiting for the first token...")
+
+
+class TestFanOutHandler(unittest.TestCase):
+    def setUp(self):
+        self.handler = FanOutHandler(concurrency=2, max_fps=0, engine=AsyncEngine())
+        self.addCleanup(self.handler.close)
+
+    def collect(self, pane):
+        posts = []
+        pane.scheduler.post = lambda name, value, **kwargs: posts.append((name, value))
+        return posts
+
+    def test_every_pane_streams_its_response(self):
+        """Test each target gets its own request, formatter and updates"""
+        targets = fan_out_targets(["a", "b"], samples=2)
+        panes = self.handler.set_targets(targets)
+        posts = [self.collect(pane) for pane in panes]
+
+        with FakeOllama(RESPONSE, token_delay=0.01) as fake:
+            self.handler.client.host = fake.url
+            self.handler.get_responses("Hi", [])
+            self.handler._current_future.result(timeout=10)
+
+        requests = sorted(
+            (request["model"], request["options"]["seed"]) for request in fake.requests
+        )
+        self.assertEqual(requests, [("a", 0), ("a", 1), ("b", 0), ("b", 1)])
+        # Only two generations ran at once, so two connections were enough
+        self.assertLessEqual(self.handler.engine.connections, 2)
+        for pane, pane_posts in zip(panes, posts):
+            self.assertEqual(pane_posts[-1], ("llm_history_update", "".join(RESPONSE)))
+            output = [value for name, value in pane_posts if name == "output_update"]
+            self.assertIn("<h1>Done</h1>", output[-1])
+            self.assertEqual(pane.metrics.eval_count, len(RESPONSE))
+            self.assertIsNotNone(pane.metrics.end)
+
+    def test_errors_stay_in_their_pane(self):
+        """Test a failing generation doesn't stop the others"""
+        panes = self.handler.set_targets(fan_out_targets(["a", "b"]))
+        posts = [self.collect(pane) for pane in panes]
+
+        with FakeOllama(RESPONSE) as fake:
+            self.handler.client.host = fake.url
+            original = self.handler.client.build_payload
+
+            def build_payload(model, prompt, seed=None):
+                if model == "a":
+                    raise ValueError("no model a")
+                return original(model, prompt, seed)
+
+            self.handler.client.build_payload = build_payload
+            self.handler.get_responses("Hi", [])
+            self.handler._current_future.result(timeout=10)
+
+        self.assertEqual(posts[0], [("error_occurred", "no model a")])
+        self.assertEqual(posts[1][-1][0], "llm_history_update")
+
+    def test_each_model_fits_its_own_window(self):
+        """Test a small window doesn't trim the history sent to a larger one"""
+        history = [
+            {"role": "user", "content": f"Question {i}", "llm_history": "word " * 50}
+            for i in range(150)
+        ]
+        history.append({"role": "user", "content": "Next"})
+        self.handler.set_targets(fan_out_targets(["llama2", "mistral"]))
+
+        with FakeOllama(RESPONSE) as fake:
+            self.handler.client.host = fake.url
+            self.handler.get_responses("Next", history)
+            self.handler._current_future.result(timeout=10)
+
+        sent = {request["model"]: request["messages"] for request in fake.requests}
+        for model in ["llama2", "mistral"]:
+            expected = self.handler.client._format_prompt(
+                "Next", history, model, context=ContextBuilder()
+            )
+            self.assertEqual(sent[model], expected)
+        self.assertGreater(len(sent["mistral"]), len(sent["llama2"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
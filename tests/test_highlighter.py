@@ -0,0 +1,64 @@
+import unittest
+
+from highlighter import CodeHighlighter
+from llm import MarkdownResponseFormatter
+
+
+class TestCodeHighlighter(unittest.TestCase):
+    def setUp(self):
+        self.formatter = MarkdownResponseFormatter()
+        self.highlighter = self.formatter.highlighter
+        self.highlighter.cache_clear()
+
+    def test_repeated_code_is_cached(self):
+        """Test highlighting the same code twice only runs Pygments once"""
+        first = self.highlighter.highlight("print('hi')", "python")
+        second = self.highlighter.highlight("print('hi')", "python")
+
+        self.assertEqual(first, second)
+        info = self.highlighter.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+    def test_language_is_part_of_the_key(self):
+        """Test the same code in another language is highlighted again"""
+        self.highlighter.highlight("x = 1", "python")
+        self.highlighter.highlight("x = 1", "ruby")
+        self.assertEqual(self.highlighter.cache_info().misses, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the cache stays within its size limit"""
+        highlighter = CodeHighlighter(self.formatter.code_formatter, maxsize=2)
+        highlighter.highlight("a = 1", "python")
+        highlighter.highlight("b = 2", "python")
+        highlighter.highlight("a = 1", "python")
+        highlighter.highlight("c = 3", "python")
+
+        self.assertEqual(highlighter.cache_info().currsize, 2)
+        highlighter.highlight("a = 1", "python")
+        self.assertEqual(highlighter.cache_info().hits, 2)
+        highlighter.highlight("b = 2", "python")
+        self.assertEqual(highlighter.cache_info().misses, 4)
+
+    def test_lexers_are_reused(self):
+        """Test lexer instances are looked up once per language"""
+        first = self.highlighter.get_lexer("x = 1", "python")
+        second = self.highlighter.get_lexer("y = 2", "python")
+        self.assertIs(first, second)
+
+    def test_unknown_languages_are_not_cached(self):
+        """Test made-up language names don't grow the lexer cache"""
+        for i in range(10):
+            self.highlighter.highlight("x = 1", f"made-up-{i}")
+        self.assertEqual(self.highlighter.cache_info().lexers, 1)  # text
+
+    def test_streamed_code_block_is_highlighted_once(self):
+        """Test re-rendering a growing response doesn't re-highlight finished code"""
+        response = "<output>\n```python\ndef f():\n    return 1\n```\n\nText"
+        for extra in ("", " more", " more text"):
+            self.formatter.format_response(response + extra)
+
+        self.assertEqual(self.highlighter.cache_info().misses, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from PySide6.QtCore import QCoreApplication, Qt
+
+from history_model import ROW_LENGTH, HistoryModel
+
+
+class TestHistoryModel(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.model = HistoryModel()
+        self.inserted = []
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: self.inserted.append((first, last))
+        )
+
+    def text(self, row: int, role=Qt.DisplayRole):
+        return self.model.data(self.model.index(row), role)
+
+    def test_append_inserts_one_row(self):
+        """Test appending announces only the new row"""
+        self.model.append("First", "10:00:00")
+        self.model.append("Second\nline", "10:00:05")
+        self.assertEqual(self.model.rowCount(), 2)
+        self.assertEqual(self.inserted, [(0, 0), (1, 1)])
+        self.assertEqual(self.text(1), "[10:00:05] Second line")
+        self.assertEqual(self.text(1, Qt.ToolTipRole), "Second\nline")
+
+    def test_rows_are_one_short_line(self):
+        message = "word " * 1000
+        self.model.append(message)
+        self.assertEqual(len(self.text(0)), ROW_LENGTH)
+        self.assertEqual(self.text(0, Qt.ToolTipRole), message)
+
+    def test_reset(self):
+        self.model.append("Old")
+        self.model.reset(["One", "Two"])
+        self.assertEqual([self.text(0), self.text(1)], ["One", "Two"])
+        self.assertEqual(self.model.rowCount(), 2)
+
+    def test_long_history(self):
+        """Test many messages are kept row by row"""
+        for i in range(2000):
+            self.model.append(f"Message {i}")
+        self.assertEqual(self.model.rowCount(), 2000)
+        self.assertEqual(self.inserted[-1], (1999, 1999))
+        self.assertEqual(self.text(1999), "Message 1999")
+        self.assertIsNone(self.text(0, Qt.DecorationRole))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import socket
+import unittest
+
+import requests
+
+from benchmarks.fake_ollama import FakeOllama
+from http_pool import SessionPool, set_read_timeout
+from llm import LLMClient
+
+
+def generate(pool, url, timeout=(1, 5)):
+    with pool.session(url).post(
+        f"{url}/api/generate", json={"model": "fake"}, stream=True, timeout=timeout
+    ) as response:
+        return list(response.iter_content(1024))
+
+
+class TestSessionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = SessionPool(retries=1)
+        self.addCleanup(self.pool.close)
+
+    def test_connection_is_reused(self):
+        """Test consecutive generations share one keep-alive connection"""
+        with FakeOllama(["Hello", " world"]) as fake:
+            generate(self.pool, fake.url)
+            generate(self.pool, fake.url)
+
+        [stats] = self.pool.stats()
+        self.assertEqual(stats.host, fake.url)
+        self.assertEqual((stats.requests, stats.connections, stats.idle), (2, 1, 1))
+
+    def test_one_session_per_host(self):
+        """Test hosts get their own sessions, paths share them"""
+        first = self.pool.session("http://localhost:11434/api/generate")
+        self.assertIs(first, self.pool.session("http://localhost:11434/api/tags"))
+        self.assertIsNot(first, self.pool.session("http://localhost:11435/api/tags"))
+
+    def test_connection_errors_are_raised_after_retries(self):
+        """Test a host that refuses connections fails instead of hanging"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        with self.assertRaises(requests.ConnectionError):
+            generate(self.pool, f"http://127.0.0.1:{port}")
+
+    def test_read_timeout_between_tokens(self):
+        """Test a stalled stream times out once the read timeout is lowered"""
+        with FakeOllama(["slow"] * 3, token_delay=0.5) as fake:
+            response = self.pool.session(fake.url).post(
+                f"{fake.url}/api/generate", json={}, stream=True, timeout=(1, 5)
+            )
+            with response:
+                set_read_timeout(response, 0.05)
+                with self.assertRaises(requests.ConnectionError):
+                    list(response.iter_content(1024))
+
+
+class TestLLMClient(unittest.TestCase):
+    def test_stream_response_uses_pool(self):
+        """Test the client streams through its session pool and reports it"""
+        client = LLMClient(SessionPool())
+        self.addCleanup(client.sessions.close)
+        with FakeOllama(["Hi"]) as fake:
+            client.host = fake.url
+            for _ in range(2):
+                with client.stream_response(
+                    "fake", client._format_prompt("Hi", [])
+                ) as response:
+                    self.assertIn(b'"Hi"', b"".join(response.iter_content(1024)))
+
+        self.assertEqual(
+            client.pool_stats(),
+            f"[pool] {fake.url}: 2 requests over 1 connections, 1 idle",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
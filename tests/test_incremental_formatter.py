@@ -0,0 +1,133 @@
+import unittest
+from pathlib import Path
+
+from llm import IncrementalMarkdownResponseFormatter, MarkdownResponseFormatter
+from templates import HTMLTemplates
+
+
+class TestIncrementalMarkdownResponseFormatter(unittest.TestCase):
+    def setUp(self):
+        self.formatter = IncrementalMarkdownResponseFormatter()
+        self.full_formatter = MarkdownResponseFormatter()
+        self.sample_file = Path("docs/markdown_sample_output.md")
+        with open(self.sample_file, "r", encoding="utf-8") as f:
+            self.sample_content = f.read()
+
+    def assertMatchesFullRender(self, text, step=5):
+        """Stream text in chunks and compare every step with a full render"""
+        for end in list(range(1, len(text), step)) + [len(text)]:
+            thinking, output = self.formatter.format_response(text[:end])
+            self.assertEqual(
+                (thinking, output.replace(HTMLTemplates.BLOCK_SEPARATOR, "")),
+                self.full_formatter.format_response(text[:end]),
+                f"Mismatch after {end} characters",
+            )
+
+    def test_streamed_sample_matches_full_render(self):
+        """Test every streamed prefix of the sample renders like a full render"""
+        self.assertMatchesFullRender(self.sample_content)
+
+    def test_finished_blocks_are_cached(self):
+        """Test finished blocks are not rendered again"""
+        text = "<output>\n# Title\n\nFirst paragraph.\n\nSecond\n"
+        self.formatter.format_response(text)
+        self.assertEqual(len(self.formatter._block_html), 2)
+
+        self.formatter.format_response(text + "paragraph.")
+        self.assertEqual(len(self.formatter._block_html), 2)
+        self.assertIn("<h1>Title</h1>", self.formatter._block_html[0])
+
+    def test_open_code_fence_is_not_split(self):
+        """Test blank lines inside an open code fence don't close a block"""
+        text = "<output>\nIntro\n\n```python\nx = 1\n\ny = 2\n"
+        self.formatter.format_response(text)
+        self.assertEqual(len(self.formatter._block_html), 1)
+        self.assertMatchesFullRender(text + "```\n\nDone\n</output>")
+
+    def test_lists_and_tables(self):
+        """Test lists split by blank lines and tables render like a full render"""
+        text = """<output>
+1. First
+2. Second
+   - Nested
+
+3. Third
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+Done.
+</output>"""
+        self.assertMatchesFullRender(text, step=1)
+
+    def test_blockquotes_split_by_blank_lines(self):
+        """Test quotes separated by a blank line stay one blockquote"""
+        text = "<output>\nIntro\n\n> a\n\n> b\n\n> c\n\nDone.\n</output>"
+        self.assertMatchesFullRender(text, step=1)
+
+    def test_definition_lists_split_by_blank_lines(self):
+        """Test terms and definitions separated by blank lines stay one list"""
+        text = (
+            "<output>\nTerm\n: def\n\nTerm2\n: d\n\n: more\n\n"
+            "Term3\n\n: spaced\n\nDone.\n</output>"
+        )
+        self.assertMatchesFullRender(text, step=1)
+
+    def test_reference_links_fall_back_to_full_render(self):
+        """Test document-wide syntax switches to a full render"""
+        text = "<output>\nSee [docs][1].\n\nMore text.\n\n[1]: http://example.com\n"
+        self.assertMatchesFullRender(text + "</output>", step=1)
+        self.assertTrue(self.formatter._needs_full_render)
+
+    def test_blocks_are_separated(self):
+        """Test output blocks are separated for patching the output page"""
+        _, output = self.formatter.format_response(
+            "<output>\n# Title\n\nFirst paragraph.\n\nSecond\n"
+        )
+        self.assertEqual(
+            output.split(HTMLTemplates.BLOCK_SEPARATOR),
+            ["<h1>Title</h1>\n", "<p>First paragraph.</p>\n", "<p>Second</p>"],
+        )
+
+    def test_new_response_resets_cache(self):
+        """Test a response that doesn't extend the previous one starts over"""
+        self.formatter.format_response("<output>\nOld\n\nanswer\n")
+        _, output = self.formatter.format_response("<output>\nNew\n")
+        self.assertNotIn("Old", output)
+        self.assertIn("New", output)
+
+    def test_open_output_section_is_rendered(self):
+        """Test markdown in an unclosed output section is rendered while streaming"""
+        _, output = self.formatter.format_response(
+            "<think>\nHmm\n</think>\n<output>\n# Streaming header\n\nText"
+        )
+        self.assertIn("<h1>Streaming header</h1>", output)
+        self.assertNotIn("&lt;output&gt;", output)
+
+    def test_sample_code_blocks_are_not_merged_into_mermaid(self):
+        """Test the ASCII art after a mermaid fence stays a code block"""
+        _, output = self.formatter.format_response(self.sample_content)
+        self.assertNotIn("CODE_BLOCK_", output)
+        self.assertNotIn("MERMAID_PLACEHOLDER_", output)
+        self.assertEqual(output.count('<div class="mermaid">'), 4)
+
+    def test_pending_diagram_only_in_open_block(self):
+        """Test the diagram placeholder is dropped once the response is closed"""
+        text = (
+            "<output>\nIntro\n\n<mermaid>\ngraph TD\nA-->B\n```\n\n"
+            "More answer text here\n"
+        )
+        self.assertMatchesFullRender(text)
+        _, output = self.formatter.format_response(text)
+        self.assertIn("<p>Intro</p>", self.formatter._block_html[0])
+        self.assertIn("mermaid-pending", output)
+
+        self.assertMatchesFullRender(text + "</output>")
+        _, output = self.formatter.format_response(text + "</output>")
+        self.assertNotIn("mermaid-pending", output)
+        self.assertIn("More answer text here", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from helpers import wait_for
+from PySide6.QtCore import QCoreApplication, Qt
+
+from benchmarks.fake_ollama import FakeOllama
+from journal import Journal, UnfinishedTurn
+from llm import LLMHandler
+from store import Autosaver, ConversationStore
+
+RESPONSE = ["<output>", "Hello", " there", "</output>"]
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "journal.jsonl"
+        self.journal = self.open()
+
+    def open(self) -> Journal:
+        journal = Journal(self.path, interval=0.05)
+        self.addCleanup(journal.close)
+        return journal
+
+    def records(self) -> list[dict]:
+        return [json.loads(line) for line in self.path.read_text().splitlines()]
+
+    def test_deltas_are_written_in_batches(self):
+        """Test deltas of a turn that arrive together are one record"""
+        self.journal.start(1, user="Hi", model="llama2")
+        for delta in ["a", "b", "c"]:
+            self.journal.append(1, delta)
+        self.journal.flush()
+
+        self.assertEqual(
+            self.records(),
+            [
+                {"op": "start", "key": 1, "meta": {"user": "Hi", "model": "llama2"}},
+                {"op": "append", "key": 1, "text": "abc"},
+            ],
+        )
+
+    def test_unfinished_turns(self):
+        """Test turns without a finish are recovered by the next run"""
+        self.journal.start(1, user="Cut off")
+        self.journal.append(1, "Half an ")
+        self.journal.start(2, user="Saved")
+        self.journal.append(2, "Whole")
+        self.journal.append(1, "answer")
+        self.journal.finish(2)
+        self.journal.close()
+        # A record cut off mid-write is skipped
+        with open(self.path, "a") as f:
+            f.write('{"op": "app')
+
+        self.assertEqual(
+            self.open().unfinished(),
+            [UnfinishedTurn(1, {"user": "Cut off"}, "Half an answer")],
+        )
+
+    def test_emptied_when_nothing_is_open(self):
+        self.journal.start(1)
+        self.journal.append(1, "text")
+        self.journal.flush()
+        self.journal.finish(1)
+        self.journal.flush()
+        self.assertEqual(self.path.read_text(), "")
+
+    def test_clear(self):
+        self.journal.start(1)
+        self.journal.flush()
+        self.journal.clear()
+        self.journal.flush()
+        self.assertEqual(self.journal.unfinished(), [])
+
+
+class TestHandlerJournal(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = Journal(Path(directory.name) / "journal.jsonl", interval=0.01)
+        self.addCleanup(self.journal.close)
+
+    def test_response_is_journaled(self):
+        """Test a streamed response stays in the journal until it's saved"""
+        with FakeOllama(RESPONSE) as fake:
+            handler = LLMHandler(max_fps=0, journal=self.journal)
+            handler.client.host = fake.url
+            received = []
+            handler.signals.llm_history_update.connect(
+                received.append, Qt.DirectConnection
+            )
+            request_id = handler.get_response(
+                "Hi", "llama2", [], journal_meta={"session_id": 7}
+            )
+            wait_for(lambda: received)
+
+        self.journal.flush()
+        self.assertEqual(
+            self.journal.unfinished(),
+            [
+                UnfinishedTurn(
+                    request_id,
+                    {"user": "Hi", "model": "llama2", "session_id": 7},
+                    "".join(RESPONSE),
+                )
+            ],
+        )
+
+    def test_stopped_response_is_dropped(self):
+        with FakeOllama(RESPONSE * 100, token_delay=0.01) as fake:
+            handler = LLMHandler(max_fps=0, journal=self.journal)
+            handler.client.host = fake.url
+            handler.get_response("Hi", "llama2", [])
+            wait_for(lambda: fake.requests)
+            handler.stop()
+            wait_for(lambda: handler.stop_time is not None)
+
+        self.journal.flush()
+        self.assertEqual(self.journal.unfinished(), [])
+
+
+class TestAutosaver(unittest.TestCase):
+    def setUp(self):
+        self.store = ConversationStore(":memory:")
+        self.addCleanup(self.store.close)
+
+    def autosaver(self, journal=None) -> Autosaver:
+        autosaver = Autosaver(self.store, journal, delay=0.05)
+        self.addCleanup(autosaver.close)
+        return autosaver
+
+    def test_turns_are_saved_together(self):
+        """Test turns are saved after a pause, to one new conversation"""
+        autosaver = self.autosaver()
+        autosaver.save("First", "One", "llama2")
+        autosaver.save("Second", "Two", "llama2")
+        self.assertEqual(self.store.sessions(), [])
+
+        wait_for(lambda: autosaver.session_id is not None)
+        # The session is known before the second turn is written
+        autosaver.flush().result()
+        history = self.store.history(autosaver.session_id)
+        self.assertEqual([entry["content"] for entry in history], ["First", "Second"])
+
+    def test_saved_turns_finish_their_journal_entry(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = Journal(Path(directory) / "journal.jsonl", interval=0.01)
+            self.addCleanup(journal.close)
+            journal.start(1, user="First")
+            autosaver = self.autosaver(journal)
+            autosaver.save("First", "One", journal_key=1)
+            autosaver.flush().result(timeout=5)
+            journal.flush()
+            self.assertEqual(journal.unfinished(), [])
+
+    def test_open_and_export(self):
+        """Test turns go to the opened conversation and export writes it"""
+        session = self.store.new_session("Earlier")
+        self.store.add_turn(session, "Earlier", "Answer")
+        autosaver = self.autosaver()
+        autosaver.open(session)
+        autosaver.save("Later", "Answer")
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "chat.md"
+            autosaver.export(path).result(timeout=5)
+            self.assertIn("## User Input\nLater\n", path.read_text())
+        self.assertEqual(len(self.store.history(session)), 2)
+
+    def test_recover(self):
+        autosaver = self.autosaver()
+        autosaver.recover([UnfinishedTurn(1, {"user": "Hi", "model": "m"}, "Half")])
+        autosaver.flush().result(timeout=5)
+        (session,) = self.store.sessions()
+        self.assertEqual(self.store.history(session.id)[0]["llm_history"], "Half")
+
+
+if __name__ == "__main__":
+    unittest.main()
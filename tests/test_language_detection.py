@@ -0,0 +1,127 @@
+import unittest
+
+from language_detection import LanguageDetector
+from llm import MarkdownResponseFormatter
+
+PYTHON_CODE = """import os
+
+def load(path):
+    if os.path.exists(path):
+        print(path)
+"""
+
+# Scores the same for Go and Rust
+AMBIGUOUS_CODE = """x := 1
+let mut y = 2
+z := 3
+let mut w = 4
+"""
+
+
+class TestLanguageDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = LanguageDetector()
+
+    def test_shebang(self):
+        """Test a shebang line decides the language"""
+        self.assertEqual(
+            self.detector.detect("#!/usr/bin/env python3\nx = 1"), "python"
+        )
+        self.assertEqual(self.detector.detect("#!/bin/sh\nls"), "bash")
+
+    def test_keyword_score(self):
+        """Test typical syntax is scored per language"""
+        self.assertEqual(self.detector.detect(PYTHON_CODE), "python")
+        self.assertEqual(
+            self.detector.detect('{\n    "key": "value",\n    "n": 1\n}'), "json"
+        )
+        self.assertEqual(
+            self.detector.detect("SELECT name FROM users\nWHERE id = 1;"), "sql"
+        )
+
+    def test_plain_text(self):
+        """Test text without enough evidence is not highlighted"""
+        self.assertEqual(
+            self.detector.detect("Step 1: open the app\nThen wait"), "text"
+        )
+        self.assertEqual(self.detector.detect("*****\n* * *\n*****"), "text")
+
+    def test_history_breaks_ties(self):
+        """Test languages named by earlier blocks win close calls"""
+        code = AMBIGUOUS_CODE
+        self.assertEqual(self.detector.detect(code), "go")
+
+        self.detector.remember("fn main() {}", "rust")
+        self.assertEqual(self.detector.detect(code), "rust")
+
+        self.detector.new_conversation()
+        self.assertEqual(self.detector.detect(code), "go")
+
+    def test_guesses_are_not_remembered(self):
+        """Test only explicitly named languages feed the history"""
+        self.detector.detect(PYTHON_CODE)
+        self.assertEqual(len(self.detector._history), 0)
+
+    def test_block_is_remembered_once(self):
+        """Test rendering the same block again doesn't grow the history"""
+        for _ in range(3):
+            self.detector.remember("fn main() {}", "rust")
+        self.assertEqual(list(self.detector._history.values()), ["rust"])
+
+    def test_results_are_cached(self):
+        """Test a block is only scored once per history"""
+        self.detector.detect(PYTHON_CODE)
+        self.detector._detect = None  # Any further scoring would fail
+        self.assertEqual(self.detector.detect(PYTHON_CODE), "python")
+
+    def test_budget_stops_scoring(self):
+        """Test no language is scored after the budget runs out"""
+        detector = LanguageDetector(budget=0)
+        # Only the first language (Python) is scored before the deadline
+        self.assertEqual(detector.detect("package main\nfunc main() {}\n"), "text")
+        self.assertEqual(detector.detect(PYTHON_CODE), "python")
+
+    def test_sample_is_bounded(self):
+        """Test only the start of a large block is scored"""
+        code = "Plain words here\n" * 200 + PYTHON_CODE
+        self.assertEqual(self.detector.detect(code), "text")
+
+
+class TestHighlighterDetection(unittest.TestCase):
+    def setUp(self):
+        self.formatter = MarkdownResponseFormatter()
+        self.highlighter = self.formatter.highlighter
+
+    def test_unknown_language_is_detected(self):
+        """Test an unknown language name falls back to detection"""
+        lexer = self.highlighter.get_lexer(PYTHON_CODE, "not-a-language")
+        self.assertIn("python", lexer.aliases)
+
+    def test_unlabeled_block_is_detected(self):
+        """Test code without a language is highlighted as the detected one"""
+        _, output = self.formatter.format_response(
+            f"<output>\n```\n{PYTHON_CODE}```\n</output>"
+        )
+        self.assertIn('class="language-text"', output)
+        self.assertIn("color: #C678DD", output)  # keyword color
+
+    def test_cache_key_follows_history(self):
+        """Test the same code is highlighted again when history changes its lexer"""
+        code = AMBIGUOUS_CODE
+        go = self.highlighter.highlight(code, None)
+        self.highlighter.detector.remember("fn main() {}", "rust")
+        rust = self.highlighter.highlight(code, None)
+
+        self.assertEqual(self.highlighter.lexer_name(code, None), "rust")
+        self.assertEqual(self.highlighter.cache_info().misses, 2)
+        self.assertNotEqual(go, rust)
+
+    def test_new_conversation_clears_history(self):
+        """Test the formatter scopes the language history to a conversation"""
+        self.highlighter.detector.remember("fn main() {}", "rust")
+        self.formatter.new_conversation()
+        self.assertEqual(len(self.highlighter.detector._history), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
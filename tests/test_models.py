@@ -0,0 +1,207 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from PySide6.QtCore import QCoreApplication, Qt
+
+from benchmarks.fake_ollama import FakeOllama
+from context import context_window
+from http_pool import SessionPool
+from llm import LLMClient
+from models import (
+    ModelInfo,
+    ModelRegistry,
+    ModelWarmer,
+    format_size,
+    keep_alive,
+    merge_models,
+)
+
+
+class SlowClient:
+    """Client whose preload waits until it's released"""
+
+    def __init__(self):
+        self.loaded = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def preload(self, model):
+        self.started.set()
+        self.release.wait(5)
+        self.loaded.append(model)
+
+
+class TestKeepAlive(unittest.TestCase):
+    def test_keep_alive(self):
+        """Test durations are looked up by model, then by name without the tag"""
+        self.assertEqual(keep_alive("deepseek-r1:32b"), "10m")
+        self.assertEqual(keep_alive("deepseek-r1:7b"), "30m")
+        self.assertEqual(keep_alive(None), "30m")
+
+    def test_requests_keep_the_model_loaded(self):
+        """Test every generation asks for the model's keep-alive duration"""
+        payload = LLMClient().build_payload("deepseek-r1:32b", [])
+        self.assertEqual(payload["keep_alive"], "10m")
+
+
+class TestModelWarmer(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.status = []
+
+    def warmer(self, client) -> ModelWarmer:
+        warmer = ModelWarmer(client)
+        self.addCleanup(warmer.close)
+        warmer.signals.model_status.connect(self.status.append, Qt.DirectConnection)
+        return warmer
+
+    def test_preload(self):
+        """Test a model is loaded with an empty request and the same settings"""
+        with FakeOllama(["unused"]) as fake:
+            client = LLMClient(sessions=SessionPool(), host=fake.url)
+            self.addCleanup(client.sessions.close)
+            self.warmer(client).warm("llama2").result(timeout=5)
+
+        self.assertEqual(
+            fake.requests,
+            [
+                {
+                    "model": "llama2",
+                    "stream": False,
+                    "keep_alive": "30m",
+                    "options": {"num_ctx": context_window("llama2")},
+                }
+            ],
+        )
+        self.assertEqual(self.status[0], "Loading llama2...")
+        self.assertTrue(self.status[1].startswith("llama2 ready (loaded in "))
+
+    def test_replaced_selection_is_skipped(self):
+        """Test only the model selected last is loaded and reported"""
+        client = SlowClient()
+        warmer = self.warmer(client)
+        first = warmer.warm("a")
+        client.started.wait(5)
+        second = warmer.warm("b")
+        third = warmer.warm("c")
+        client.release.set()
+        for future in (first, second, third):
+            future.result(timeout=5)
+
+        # "a" was loading already when the others were selected
+        self.assertEqual(client.loaded, ["a", "c"])
+        self.assertEqual(
+            self.status[:3], ["Loading a...", "Loading b...", "Loading c..."]
+        )
+        self.assertEqual(len(self.status), 4)
+        self.assertTrue(self.status[3].startswith("c ready"))
+
+    def test_error_status(self):
+        """Test a model that can't be loaded is reported"""
+        client = LLMClient(sessions=SessionPool(), host="http://127.0.0.1:9")
+        self.addCleanup(client.sessions.close)
+        self.warmer(client).warm("llama2").result(timeout=30)
+        self.assertTrue(self.status[-1].startswith("Could not load llama2: "))
+
+
+class TestModelList(unittest.TestCase):
+    def test_merge_models(self):
+        """Test loaded models get their memory and unlisted ones are added"""
+        tags = {
+            "models": [
+                {
+                    "name": "llama2",
+                    "size": 3_800_000_000,
+                    "details": {"parameter_size": "7B", "quantization_level": "Q4_0"},
+                },
+                {"name": "mistral", "size": 4_100_000_000},
+            ]
+        }
+        ps = {
+            "models": [
+                {"name": "mistral", "size": 6_000_000_000, "size_vram": 3_000_000_000},
+                {"name": "removed", "size": 1_000_000_000, "size_vram": 0},
+            ]
+        }
+        llama2, mistral, removed = merge_models(tags, ps)
+
+        self.assertEqual(
+            llama2, ModelInfo("llama2", 3_800_000_000, "7B", "Q4_0", loaded=False)
+        )
+        self.assertTrue(mistral.loaded)
+        self.assertEqual(mistral.residency, "6.0 GB (50%/50% CPU/GPU)")
+        self.assertEqual(removed.residency, "1.0 GB (100% CPU)")
+        self.assertEqual(llama2.residency, "")
+
+    def test_format_size(self):
+        self.assertEqual(format_size(512), "512 B")
+        self.assertEqual(format_size(4_700_000_000), "4.7 GB")
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.fake = FakeOllama(["unused"], models=["llama2", "mistral"]).__enter__()
+        self.addCleanup(self.fake.__exit__, None, None, None)
+        self.client = LLMClient(sessions=SessionPool(), host=self.fake.url)
+        self.addCleanup(self.client.sessions.close)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_file = Path(directory.name) / "models.json"
+
+    def registry(self) -> ModelRegistry:
+        registry = ModelRegistry(self.client, self.cache_file)
+        self.addCleanup(registry.close)
+        return registry
+
+    def test_refresh(self):
+        """Test refreshing lists the installed models and emits them"""
+        registry = self.registry()
+        updates = []
+        registry.signals.models_updated.connect(updates.append, Qt.DirectConnection)
+        registry.refresh().result(timeout=5)
+
+        self.assertEqual(
+            [model.name for model in registry.models], ["llama2", "mistral"]
+        )
+        self.assertEqual(updates, [registry.models])
+        self.assertEqual(registry.models[0].quantization, "Q4_K_M")
+
+    def test_cached_list_is_read_at_startup(self):
+        """Test the last list is known before Ollama answers"""
+        self.registry().refresh().result(timeout=5)
+        self.client.host = "http://127.0.0.1:9"
+        registry = self.registry()
+        self.assertEqual(
+            [model.name for model in registry.models], ["llama2", "mistral"]
+        )
+
+        # A failed refresh keeps it
+        registry.refresh().result(timeout=30)
+        self.assertIsNotNone(registry.last_error)
+        self.assertEqual(len(registry.models), 2)
+
+    def test_broken_cache_is_ignored(self):
+        self.cache_file.write_text(json.dumps([{"unknown": 1}]))
+        self.assertEqual(self.registry().models, [])
+
+    def test_unload(self):
+        """Test unloading frees a loaded model and refreshes the list"""
+        registry = self.registry()
+        self.client.preload("mistral")
+        registry.refresh().result(timeout=5)
+        self.assertTrue(registry.models[1].loaded)
+
+        registry.unload("mistral").result(timeout=5)
+        self.assertEqual(
+            self.fake.requests[-1],
+            {"model": "mistral", "keep_alive": 0, "stream": False},
+        )
+        self.assertFalse(registry.models[1].loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
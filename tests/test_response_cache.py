@@ -0,0 +1,152 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from helpers import wait_for
+from PySide6.QtCore import QCoreApplication, Qt
+
+from benchmarks.fake_ollama import FakeOllama
+from llm import LLMHandler
+from response_cache import ResponseCache
+
+RESPONSE = ["<think>", "Hmm", "</think>", "<output>", "Hello", " there", "</output>"]
+
+
+def payload(content="Hi", **options) -> dict:
+    return {
+        "model": "llama2",
+        "messages": [{"role": "user", "content": content}],
+        "keep_alive": "30m",
+        "options": {"num_ctx": 4096, **options},
+    }
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_keys(self):
+        """Test requests for the same generation share a key"""
+        cache = ResponseCache(self.directory)
+        key = cache.key(payload("Hi\r\nthere  ", seed=1))
+        self.assertEqual(key, cache.key(payload(" Hi\nthere", seed=1, num_ctx=8192)))
+        self.assertNotEqual(key, cache.key(payload("Hi\nthere", seed=2)))
+        self.assertNotEqual(key, cache.key(payload("Hi\nthere", seed=1, top_k=5)))
+        self.assertIsNotNone(cache.key(payload(temperature=0)))
+
+    def test_sampled_generations_are_not_cached(self):
+        cache = ResponseCache(self.directory)
+        self.assertIsNone(cache.key(payload()))
+        self.assertIsNone(cache.key(payload(temperature=0.7)))
+
+    def test_least_recently_used_are_evicted(self):
+        """Test entries beyond the size are dropped, oldest use first"""
+        cache = ResponseCache(self.directory, max_bytes=250)
+        event = {"response": "x" * 50, "done": True}
+        for key in "abc":
+            cache.put(key, event)
+        cache.get("a")
+        cache.put("d", event)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), event)
+        self.assertEqual(
+            sorted(path.stem for path in self.directory.iterdir()), ["a", "c", "d"]
+        )
+        self.assertLessEqual(cache.cache_info().size, 250)
+
+    def test_entries_outlive_the_cache(self):
+        """Test a new cache finds the entries and their order of use"""
+        cache = ResponseCache(self.directory, max_bytes=250)
+        event = {"response": "x" * 50, "done": True}
+        for i, key in enumerate("abc"):
+            cache.put(key, event)
+            os.utime(self.directory / f"{key}.json", ns=(i, i))
+        (self.directory / "e.tmp").write_text("{")
+
+        cache = ResponseCache(self.directory, max_bytes=250)
+        cache.put("d", event)
+        self.assertEqual(cache.cache_info().entries, 3)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), event)
+        self.assertFalse((self.directory / "e.tmp").exists())
+
+
+class TestHandlerCache(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ResponseCache(Path(directory.name))
+
+    def respond(self, handler: LLMHandler) -> dict:
+        """Send one message, return the last value of each signal"""
+        received = {}
+        for name in ["thinking_update", "output_update", "cache_hit"]:
+            getattr(handler.signals, name).connect(
+                lambda value, name=name: received.__setitem__(name, value),
+                Qt.DirectConnection,
+            )
+        handler.signals.llm_history_update.connect(
+            lambda value: received.__setitem__("history", value), Qt.DirectConnection
+        )
+        handler.get_response("Hi", "llama2", [{"role": "user", "content": "Hi"}])
+        wait_for(lambda: "history" in received)
+        return received
+
+    def test_response_is_replayed(self):
+        """Test a seeded request sent again is answered from the cache"""
+        with mock.patch.dict("llm.GENERATION_OPTIONS", {"seed": 42}):
+            with FakeOllama(RESPONSE) as fake:
+                generated = self.respond(self.handler(fake.url))
+                replayed = self.respond(self.handler(fake.url))
+
+        self.assertEqual(len(fake.requests), 1)
+        self.assertNotIn("cache_hit", generated)
+        self.assertIn("from cache", replayed.pop("cache_hit"))
+        self.assertEqual(replayed, generated)
+
+    def test_async_engine_replays(self):
+        with mock.patch.dict("llm.GENERATION_OPTIONS", {"temperature": 0}):
+            with FakeOllama(RESPONSE) as fake:
+                generated = self.respond(self.handler(fake.url, "async"))
+                replayed = self.respond(self.handler(fake.url, "async"))
+        self.assertEqual(len(fake.requests), 1)
+        self.assertEqual(replayed["output_update"], generated["output_update"])
+
+    def test_failed_stream_is_not_cached(self):
+        with mock.patch.dict("llm.GENERATION_OPTIONS", {"temperature": 0}):
+            with FakeOllama(RESPONSE, error_after=2) as fake:
+                handler = self.handler(fake.url)
+                errors = []
+                handler.signals.error_occurred.connect(
+                    errors.append, Qt.DirectConnection
+                )
+                handler.get_response(
+                    "Hi", "llama2", [{"role": "user", "content": "Hi"}]
+                )
+                wait_for(lambda: errors)
+        self.assertEqual(self.cache.cache_info().entries, 0)
+
+    def test_sampled_request_is_generated(self):
+        with FakeOllama(RESPONSE) as fake:
+            self.respond(self.handler(fake.url))
+            received = self.respond(self.handler(fake.url))
+        self.assertEqual(len(fake.requests), 2)
+        self.assertNotIn("cache_hit", received)
+        self.assertEqual(self.cache.cache_info().entries, 0)
+
+    def handler(self, url: str, engine="thread") -> LLMHandler:
+        handler = LLMHandler(max_fps=0, engine=engine, cache=self.cache)
+        if engine == "async":
+            self.addCleanup(handler.async_engine.close)
+        handler.client.host = url
+        return handler
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -327,5 +327,39 @@ Regular text.
         self.assertIn('<pre class="code-block">', output)
         self.assertIn('class="language-html"', output)
 
+    def test_streaming_mermaid_shows_placeholder(self):
+        """Test an unclosed mermaid diagram is replaced by a placeholder"""
+        for content in (
+            "Before the diagram\n<mermaid>\ngraph TD\n    A-->",
+            "Before the diagram\n```mermaid\ngraph TD\n    A-->",
+        ):
+            result = self.formatter._process_mermaid(content, streaming=True)
+            self.assertIn('<div class="mermaid-pending">', result)
+            self.assertNotIn('<p><div', result)
+            self.assertIn('Before the diagram', result)
+            self.assertNotIn('graph TD', result)
+
+    def test_closed_mermaid_has_no_placeholder(self):
+        """Test a finished diagram doesn't show the placeholder"""
+        content = "<mermaid>\ngraph TD\n    A-->B\n</mermaid>\n"
+        result = self.formatter._process_mermaid(content)
+        self.assertIn('<div class="mermaid">', result)
+        self.assertNotIn('mermaid-pending', result)
+        self.assertNotIn('<p><div', result)
+
+    def test_finished_response_keeps_unclosed_mermaid(self):
+        """Test an unclosed diagram only shows a placeholder while streaming"""
+        content = (
+            "<output>\nIntro\n\n<mermaid>\ngraph TD\nA-->B\n```\n\n"
+            "More answer text here\n"
+        )
+        _, output = self.formatter.format_response(content)
+        self.assertIn('mermaid-pending', output)
+        self.assertNotIn('More answer text here', output)
+
+        _, output = self.formatter.format_response(content + "</output>")
+        self.assertNotIn('mermaid-pending', output)
+        self.assertIn('More answer text here', output)
+
 if __name__ == '__main__':
     unittest.main()
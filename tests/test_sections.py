@@ -0,0 +1,134 @@
+import json
+import unittest
+
+from helpers import FakeResponse
+
+from llm import Generation, LLMHandler
+from sections import SectionParser
+
+RESPONSE = (
+    "<think>\nI could mention <output> tags here.\n</think>\n\n"
+    "<output>\n# Answer\n\nSome `code` and a < b.\n</output>"
+)
+
+
+def parse(*deltas, close=False):
+    parser = SectionParser()
+    for delta in deltas:
+        parser.feed(delta)
+    if close:
+        parser.close()
+    return parser
+
+
+class TestSectionParser(unittest.TestCase):
+    def test_sections(self):
+        """Test thinking and output are split on their tags"""
+        parser = parse(RESPONSE)
+        self.assertEqual(parser.thinking, "I could mention <output> tags here.")
+        self.assertEqual(parser.output, "# Answer\n\nSome `code` and a < b.")
+        self.assertFalse(parser.output_open)
+
+    def test_chunk_boundaries_do_not_matter(self):
+        """Test tags split across deltas are recognized"""
+        expected = parse(RESPONSE)
+        for size in (1, 2, 3, 5):
+            chunks = [RESPONSE[i : i + size] for i in range(0, len(RESPONSE), size)]
+            parser = parse(*chunks)
+            self.assertEqual(
+                (parser.thinking, parser.output),
+                (expected.thinking, expected.output),
+                f"Mismatch with chunks of {size}",
+            )
+
+    def test_streaming_output(self):
+        """Test output is available while its section is still open"""
+        parser = parse("<think>Hmm</think>\n<output>\nPartial answer </out")
+        self.assertEqual(parser.output, "Partial answer ")
+        self.assertTrue(parser.output_open)
+
+        parser.close()
+        self.assertEqual(parser.output, "Partial answer </out")
+        self.assertFalse(parser.output_open)
+
+    def test_thinking_streams(self):
+        """Test thinking shows up before its section is closed"""
+        parser = parse("<think>\nStep one")
+        self.assertEqual(parser.thinking, "Step one")
+        self.assertEqual(parser.output, "")
+
+    def test_untagged_response(self):
+        """Test text without any section isn't output"""
+        self.assertEqual(parse("Just text", close=True).output, "")
+
+    def test_output_without_output_tag(self):
+        """Test text after the thinking is the output if there is no <output>"""
+        parser = parse("<think>Hmm</think>\n\nThe answer")
+        self.assertEqual(parser.output, "The answer")
+
+    def test_thinking_opened_by_template(self):
+        """Test text before a lone </think> is taken as thinking"""
+        parser = parse("Let me see.\n</think>\n<output>Done</output>")
+        self.assertEqual(parser.thinking, "Let me see.")
+        self.assertEqual(parser.output, "Done")
+
+    def test_thinking_field(self):
+        """Test thinking sent separately from the response is collected"""
+        parser = SectionParser()
+        parser.feed_thinking("Separate ")
+        parser.feed_thinking("thinking")
+        parser.feed("<output>Answer</output>")
+        self.assertEqual(parser.thinking, "Separate thinking")
+        self.assertEqual(parser.output, "Answer")
+
+    def test_versions_track_changes(self):
+        """Test versions only change when the section's text does"""
+        parser = parse("<think>Hmm")
+        thinking, output = parser.thinking_version, parser.output_version
+        parser.feed(" more")
+        self.assertEqual(parser.thinking_version, thinking + 1)
+        self.assertEqual(parser.output_version, output)
+
+
+class TestProcessResponse(unittest.TestCase):
+    def test_sections_are_posted(self):
+        """Test streamed events reach the thinking and output updates"""
+        handler = LLMHandler(max_fps=0)
+        updates = {"thinking": [], "output": []}
+        handler.signals.thinking_update.connect(updates["thinking"].append)
+        handler.signals.output_update.connect(updates["output"].append)
+
+        events = [{"thinking": "From the field"}]
+        events += [
+            {"response": RESPONSE[i : i + 4]} for i in range(0, len(RESPONSE), 4)
+        ]
+        handler.scheduler.set_request_id(1)
+        generation = Generation(1, handler.scheduler)
+        stream = handler._process_response(FakeResponse.from_events(events), generation)
+
+        self.assertEqual(str(stream.text), RESPONSE)
+        self.assertTrue(updates["thinking"][-1].startswith("From the field"))
+        self.assertIn("<h1>Answer</h1>", updates["output"][-1])
+        self.assertNotIn("&lt;output&gt;", updates["output"][-1])
+
+    def test_raw_events_are_posted(self):
+        """Test the raw event view gets every event with a timestamp"""
+        handler = LLMHandler(max_fps=0)
+        handler.raw_events = True
+        lines = []
+        handler.signals.raw_events.connect(lines.append)
+        events = [{"response": "a"}, {"response": "b"}, {"done": True}]
+
+        handler.scheduler.set_request_id(1)
+        generation = Generation(1, handler.scheduler)
+        handler._process_response(FakeResponse.from_events(events), generation)
+
+        received = "".join(lines).splitlines()
+        self.assertEqual(
+            [json.loads(line.split(" ", 1)[1]) for line in received], events
+        )
+        self.assertRegex(received[0], r"^\d\d:\d\d:\d\d\.\d{3} ")
+
+
+if __name__ == "__main__":
+    unittest.main()
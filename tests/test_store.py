@@ -0,0 +1,102 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from store import ConversationStore, split_response
+
+RESPONSE = "<think>Let me think about sqlite</think>\n<output>Use an index.</output>"
+
+
+class TestConversationStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ConversationStore(":memory:")
+        self.addCleanup(self.store.close)
+
+    def test_split_response(self):
+        self.assertEqual(
+            split_response(RESPONSE), ("Let me think about sqlite", "Use an index.")
+        )
+
+    def test_turns_are_appended(self):
+        """Test turns keep their order and come back as chat history"""
+        session = self.store.new_session("How do I  speed up\nqueries?")
+        self.assertEqual(self.store.add_turn(session, "First", RESPONSE, "llama2"), 0)
+        self.assertEqual(self.store.add_turn(session, "Second", "Plain"), 1)
+
+        self.assertEqual(
+            self.store.history(session),
+            [
+                {
+                    "role": "user",
+                    "content": "First",
+                    "llm_history": RESPONSE,
+                    "model": "llama2",
+                },
+                {
+                    "role": "user",
+                    "content": "Second",
+                    "llm_history": "Plain",
+                    "model": "",
+                },
+            ],
+        )
+        (listed,) = self.store.sessions()
+        self.assertEqual(listed.title, "How do I speed up queries?")
+        self.assertEqual(listed.turns, 2)
+
+    def test_search(self):
+        """Test search finds words in the message, thinking and output"""
+        first = self.store.new_session("first")
+        self.store.add_turn(first, "Indexes in postgres", "<output>B-trees</output>")
+        second = self.store.new_session("second")
+        self.store.add_turn(second, "Question", RESPONSE)
+
+        self.assertEqual(
+            [hit.session_id for hit in self.store.search("sqlite")], [second]
+        )
+        self.assertEqual(
+            [hit.session_id for hit in self.store.search("b-trees")], [first]
+        )
+        self.assertEqual(self.store.search("sqlite postgres"), [])
+        self.assertIn("[sqlite]", self.store.search("sqlite")[0].snippet)
+        # The query's syntax is taken as text
+        self.assertEqual(self.store.search('"AND ('), [])
+
+    def test_search_without_fts5(self):
+        """Test search still works when SQLite lacks FTS5"""
+        self.store.full_text = False
+        session = self.store.new_session("first")
+        self.store.add_turn(session, "Question", RESPONSE)
+        self.assertEqual(len(self.store.search("SQLite index")), 1)
+        self.assertEqual(self.store.search("postgres"), [])
+
+    def test_export_markdown(self):
+        session = self.store.new_session("first")
+        self.store.add_turn(session, "Question", RESPONSE, "llama2")
+        self.store.add_turn(session, "Again", "Plain", "mistral")
+        markdown = self.store.export_markdown(session)
+
+        self.assertIn("Model: llama2, mistral\n\n", markdown)
+        self.assertIn(
+            "## User Input\nQuestion\n\n## Assistant Response\n"
+            "### Thinking Process\nLet me think about sqlite\n\n"
+            "### Output\nUse an index.\n\n---\n\n",
+            markdown,
+        )
+        self.assertIn("## Assistant Response\nPlain\n\n---\n\n", markdown)
+
+    def test_reopen(self):
+        """Test the conversations are kept on disk"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "conversations" / "test.db"
+            store = ConversationStore(path)
+            store.add_turn(store.new_session("first"), "Question", RESPONSE)
+            store.close()
+
+            store = ConversationStore(path)
+            self.assertEqual(len(store.search("index")), 1)
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+from helpers import FakeResponse
+
+from stream import (
+    NDJSONDecoder,
+    StreamError,
+    StreamText,
+    event_text,
+    iter_event_batches,
+)
+
+
+class TestNDJSONDecoder(unittest.TestCase):
+    def setUp(self):
+        self.decoder = NDJSONDecoder()
+
+    def test_lines_split_across_chunks(self):
+        """Test an event is decoded once its line is complete"""
+        self.assertEqual(self.decoder.feed(b'{"response": "He'), [])
+        self.assertEqual(
+            self.decoder.feed(b'llo"}\n{"response": " world"}\n{"resp'),
+            [{"response": "Hello"}, {"response": " world"}],
+        )
+        self.assertEqual(self.decoder.feed(b'onse": "!"}\n'), [{"response": "!"}])
+
+    def test_blank_lines_and_crlf(self):
+        """Test empty lines are skipped and \\r\\n endings are accepted"""
+        events = self.decoder.feed(b'\n{"a": 1}\r\n\r\n{"b": 2}\n')
+        self.assertEqual(events, [{"a": 1}, {"b": 2}])
+
+    def test_flush_decodes_unterminated_line(self):
+        """Test a last line without newline is decoded at the end"""
+        self.decoder.feed(b'{"a": 1}\n{"done": true}')
+        self.assertEqual(self.decoder.flush(), [{"done": True}])
+        self.assertEqual(self.decoder.flush(), [])
+
+    def test_invalid_json_raises(self):
+        """Test malformed lines are reported and the decoder stays usable"""
+        with self.assertRaises(ValueError):
+            self.decoder.feed(b"not json\n")
+        self.assertEqual(self.decoder.feed(b'{"a": 1}\n'), [{"a": 1}])
+
+    def test_unicode_split_inside_character(self):
+        """Test multi-byte characters split across chunks are decoded"""
+        data = '{"response": "café ✓"}\n'.encode()
+        self.assertEqual(self.decoder.feed(data[:17]), [])
+        self.assertEqual(self.decoder.feed(data[17:]), [{"response": "café ✓"}])
+
+
+class TestStreamText(unittest.TestCase):
+    def test_chunks_are_joined_on_read(self):
+        """Test text is only joined when read, and reads stay consistent"""
+        text = StreamText()
+        text.append("Hello")
+        text.append("")
+        text.append(", ")
+        self.assertEqual(str(text), "Hello, ")
+        text.append("world")
+        self.assertEqual(len(text), 12)
+        self.assertEqual(str(text), "Hello, world")
+        self.assertEqual(str(text), "Hello, world")
+
+
+class TestIterEventBatches(unittest.TestCase):
+    def test_events_are_batched_per_read(self):
+        """Test events that arrived in the same read are yielded together"""
+        response = FakeResponse(
+            [b'{"response": "a"}\n{"response": "b"}\n{"resp', b'onse": "c"}', b""]
+        )
+        self.assertEqual(
+            list(iter_event_batches(response)),
+            [[{"response": "a"}, {"response": "b"}], [{"response": "c"}]],
+        )
+
+
+class TestEventText(unittest.TestCase):
+    def test_generate_and_chat_events(self):
+        self.assertEqual(event_text({"response": "a", "thinking": "b"}), ("a", "b"))
+        self.assertEqual(event_text({"message": {"content": "a"}}), ("a", ""))
+
+    def test_error_event_raises(self):
+        """Test an error sent in the middle of a stream is raised"""
+        with self.assertRaisesRegex(StreamError, "out of memory"):
+            event_text({"error": "out of memory"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from benchmarks.fake_ollama import FakeOllama
+from context import ContextBuilder
+from http_pool import SessionPool
+from summarizer import Summarizer
+
+SUMMARY = ["<think>", "Short", "</think>", "They asked ", "questions."]
+
+
+def conversation(turns: int) -> list[dict]:
+    return [
+        {"role": "user", "content": f"Question {i}", "llm_history": "word " * 50}
+        for i in range(turns)
+    ]
+
+
+class FakeClient:
+    def __init__(self, host):
+        self.host = host
+        self.sessions = SessionPool()
+
+
+class TestSummarizer(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeOllama(SUMMARY, token_delay=0.01).__enter__()
+        self.addCleanup(self.fake.__exit__, None, None, None)
+        self.client = FakeClient(self.fake.url)
+        self.addCleanup(self.client.sessions.close)
+        self.summarizer = Summarizer(self.client, model="small")
+        self.addCleanup(self.summarizer.close)
+        self.turns = ContextBuilder._split(conversation(6), "Next")[0]
+
+    def test_summary_is_made_in_the_background(self):
+        """Test a requested summary is cached once the worker made it"""
+        self.assertEqual(self.summarizer.summary(self.turns, 4), (0, ""))
+        self.summarizer.request(self.turns, 4).result(timeout=5)
+
+        self.assertEqual(
+            self.summarizer.summary(self.turns, 4), (4, "They asked questions.")
+        )
+        # Later turns find the summary of the turns they start with
+        self.assertEqual(self.summarizer.summary(self.turns, 6)[0], 4)
+        self.assertIsNone(self.summarizer.request(self.turns, 4))
+
+    def test_summaries_are_refreshed_incrementally(self):
+        """Test the next summary starts from the last one"""
+        self.summarizer.request(self.turns, 2).result(timeout=5)
+        self.summarizer.request(self.turns, 4).result(timeout=5)
+
+        transcript = self.fake.requests[-1]["messages"][-1]["content"]
+        self.assertIn("Summary so far:\nThey asked questions.", transcript)
+        self.assertNotIn("Question 1", transcript)
+        self.assertIn("Question 3", transcript)
+        self.assertEqual(self.fake.requests[-1]["model"], "small")
+
+    def test_one_summary_at_a_time(self):
+        """Test requests while the worker is busy are skipped"""
+        future = self.summarizer.request(self.turns, 2)
+        self.assertIsNone(self.summarizer.request(self.turns, 4))
+        future.result(timeout=5)
+
+    def test_errors_are_kept(self):
+        """Test a failing summary model doesn't raise"""
+        self.client.host = "http://127.0.0.1:9"
+        self.summarizer.request(self.turns, 2).result(timeout=30)
+        self.assertIsNotNone(self.summarizer.last_error)
+        self.assertEqual(self.summarizer.summary(self.turns, 2), (0, ""))
+
+
+class TestContextSummary(unittest.TestCase):
+    def test_summary_replaces_dropped_turns(self):
+        """Test dropped turns are summarized and sent as a system message"""
+        with FakeOllama(SUMMARY) as fake:
+            client = FakeClient(fake.url)
+            self.addCleanup(client.sessions.close)
+            summarizer = Summarizer(client, model="small")
+            builder = ContextBuilder(reserve=0, summarizer=summarizer)
+            history = conversation(200)
+
+            first = builder.build("sys", history, "Next", "llama2")
+            self.assertNotIn("Summary", first[1]["content"])
+            builder.summarize_dropped()
+            summarizer._future.result(timeout=5)
+            second = builder.build("sys", history, "Next", "llama2")
+
+        self.assertEqual(second[1]["role"], "system")
+        self.assertEqual(
+            second[1]["content"],
+            "Summary of the earlier conversation:\nThey asked questions.",
+        )
+        self.assertEqual(second[2:], first[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import threading
+import unittest
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from llm import LLMSignals
+from scheduler import UpdateScheduler
+
+
+class TestUpdateScheduler(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.signals = LLMSignals()
+        self.received = []
+        self.signals.output_update.connect(
+            lambda value: self.received.append(("output_update", value))
+        )
+        self.signals.llm_history_update.connect(
+            lambda value: self.received.append(("llm_history_update", value))
+        )
+
+    def run_event_loop(self, seconds):
+        """Process Qt events for a while"""
+        loop = QEventLoop()
+        QTimer.singleShot(int(seconds * 1000), loop.quit)
+        loop.exec()
+
+    def post_from_thread(self, scheduler, count):
+        """Post `count` output updates and a final update from a worker thread"""
+
+        def worker():
+            for i in range(count):
+                scheduler.post("output_update", str(i))
+            scheduler.post("llm_history_update", "done", coalesce=False)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+    def test_stale_updates_are_dropped(self):
+        """Test only the latest value is delivered when the GUI falls behind"""
+        scheduler = UpdateScheduler(self.signals, max_fps=30)
+        self.post_from_thread(scheduler, 1000)
+        self.run_event_loop(0.2)
+
+        self.assertEqual(
+            self.received,
+            [("output_update", "999"), ("llm_history_update", "done")],
+        )
+        self.assertEqual(scheduler.posted, 1001)
+        self.assertEqual(scheduler.dropped, 999)
+
+    def test_frame_rate_is_limited(self):
+        """Test updates posted over time are delivered at the frame rate"""
+        scheduler = UpdateScheduler(self.signals, max_fps=10)
+        timer = QTimer()
+        counter = iter(range(1000))
+        timer.timeout.connect(
+            lambda: scheduler.post("output_update", str(next(counter)))
+        )
+        timer.start(1)
+        self.run_event_loop(0.5)
+        timer.stop()
+
+        self.assertLessEqual(len(self.received), 7)
+        self.assertGreater(scheduler.dropped, 0)
+
+    def test_slow_rendering_lowers_frame_rate(self):
+        """Test the frame interval follows the measured render time"""
+        scheduler = UpdateScheduler(self.signals, max_fps=60, min_fps=2)
+        self.assertAlmostEqual(scheduler.frame_interval, 1 / 60)
+
+        scheduler.render_time = 0.1
+        self.assertAlmostEqual(scheduler.frame_interval, 0.1 / scheduler.RENDER_BUDGET)
+
+        scheduler.render_time = 10
+        self.assertAlmostEqual(scheduler.frame_interval, 1 / 2)
+
+    def test_joined_values_are_concatenated(self):
+        """Test pieces of text posted within a frame arrive together"""
+        self.signals.raw_events.connect(
+            lambda value: self.received.append(("raw_events", value))
+        )
+        scheduler = UpdateScheduler(self.signals, max_fps=30)
+        for piece in ["a\n", "b\n", "c\n"]:
+            scheduler.post("raw_events", piece, join=True)
+        self.run_event_loop(0.1)
+        scheduler.post("raw_events", "d\n", join=True)
+        self.run_event_loop(0.1)
+
+        self.assertEqual(
+            self.received, [("raw_events", "a\nb\nc\n"), ("raw_events", "d\n")]
+        )
+        self.assertEqual(scheduler.dropped, 0)
+
+    def test_zero_fps_emits_directly(self):
+        """Test a scheduler without frame rate passes updates through"""
+        scheduler = UpdateScheduler(self.signals, max_fps=0)
+        scheduler.post("output_update", "a")
+        scheduler.post("output_update", "b")
+        self.assertEqual(
+            self.received, [("output_update", "a"), ("output_update", "b")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
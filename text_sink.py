@@ -0,0 +1,63 @@
+from PySide6.QtGui import QTextCursor
+from PySide6.QtWidgets import QPlainTextEdit
+
+from styles import Styles
+
+# Characters of the shown text kept to recognize the text it continues
+TAIL_LENGTH = 64
+
+
+class TextSink(QPlainTextEdit):
+    """Read-only panel for text that grows, like a streamed response.
+
+    `set_text` takes the whole text but only inserts what was added since
+    the last call, so Qt lays out the new lines instead of the document.
+    Whether the text continues the shown one is checked on its tail, in
+    constant time. With `max_lines`, the oldest lines are dropped as new
+    ones arrive. The view follows new text while it's scrolled to the end.
+    """
+
+    def __init__(self, text: str = "", max_lines: int = 0, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setLineWrapMode(QPlainTextEdit.WidgetWidth)
+        self.setMaximumBlockCount(max_lines)
+        self.setStyleSheet(Styles.PANEL_CONTENT + Styles.SCROLLBAR)
+        self._length = 0
+        self._tail = ""
+        self.setPlainText(text)
+
+    def set_text(self, text: str):
+        """Show `text`, appending what follows the text shown so far"""
+        start = self._length - len(self._tail)
+        if len(text) >= self._length and text.startswith(self._tail, start):
+            self.append_text(text[self._length :])
+        else:
+            self.setPlainText(text)
+
+    def append_text(self, text: str):
+        """Add text at the end"""
+        if not text:
+            return
+        scrollbar = self.verticalScrollBar()
+        following = scrollbar.value() == scrollbar.maximum()
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self._length += len(text)
+        self._tail = (self._tail + text)[-TAIL_LENGTH:]
+        if following:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def append_line(self, line: str):
+        """Add a line of its own"""
+        self.append_text(f"\n{line}" if self._length else line)
+
+    def setPlainText(self, text: str):
+        super().setPlainText(text)
+        self._length = len(text)
+        self._tail = text[-TAIL_LENGTH:]
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def clear(self):
+        self.setPlainText("")